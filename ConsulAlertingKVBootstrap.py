@@ -9,6 +9,7 @@ blacklist_checks = []
 
 health_check_tags = []
 
+# add "elasticsearch" once notify_elasticsearch has a url
 notify_plugins = ["hipchat", "slack", "mailgun", "email", "pagerduty", "influxdb", "elasticsearchlog", "cachet"]
 
 notify_hipchat = {"api_token": "",
@@ -42,6 +43,10 @@ notify_influxdb = {"url": "",
 
 notify_elasticsearchlog = {"logpath": ""}
 
+notify_elasticsearch = {"url": "",
+                        "index": "consulalerting-%Y.%m.%d"
+                        }
+
 notify_cachet = {"api_token": "",
                  "site_url": "",
                  "notify_subscribers": ""
@@ -75,6 +80,8 @@ try:
 
     settings.consul.kv[settings.KV_ALERTING_NOTIFY_CACHET] = json.dumps(notify_cachet)
 
+    settings.consul.kv[settings.KV_ALERTING_NOTIFY_ELASTICSEARCH] = json.dumps(notify_elasticsearch)
+
     settings.consul.kv[settings.KV_PRIOR_STATE] = []
 except TypeError:
     print "One of the python data structures is not JSON serializable, may have accidentally created a set()"
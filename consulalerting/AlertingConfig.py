@@ -0,0 +1,197 @@
+import json as json
+import settings
+import utilities
+import PriorStateStore
+from ConfigCache import ConfigCache
+
+
+class AlertingConfig(object):
+
+    """
+    Immutable view of everything consulalerting reads from the Consul KV
+    under alerting/, obtained with a single /v1/txn request instead of a
+    request per key. Shared by WatchCheckHandler and NotificationEngine.
+    Parsed values are reused from a ConfigCache while their ModifyIndex is
+    unchanged.
+
+    Example use:
+
+        config = AlertingConfig.load()
+        config.node_blacklist
+        config.plugins["slack"]
+    """
+
+    def __init__(self, values, consul_index=0, modify_indexes=None, cache=None,
+                 prefixes=None):
+        """
+        Arguments:
+          values: dictionary of KV key to raw value
+          consul_index: X-Consul-Index the values were read at
+          modify_indexes: dictionary of KV key to ModifyIndex, needed to
+            use `cache`
+          cache: ConfigCache, parsed values are reused from it while a
+            key's ModifyIndex is unchanged
+          prefixes: configuration prefixes `values` were read from,
+            settings.KV_ALERTING_CONFIG_PREFIXES when not given
+        """
+        set_ = super(AlertingConfig, self).__setattr__
+
+        set_("consul_index", consul_index)
+        set_("prefixes", tuple(settings.KV_ALERTING_CONFIG_PREFIXES
+                               if prefixes is None else prefixes))
+        set_("_values", values)
+        # bytes of the KV values read
+        set_("size", sum(len(value) for value in values.itervalues() if value))
+        set_("_modify_indexes", modify_indexes or {})
+        set_("_cache", cache)
+
+        set_("prior_keys", tuple(sorted(
+            key for key in values if PriorStateStore.isPriorKey(key))))
+
+        set_("prior_manifest", self._prior_manifest(values))
+
+        prior, prior_fingerprint = self._prior(values)
+        set_("prior", tuple(prior))
+        # WatchCheckHandler.processedFingerprint of the run that wrote it
+        set_("prior_fingerprint", prior_fingerprint)
+
+        set_("health_check_tags", tuple(self._loads(
+            values, settings.KV_ALERTING_HEALTH_CHECK_TAGS, [])))
+
+        set_("node_blacklist", tuple(self._loads(
+            values, settings.KV_ALERTING_BLACKLIST_NODES, [])))
+
+        set_("service_blacklist", tuple(self._loads(
+            values, settings.KV_ALERTING_BLACKLIST_SERVICES, [])))
+
+        set_("check_blacklist", tuple(self._loads(
+            values, settings.KV_ALERTING_BLACKLIST_CHECKS, [])))
+
+        available_plugins = self._loads(
+            values, settings.KV_ALERTING_AVAILABLE_PLUGINS, None)
+
+        if available_plugins is not None:
+            available_plugins = frozenset(available_plugins)
+
+        set_("available_plugins", available_plugins)
+
+        plugins = {}
+        for name in (available_plugins or []):
+            if name not in settings.NOTIFY_PLUGINS:
+                continue
+
+            kv_location, tags_dictname = settings.NOTIFY_PLUGINS[name]
+
+            if values.get(kv_location):
+                plugins[name] = self._parse(
+                    kv_location, values[kv_location],
+                    lambda value: utilities.parse_plugin(value, tags_dictname))
+
+        set_("plugins", plugins)
+
+        set_("_cache", None)
+
+    def __setattr__(self, item, value):
+        raise AttributeError("AlertingConfig is immutable")
+
+    def __delattr__(self, item):
+        raise AttributeError("AlertingConfig is immutable")
+
+    def __repr__(self):
+        return "AlertingConfig(ConsulIndex={i}, Plugins={p})".format(
+            i=self.consul_index, p=sorted(self.plugins.keys()))
+
+    def _parse(self, key, value, parser):
+        if self._cache is None or key not in self._modify_indexes:
+            return parser(value)
+
+        return self._cache.get(key, self._modify_indexes[key], value, parser)
+
+    def _prior(self, values):
+        # prior state changes on every run, there is nothing to cache
+        try:
+            return PriorStateStore.decodeState(
+                PriorStateStore.read(values, self._modify_indexes))
+        except (KeyError, TypeError, ValueError):
+            settings.logger.warn("Message=No previous prior catalog health "
+                                 "found from ConsulURI={l}".format(
+                                     l=settings.KV_PRIOR_STATE))
+            return [], None
+
+    @staticmethod
+    def _prior_manifest(values):
+        try:
+            return json.loads(values[settings.KV_PRIOR_STATE_MANIFEST])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def _loads(self, values, key, default):
+        try:
+            return self._parse(key, values[key], json.loads)
+        except (KeyError, TypeError, ValueError):
+            settings.logger.warn("Message=Could not obtain value from "
+                                 "ConsulURI={l}".format(l=key))
+            return default
+
+    @classmethod
+    def load(cls, cache=None, prefixes=None, prior=True, base=None):
+        """
+        Read the alerting/ configuration and the prior state from Consul
+        in one transaction.
+
+        Arguments:
+          cache: ConfigCache, when not given the on-disk cache at
+            settings.CONFIG_CACHE_PATH is used unless it is None. The
+            prior state changes on every run and is never cached
+          prefixes: configuration prefixes to read, every one of
+            settings.KV_ALERTING_CONFIG_PREFIXES not read by `base` when
+            not given
+          prior: read the prior state
+          base: AlertingConfig read earlier, its values are kept
+        """
+        if cache is None and settings.CONFIG_CACHE_PATH:
+            cache = ConfigCache(settings.CONFIG_CACHE_PATH)
+
+        if prefixes is None:
+            prefixes = [prefix for prefix in settings.KV_ALERTING_CONFIG_PREFIXES
+                        if base is None or prefix not in base.prefixes]
+
+        consul_index = 0
+        values = {}
+        modify_indexes = {}
+        if base is not None:
+            consul_index = base.consul_index
+            values.update(base._values)
+            modify_indexes.update(base._modify_indexes)
+
+        read_index, rows = utilities.getKVTrees(
+            list(prefixes) + ([settings.KV_PRIOR_STATE] if prior else []))
+        consul_index = max(consul_index, read_index)
+
+        if cache is not None:
+            cache.index(read_index)
+
+        for row in rows:
+            # alerting/prior also matches keys such as alerting/priority
+            if row["Key"].startswith(settings.KV_PRIOR_STATE) and \
+                    not PriorStateStore.isPriorKey(row["Key"]):
+                continue
+
+            values[row["Key"]] = row["Value"]
+            modify_indexes[row["Key"]] = row["ModifyIndex"]
+
+        config = cls(values, consul_index, modify_indexes, cache,
+                     tuple(base.prefixes if base is not None else ()) +
+                     tuple(prefixes))
+
+        if cache is not None:
+            # keys of prefixes not read this time are kept
+            cache.prune([key for key in cache.entries
+                         if key in values or
+                         not any(key.startswith(prefix) for prefix in prefixes)])
+            settings.logger.info("Message=Config cache Hits={h} "
+                                 "Misses={m}".format(h=cache.hits,
+                                                     m=cache.misses))
+            cache.save()
+
+        return config
@@ -0,0 +1,84 @@
+import time
+import settings
+import asyncplugins
+from concurrent.futures import ThreadPoolExecutor
+from tornado import gen
+from tornado.httpclient import AsyncHTTPClient
+from tornado.ioloop import IOLoop
+from tornado.util import TimeoutError
+from NotificationDispatcher import logDeliveries
+
+
+class AsyncNotificationDispatcher(object):
+
+    """
+    Runs Deliveries as coroutines (asyncplugins) on a tornado IOLoop, all
+    deliveries of a run are in flight at once from a single thread, bounded
+    by `max_clients` concurrent HTTP connections. Every HTTP request has
+    its own timeout, settings.NOTIFY_ASYNC_TIMEOUT, the run as a whole is
+    bounded by the deadline. Plugins without a coroutine run on
+    settings.NOTIFY_WORKERS executor threads, those still running at the
+    deadline are left to finish in the background like the threaded
+    dispatcher's workers.
+
+    Same interface as NotificationDispatcher, selected with
+    settings.NOTIFY_DISPATCHER = "async".
+    """
+
+    def __init__(self, max_clients=None, deadline=None):
+        """
+        Arguments:
+          max_clients: concurrent HTTP requests, settings.NOTIFY_ASYNC_MAX_CLIENTS
+          deadline: seconds to wait for all deliveries, settings.NOTIFY_DEADLINE
+        """
+        self.max_clients = max_clients or settings.NOTIFY_ASYNC_MAX_CLIENTS
+        self.deadline = deadline or settings.NOTIFY_DEADLINE
+
+    @gen.coroutine
+    def deliver(self, delivery):
+        notifier = asyncplugins.NOTIFIERS.get(delivery.target)
+
+        if notifier is None:
+            # blocking plugins keep running on the executor past the
+            # deadline, Delivery.run flags them running until they return
+            yield IOLoop.current().run_in_executor(self.executor, delivery.run)
+            return
+
+        start = time.time()
+
+        try:
+            delivery.result = yield notifier(*delivery.args)
+        except Exception, delivery_error:
+            delivery.failed(delivery_error)
+
+        delivery.finished(start)
+
+    @gen.coroutine
+    def deliverAll(self, deliveries):
+        yield [self.deliver(delivery) for delivery in deliveries]
+
+    def Run(self, deliveries):
+        """
+        Returns:
+          deliveries: the given Deliveries with their results
+        """
+        if not deliveries:
+            return deliveries
+
+        io_loop = IOLoop()
+        # not the IOLoop's default executor, closing the loop would wait
+        # for every running delivery
+        self.executor = ThreadPoolExecutor(settings.NOTIFY_WORKERS)
+        try:
+            AsyncHTTPClient.configure(None, max_clients=self.max_clients)
+            io_loop.run_sync(lambda: self.deliverAll(deliveries),
+                             timeout=self.deadline)
+        except TimeoutError:
+            pass
+        finally:
+            io_loop.close(all_fds=True)
+            self.executor.shutdown(wait=False)
+
+        logDeliveries(deliveries, self.deadline)
+
+        return deliveries
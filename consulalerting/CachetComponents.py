@@ -0,0 +1,105 @@
+import time
+import threading
+import settings
+
+
+class CachetComponents(object):
+
+    """
+    Index of Cachet components by lower case name, built from a single
+    /api/v1/components GET and reused until it is older than the ttl,
+    together with the last component status pushed per component id.
+    A NotificationEngine run shares one index between all its alerts,
+    WatchCheckDaemon keeps one for its lifetime.
+
+    Example use:
+
+        components = CachetComponents()
+        components.refresh(cachet_config, plugins.cachet_fetch_components)
+        component = components.match(obj.Tags)
+    """
+
+    def __init__(self, ttl=None):
+        """
+        Arguments:
+          ttl: seconds the fetched components are used, settings.CACHET_COMPONENTS_TTL
+        """
+        self.ttl = settings.CACHET_COMPONENTS_TTL if ttl is None else ttl
+        self.site_url = None
+        self.fetched = None
+        self.components = {}
+        self.statuses = {}
+        self.lock = threading.Lock()
+        self.fetch_lock = threading.Lock()
+
+    def stale(self, cachet_config):
+        return self.fetched is None or \
+            self.site_url != cachet_config["site_url"] or \
+            time.time() - self.fetched > self.ttl
+
+    def load(self, cachet_config, components):
+        """
+        Replace the index with the 'data' list of a components GET, the
+        status Cachet reports for each component becomes its last status.
+        """
+        index = {}
+        statuses = {}
+
+        for component in components or []:
+            index[component["name"].lower()] = component
+
+            try:
+                statuses[component["id"]] = int(component["status"])
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        with self.lock:
+            if self.site_url != cachet_config["site_url"]:
+                self.statuses = {}
+
+            self.site_url = cachet_config["site_url"]
+            self.components = index
+            self.statuses.update(statuses)
+            self.fetched = time.time()
+
+    def refresh(self, cachet_config, fetch):
+        """
+        Load the components returned by fetch(cachet_config) when the index
+        is stale, concurrent callers wait for a single fetch.
+        """
+        with self.fetch_lock:
+            if self.stale(cachet_config):
+                self.load(cachet_config, fetch(cachet_config))
+                settings.logger.info("Message=Cachet components fetched "
+                                     "Components={c}".format(c=len(self.components)))
+
+    def match(self, tags):
+        """
+        Returns:
+          component: the single component named like one of tags, None
+                     when no or several components match
+        """
+        matches = set(self.components).intersection(tags)
+
+        if len(matches) != 1:
+            return None
+
+        return self.components[matches.pop()]
+
+    def claim(self, component_id, status):
+        """
+        Record status as pushed for component_id.
+
+        Returns:
+          changed: False when the component already is in status
+        """
+        with self.lock:
+            if self.statuses.get(component_id) == status:
+                return False
+
+            self.statuses[component_id] = status
+            return True
+
+    def forget(self, component_id):
+        with self.lock:
+            self.statuses.pop(component_id, None)
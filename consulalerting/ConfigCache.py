@@ -0,0 +1,129 @@
+import os
+import tempfile
+import json as json
+import settings
+
+
+class ConfigCache(object):
+
+    """
+    On-disk cache of parsed alerting/ KV values, keyed by the ModifyIndex
+    Consul reports for each key. A value is only parsed (json.loads and
+    key lowercasing for plugins) again when its ModifyIndex moved. The
+    X-Consul-Index of the last read is kept too, when Consul answers with
+    a lower one (a restored snapshot or a rebuilt cluster) ModifyIndexes
+    are no longer comparable and every entry is dropped.
+
+    The cache file holds plugin api tokens, it is created readable by the
+    owner only.
+
+    Example use:
+
+        cache = ConfigCache("/var/cache/consulalerting/config.json")
+        cache.index(consul_index)
+        value = cache.get(key, modify_index, raw_value, json.loads)
+        cache.save()
+    """
+
+    def __init__(self, path=settings.CONFIG_CACHE_PATH):
+        """
+        Arguments:
+          path: location of the cache file
+        """
+        self.path = path
+        self.consul_index, self.entries = self.read()
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def read(self):
+        """
+        Returns:
+          (index, entries): X-Consul-Index of the last read and parsed
+            values by key
+        """
+        try:
+            with open(self.path) as cache_file:
+                cached = json.load(cache_file)
+
+            if isinstance(cached.get("Values"), dict):
+                return int(cached.get("Index", 0)), cached["Values"]
+        except (AttributeError, IOError, OSError, TypeError, ValueError):
+            pass
+
+        settings.logger.info("Message=No usable config cache at "
+                             "Path={p}".format(p=self.path))
+        return 0, {}
+
+    def index(self, consul_index):
+        """
+        Record the X-Consul-Index of a read, dropping every entry when it
+        went backwards.
+        """
+        if 0 < consul_index < self.consul_index:
+            settings.logger.warn("Message=Consul index went backwards, "
+                                 "dropping config cache ConsulIndex={i} "
+                                 "CachedIndex={c}".format(i=consul_index,
+                                                          c=self.consul_index))
+            self.entries = {}
+            self.dirty = True
+
+        # written with the next change of an entry, the prior state moves
+        # the index on every run
+        self.consul_index = consul_index
+
+    def get(self, key, modify_index, value, parser):
+        """
+        Return the parsed value of `key`, parsing `value` with `parser`
+        only when the cached ModifyIndex differs.
+        """
+        entry = self.entries.get(key)
+
+        if entry and entry.get("ModifyIndex") == modify_index:
+            self.hits += 1
+            return entry.get("Value")
+
+        self.misses += 1
+        parsed = parser(value)
+        self.entries[key] = {"ModifyIndex": modify_index, "Value": parsed}
+        self.dirty = True
+
+        return parsed
+
+    def prune(self, keys):
+        """
+        Drop cached keys that no longer exist in Consul.
+        """
+        for key in set(self.entries) - set(keys):
+            del self.entries[key]
+            self.dirty = True
+
+    def save(self):
+        """
+        Atomically replace the cache file when any entry changed.
+        """
+        if not self.dirty:
+            return False
+
+        tmp_path = None
+        try:
+            # mkstemp creates a new file readable by the owner only
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(self.path)),
+                prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+            with os.fdopen(fd, "w") as cache_file:
+                json.dump({"Index": self.consul_index,
+                           "Values": self.entries}, cache_file)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError, TypeError, ValueError), cache_error:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            settings.logger.error("Message=Could not write config cache "
+                                  "Path={p} Error={e}".format(p=self.path,
+                                                              e=cache_error))
+            return False
+
+        self.dirty = False
+        settings.logger.debug("Message=Config cache written "
+                              "Path={p}".format(p=self.path))
+        return True
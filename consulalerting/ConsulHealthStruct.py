@@ -1,6 +1,16 @@
 import settings
 
 
+# Fields of /v1/health/node/<node> kept by ConsulHealthStruct, plus the
+# ones consulalerting adds, anything else Consul returns is dropped
+FIELDS = ("Node", "CheckID", "Name", "Status", "Notes", "Output",
+          "ServiceID", "ServiceName", "Tags", "PriorStatus", "Transition",
+          "History", "Flapping")
+
+# Fields identifying a check, compared by __eq__ and hashed by __hash__
+IDENTITY_FIELDS = ("Node", "CheckID", "Name", "ServiceID", "ServiceName")
+
+
 class ConsulHealthStruct(object):
 
     """
@@ -15,8 +25,13 @@ class ConsulHealthStruct(object):
         "ServiceID": "redis",
         "ServiceName": "redis"
       }
+
+    Only FIELDS are stored, in __slots__ instead of a per object __dict__.
+    Fields that were never set read as None.
     """
 
+    __slots__ = FIELDS + ("_key",)
+
     def __init__(self, **kwargs):
         """
         Constructs a class `ConsulHealthStruct <ConsulHealth> using
@@ -28,17 +43,35 @@ class ConsulHealthStruct(object):
             non_service_checks: /v1/kv/systemchecks, list, of tags for non service checks.
             **kwargs: unpacked dictionary object of /v1/health/node/<node>.
         """
-        #super(ConsulHealthStruct, self).__init__()
-        self.__dict__.update(kwargs)
+        for field in FIELDS:
+            if field in kwargs:
+                setattr(self, field, kwargs[field])
+
+        # identity fields do not change once the object is created
+        self._key = tuple(kwargs.get(field) for field in IDENTITY_FIELDS)
+
+    def _items(self):
+        for field in FIELDS:
+            try:
+                yield field, object.__getattribute__(self, field)
+            except AttributeError:
+                continue
 
     def __str__(self):
-        return "{dict}".format(dict=self.__dict__)
+        return "{dict}".format(dict=self.asDict())
 
     def __getattr__(self, item):
         return None
 
     def __repr__(self):
-        return "{dict}".format(dict=self.__dict__)
+        return "{dict}".format(dict=self.asDict())
+
+    def asDict(self):
+        """
+        Returns:
+          dictionary: of the /v1/health/node/<node> fields the object holds
+        """
+        return dict(self._items())
 
     def __hash__(self):
         """
@@ -50,22 +83,19 @@ class ConsulHealthStruct(object):
         Returns:
           hash: of ConsuLHealthStruct object.
         """
-        return hash((self.Node,
-                     self.CheckID,
-                     self.Name,
-                     self.ServiceID,
-                     self.ServiceName))
+        return hash(self._key)
 
     def __eq__(self, other):
-        return (self.Node,
-                self.CheckID,
-                self.Name,
-                self.ServiceID,
-                self.ServiceName) == (other.Node,
-                                      other.CheckID,
-                                      other.Name,
-                                      other.ServiceID,
-                                      other.ServiceName)
+        if not isinstance(other, ConsulHealthStruct):
+            return NotImplemented
+
+        return self._key == other._key
+
+    def __ne__(self, other):
+        if not isinstance(other, ConsulHealthStruct):
+            return NotImplemented
+
+        return self._key != other._key
 
     def addTags(self, node_catalog, non_service_checks):
         """
@@ -0,0 +1,223 @@
+import time
+import threading
+import requests
+import json as json
+from datetime import datetime
+import settings
+from HTTPSessionPool import HTTPSessionPool
+from RetryPolicy import RetryPolicy, retryAfter
+
+
+class ElasticsearchBulkSink(object):
+
+    """
+    Buffers elasticsearchlog documents and indexes them through the
+    Elasticsearch _bulk API, one request per batch_size documents or at
+    most flush_interval seconds after a document was buffered. Bulk
+    requests are retried as the plugin's RetryPolicy allows, documents of
+    a request that still failed are dropped and counted in `dropped`.
+    Failed items of a bulk response are logged with their error.
+
+    Example use:
+
+        sink = ElasticsearchBulkSink({"url": "http://localhost:9200",
+                                      "index": "consul-alerts-%Y.%m.%d"})
+        sink.add(document)
+        sink.close()
+    """
+
+    def __init__(self, consul_elasticsearch, sessions=None):
+        """
+        Arguments:
+          consul_elasticsearch: elasticsearch plugin configuration, url,
+                                index, type, username, password,
+                                batch_size, flush_interval and retry
+                                are used
+          sessions: HTTPSessionPool to send requests with
+        """
+        self.url = consul_elasticsearch["url"].rstrip("/") + "/_bulk"
+        self.index = consul_elasticsearch.get("index", settings.ELASTICSEARCH_INDEX)
+        self.doc_type = consul_elasticsearch.get("type")
+        self.batch_size = max(int(consul_elasticsearch.get(
+            "batch_size", settings.ELASTICSEARCH_BATCH_SIZE)), 1)
+        self.flush_interval = float(consul_elasticsearch.get(
+            "flush_interval", settings.ELASTICSEARCH_FLUSH_INTERVAL))
+        self.auth = None
+        if consul_elasticsearch.get("username"):
+            self.auth = (consul_elasticsearch["username"],
+                         consul_elasticsearch.get("password"))
+
+        self.retry = RetryPolicy.fromConfig(consul_elasticsearch)
+
+        self.sessions = sessions or HTTPSessionPool()
+        self.documents = []
+        self.last_flush = time.time()
+        self.timer = None
+        self.lock = threading.Lock()
+        self.indexed = 0
+        self.failed = 0
+        # documents of bulk requests that failed after their retries
+        self.dropped = 0
+        self.status_code = None
+
+    def add(self, document):
+        with self.lock:
+            self.documents.append(document)
+            due = len(self.documents) >= self.batch_size or \
+                time.time() - self.last_flush >= self.flush_interval
+
+            if not due and self.timer is None:
+                # no later add may come to send a quiet period's documents
+                self.timer = threading.Timer(self.flush_interval,
+                                             self.flushInterval)
+                self.timer.daemon = True
+                self.timer.start()
+
+        if due:
+            self.flush()
+
+        return self.status_code
+
+    def flushInterval(self):
+        try:
+            self.flush()
+        except requests.RequestException:
+            settings.logger.exception("Message=Elasticsearch bulk request failed")
+
+    def body(self, documents):
+        index = datetime.utcnow().strftime(self.index)
+        action = {"_index": index}
+        if self.doc_type:
+            action["_type"] = self.doc_type
+        action = json.dumps({"index": action})
+
+        return "".join("{a}\n{d}\n".format(a=action, d=json.dumps(document))
+                       for document in documents)
+
+    def parse(self, response, count):
+        """
+        Returns:
+          failed: number of documents Elasticsearch did not index
+        """
+        if not 200 <= response.status_code < 300:
+            settings.logger.error("NotifyPlugin=Elasticsearch Server={url} "
+                                  "Documents={c} Status_Code={s}".format(
+                                      url=self.url, c=count,
+                                      s=response.status_code))
+            return count
+
+        try:
+            result = response.json()
+        except ValueError:
+            settings.logger.error("NotifyPlugin=Elasticsearch Server={url} "
+                                  "Message=Invalid bulk response".format(url=self.url))
+            return count
+
+        if not result.get("errors"):
+            return 0
+
+        failed = 0
+        for item in result.get("items", []):
+            item_result = item.values()[0] if item else {}
+
+            if 200 <= item_result.get("status", 0) < 300:
+                continue
+
+            failed += 1
+            settings.logger.error("NotifyPlugin=Elasticsearch Index={i} "
+                                  "Status_Code={s} Error={e}".format(
+                                      i=item_result.get("_index"),
+                                      s=item_result.get("status"),
+                                      e=json.dumps(item_result.get("error"))))
+        return failed
+
+    def flush(self):
+        """
+        Returns:
+          status_code: of the bulk request, None when nothing was buffered
+        """
+        with self.lock:
+            documents, self.documents = self.documents, []
+            self.last_flush = time.time()
+            timer, self.timer = self.timer, None
+
+        if timer is not None:
+            timer.cancel()
+
+        if not documents:
+            return None
+
+        try:
+            response = self.send(self.body(documents))
+        except requests.RequestException:
+            self.drop(documents)
+            raise
+
+        failed = self.parse(response, len(documents))
+
+        if not 200 <= response.status_code < 300:
+            self.drop(documents)
+
+        with self.lock:
+            self.indexed += len(documents) - failed
+            self.failed += failed
+            self.status_code = response.status_code
+
+        settings.logger.info("NotifyPlugin=Elasticsearch Server={url} "
+                             "Documents={d} Failed={f} Status_Code={s}".format(
+                                 url=self.url, d=len(documents), f=failed,
+                                 s=response.status_code))
+        return response.status_code
+
+    def send(self, data):
+        """
+        POST a bulk request, retried as self.retry allows.
+
+        Returns:
+          response: of the last attempt
+        Raises:
+          requests.RequestException: of the last attempt
+        """
+        description = "NotifyPlugin=Elasticsearch Server={url}".format(url=self.url)
+        attempt = 0
+
+        while True:
+            try:
+                response = self.sessions.post(
+                    self.url, data=data, auth=self.auth,
+                    headers={"content-type": "application/x-ndjson"})
+            except (requests.ConnectionError, requests.Timeout), request_error:
+                if not self.retry.again(attempt):
+                    raise
+
+                time.sleep(self.retry.backoff(attempt, description,
+                                              type(request_error).__name__))
+            else:
+                if not self.retry.retryable(response.status_code) or \
+                        not self.retry.again(attempt):
+                    return response
+
+                time.sleep(self.retry.backoff(attempt, description,
+                                              response.status_code,
+                                              retryAfter(response.headers)))
+
+            attempt += 1
+
+    def drop(self, documents):
+        with self.lock:
+            self.dropped += len(documents)
+
+        settings.logger.error("NotifyPlugin=Elasticsearch Server={url} "
+                              "Message=Bulk request failed, documents dropped "
+                              "Documents={d} Dropped={t}".format(
+                                  url=self.url, d=len(documents),
+                                  t=self.dropped))
+
+    def close(self):
+        """
+        Send the buffered documents and stop the flush_interval timer.
+
+        Returns:
+          status_code: of the last bulk request, None when nothing was buffered
+        """
+        return self.flush()
@@ -0,0 +1,68 @@
+import hashlib
+from ConsulHealthStruct import IDENTITY_FIELDS
+
+
+# per check digests are summed modulo 2 ** 128, the width of an md5
+FINGERPRINT_MODULUS = 1 << 128
+
+
+def _utf8(value):
+    if value is None:
+        return ""
+
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+
+    return str(value)
+
+
+class Fingerprint(object):
+
+    """
+    Canonical fingerprint of a health snapshot, used as the HA lock key
+    under alerting/hashes. Only the identity fields and Status of each
+    check count, Output and any other field is ignored. The md5 of each
+    check is summed modulo 2 ** 128, an order independent hash of the
+    multiset of (identity, status) tuples needing a single pass and no
+    sort. It is not the md5 of the sorted tuples.
+
+    Example use:
+
+        Fingerprint.of(object_list)
+
+        fingerprint = Fingerprint()
+        object_list = [obj for obj in fingerprint.track(stream)]
+        fingerprint.hexdigest()
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def add(self, obj):
+        check = "\0".join([_utf8(getattr(obj, field)) for field in IDENTITY_FIELDS] +
+                          [_utf8(obj.Status)])
+
+        self.total = (self.total + int(hashlib.md5(check).hexdigest(), 16)) % \
+            FINGERPRINT_MODULUS
+        self.count += 1
+
+    def track(self, object_list):
+        """
+        Yields:
+          obj: every object of object_list, after adding it
+        """
+        for obj in object_list:
+            self.add(obj)
+            yield obj
+
+    def hexdigest(self):
+        return "{t:032x}".format(t=self.total)
+
+    @classmethod
+    def of(cls, object_list):
+        fingerprint = cls()
+        for obj in object_list:
+            fingerprint.add(obj)
+
+        return fingerprint.hexdigest()
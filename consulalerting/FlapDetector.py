@@ -0,0 +1,145 @@
+import time
+import settings
+
+
+# Transition set on the alert emitted when a check starts or stops flapping
+FLAPPING_STARTED = "flapping started"
+FLAPPING_STOPPED = "flapping stopped"
+
+
+class FlapDetector(object):
+
+    """
+    Tracks the recent Status changes of every check to suppress the
+    notifications of checks flapping between states. Each check keeps a
+    ring of the timestamps of its last `history_size` changes, stored as
+    `History` next to its Status in the prior state, and a `Flapping` flag.
+
+    Every change scores 1, halving every `half_life` seconds. A check
+    starts flapping once its score reaches `start_score` and stops once
+    the score falls below `stop_score`. The gap between both thresholds
+    keeps a check from toggling in and out of flapping. While flapping,
+    the check's alerts are dropped; one alert is sent when flapping
+    starts and one when it stops, with Transition FLAPPING_STARTED or
+    FLAPPING_STOPPED.
+
+    A check that stopped changing is only re-scored when the next health
+    change triggers a run, so "flapping stopped" can come late in a quiet
+    datacenter. While a check is flapping, runs where only the Output of
+    checks changed re-score it too instead of returning early.
+
+    Example use:
+
+        detector = FlapDetector(health_prior_object_list)
+        detector.update(health_current_object_list)
+        alert_list = detector.filter(alert_list)
+    """
+
+    def __init__(self, health_prior_object_list, now=None,
+                 history_size=None, half_life=None,
+                 start_score=None, stop_score=None):
+        """
+        Arguments:
+          health_prior_object_list: List of ConsulHealthStruct, with the
+                                    History and Flapping of the prior state
+          now: timestamp of the current snapshot, time.time() if not given
+          history_size: changes kept per check, settings.FLAP_HISTORY_SIZE
+          half_life: seconds for a change's score to halve,
+                     settings.FLAP_HALF_LIFE
+          start_score: score a check starts flapping at,
+                       settings.FLAP_START_SCORE, 0 disables detection
+          stop_score: score a flapping check stops below,
+                      settings.FLAP_STOP_SCORE
+        """
+        self.now = int(now or time.time())
+        self.history_size = history_size or settings.FLAP_HISTORY_SIZE
+        self.half_life = half_life or settings.FLAP_HALF_LIFE
+        self.start_score = settings.FLAP_START_SCORE \
+            if start_score is None else start_score
+        self.stop_score = settings.FLAP_STOP_SCORE \
+            if stop_score is None else stop_score
+
+        self.prior_index = dict((obj, obj) for obj in health_prior_object_list)
+        self.started = []
+        self.stopped = []
+        self.flapping = set()
+
+    @property
+    def enabled(self):
+        return self.start_score > 0
+
+    def score(self, history):
+        return sum(0.5 ** (float(self.now - changed) / self.half_life)
+                   for changed in history)
+
+    def update(self, health_current_object_list):
+        """
+        Record the Status changes of the current snapshot, setting History
+        and Flapping on every object so they are written with the prior
+        state.
+        """
+        for obj in health_current_object_list:
+            prior = self.prior_index.get(obj)
+
+            if prior is None:
+                history, flapping = [], False
+            else:
+                history, flapping = list(prior.History or []), bool(prior.Flapping)
+
+                if prior.Status != obj.Status:
+                    history.append(self.now)
+                    history = history[-self.history_size:]
+
+            if self.enabled:
+                score = self.score(history)
+
+                if not flapping and score >= self.start_score:
+                    flapping = True
+                    self.started.append(obj)
+                elif flapping and score < self.stop_score:
+                    flapping = False
+                    self.stopped.append(obj)
+            else:
+                flapping = False
+
+            obj.History = history
+            obj.Flapping = flapping
+
+            if flapping:
+                self.flapping.add(obj)
+
+        if self.started or self.stopped:
+            settings.logger.info("Message=Flap detection Flapping={f} "
+                                 "Started={s} Stopped={p}".format(
+                                     f=len(self.flapping),
+                                     s=len(self.started),
+                                     p=len(self.stopped)))
+
+    def filter(self, alert_list):
+        """
+        Returns:
+          alert_list: alert_list without the alerts of flapping checks,
+                      followed by one alert per check that started or
+                      stopped flapping
+        """
+        events = set(self.started + self.stopped)
+        suppressed = [obj for obj in alert_list or []
+                      if obj in self.flapping or obj in events]
+
+        if suppressed:
+            settings.logger.info("Message=Alerts of flapping checks "
+                                 "suppressed Suppressed={s}".format(
+                                     s=len(suppressed)))
+
+        alert_list = [obj for obj in alert_list or []
+                      if obj not in self.flapping and obj not in events]
+
+        for obj in self.started:
+            obj.Transition = FLAPPING_STARTED
+            alert_list.append(obj)
+
+        for obj in self.stopped:
+            obj.Transition = FLAPPING_STOPPED
+            alert_list.append(obj)
+
+        return alert_list
@@ -0,0 +1,81 @@
+import threading
+import requests
+import settings
+from urlparse import urlsplit
+from requests.adapters import HTTPAdapter
+
+
+class HTTPSessionPool(object):
+
+    """
+    One requests.Session per endpoint (scheme://host:port), each with its
+    own keep-alive connection pool. Plugins sending several notifications
+    to the same API reuse the TCP/TLS connection instead of handshaking
+    for every message, and in WatchCheckDaemon connections stay open
+    between runs.
+
+    Example use:
+
+        response = HTTPSessionPool().request("POST", "https://slack.com/api/chat.postMessage",
+                                             params={...})
+    """
+
+    def __init__(self, pool_maxsize=None, pool_block=None, timeout=None):
+        """
+        Arguments:
+          pool_maxsize: connections kept open per endpoint,
+                        settings.NOTIFY_HTTP_POOL_MAXSIZE
+          pool_block: wait for a free connection instead of opening an
+                      extra one, settings.NOTIFY_HTTP_POOL_BLOCK
+          timeout: default seconds to connect/read, settings.NOTIFY_HTTP_TIMEOUT
+        """
+        self.pool_maxsize = pool_maxsize or settings.NOTIFY_HTTP_POOL_MAXSIZE
+        self.pool_block = settings.NOTIFY_HTTP_POOL_BLOCK \
+            if pool_block is None else pool_block
+        self.timeout = timeout or settings.NOTIFY_HTTP_TIMEOUT
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def endpoint(url):
+        parts = urlsplit(url)
+        return "{scheme}://{netloc}".format(scheme=parts.scheme.lower(),
+                                            netloc=parts.netloc.lower())
+
+    def session(self, url):
+        """
+        Returns:
+          session: requests.Session shared by every request to url's endpoint
+        """
+        endpoint = self.endpoint(url)
+
+        with self.lock:
+            session = self.sessions.get(endpoint)
+
+            if session is None:
+                session = requests.Session()
+                session.mount(endpoint, HTTPAdapter(pool_connections=1,
+                                                    pool_maxsize=self.pool_maxsize,
+                                                    pool_block=self.pool_block))
+                self.sessions[endpoint] = session
+                settings.logger.debug("Message=New HTTP session "
+                                      "Endpoint={e}".format(e=endpoint))
+
+        return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session(url).request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        with self.lock:
+            sessions, self.sessions = self.sessions, {}
+
+        for session in sessions.itervalues():
+            session.close()
@@ -0,0 +1,128 @@
+import json as json
+import settings
+from ConsulHealthStruct import ConsulHealthStruct
+
+
+class HealthStream(object):
+
+    """
+    Incrementally decodes a /v1/health/state/any JSON array from a file
+    object, e.g. the payload a Consul watch writes to STDIN. The stream
+    is read in chunks and each entry is turned into a ConsulHealthStruct
+    as soon as it is complete, so neither the raw payload nor the list of
+    dictionaries is ever held in full.
+
+    Example use:
+
+        stream = HealthStream(sys.stdin)
+        object_list = [obj for obj in stream if obj.Node not in node_blacklist]
+    """
+
+    WHITESPACE = " \t\n\r"
+
+    def __init__(self, stream, chunk_size=None):
+        """
+        Arguments:
+          stream: file object holding a JSON array of health checks
+          chunk_size: bytes read at a time, settings.HEALTH_STREAM_CHUNK_SIZE
+        """
+        self.stream = stream
+        self.chunk_size = chunk_size or settings.HEALTH_STREAM_CHUNK_SIZE
+        self.decoder = json.JSONDecoder()
+        self.count = 0
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def read(self):
+        """
+        Returns:
+          more: False once the stream is exhausted
+        """
+        if self.eof:
+            return False
+
+        chunk = self.stream.read(self.chunk_size)
+
+        if not chunk:
+            self.eof = True
+            return False
+
+        # drop what was already decoded before growing the buffer
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip(self, characters):
+        """
+        Returns:
+          character: first character at or after pos not in characters,
+                     None at the end of the stream
+        """
+        while True:
+            while self.pos < len(self.buffer) and \
+                    self.buffer[self.pos] in characters:
+                self.pos += 1
+
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+
+            if not self.read():
+                return None
+
+    def decode(self):
+        while True:
+            try:
+                entry, end = self.decoder.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return entry
+            except ValueError:
+                pass
+
+            # entry incomplete (or a number cut short), need more data
+            if not self.read():
+                entry, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return entry
+
+    def __iter__(self):
+        """
+        Yields:
+          obj: ConsulHealthStruct for each entry of the array
+        Raises:
+          ValueError: the stream is not a JSON array of objects
+        """
+        if self.skip(self.WHITESPACE) != "[":
+            raise ValueError("health state is not a JSON array")
+        self.pos += 1
+
+        if self.skip(self.WHITESPACE) == "]":
+            self.pos += 1
+            return
+
+        while True:
+            if self.skip(self.WHITESPACE) is None:
+                raise ValueError("health state ends inside the array")
+
+            entry = self.decode()
+
+            if not isinstance(entry, dict):
+                raise ValueError("health state entry is not an object")
+
+            self.count += 1
+            yield ConsulHealthStruct(**entry)
+
+            separator = self.skip(self.WHITESPACE)
+            self.pos += 1
+
+            if separator == "]":
+                break
+
+            if separator != ",":
+                raise ValueError("expected ',' or ']' in health state")
+
+        if self.skip(self.WHITESPACE) is not None:
+            raise ValueError("extra data after health state")
+
+        settings.logger.info("Message=Health state streamed "
+                             "Checks={c}".format(c=self.count))
@@ -0,0 +1,144 @@
+import os
+import time
+import fcntl
+import threading
+import json as json
+import settings
+
+
+class JSONLinesWriter(object):
+
+    """
+    Buffered writer of JSON lines, shared by every elasticsearchlog
+    notification of a run. Records are kept in memory and appended with
+    a single write per flush while holding an exclusive flock on the log
+    file, so lines of concurrent writers never interleave.
+
+    The file is rotated like logging.handlers.RotatingFileHandler
+    (path.1 ... path.<backup_count>) before a flush would take it past
+    max_bytes, or when it was last written in an earlier rotate_seconds
+    period.
+
+    Example use:
+
+        writer = JSONLinesWriter("/var/log/consul/alerts.json")
+        writer.write({"Node": "consul", "Status": "critical"})
+        writer.close()
+    """
+
+    def __init__(self, path, max_bytes=None, rotate_seconds=None,
+                 backup_count=None, buffer_bytes=None):
+        """
+        Arguments:
+          path: log file
+          max_bytes: rotate before the file exceeds this size, 0 disables,
+                     settings.ELASTICSEARCHLOG_MAX_BYTES
+          rotate_seconds: rotate once per period, 0 disables,
+                          settings.ELASTICSEARCHLOG_ROTATE_SECONDS
+          backup_count: rotated files kept, settings.ELASTICSEARCHLOG_BACKUP_COUNT
+          buffer_bytes: flush once this much is buffered,
+                        settings.ELASTICSEARCHLOG_BUFFER_BYTES
+        """
+        self.path = path
+        self.max_bytes = settings.ELASTICSEARCHLOG_MAX_BYTES \
+            if max_bytes is None else max_bytes
+        self.rotate_seconds = settings.ELASTICSEARCHLOG_ROTATE_SECONDS \
+            if rotate_seconds is None else rotate_seconds
+        self.backup_count = settings.ELASTICSEARCHLOG_BACKUP_COUNT \
+            if backup_count is None else backup_count
+        self.buffer_bytes = buffer_bytes or settings.ELASTICSEARCHLOG_BUFFER_BYTES
+        self.lines = []
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record) + "\n"
+
+        with self.lock:
+            self.lines.append(line)
+            self.size += len(line)
+            full = self.size >= self.buffer_bytes
+
+        if full:
+            self.flush()
+
+    def shouldRotate(self, stat, pending):
+        if stat.st_size == 0:
+            return False
+
+        if self.max_bytes and stat.st_size + pending > self.max_bytes:
+            return True
+
+        if self.rotate_seconds and \
+                int(stat.st_mtime // self.rotate_seconds) != \
+                int(time.time() // self.rotate_seconds):
+            return True
+
+        return False
+
+    def rotate(self):
+        if self.backup_count < 1:
+            os.remove(self.path)
+            return
+
+        for n in xrange(self.backup_count - 1, 0, -1):
+            source = "{p}.{n}".format(p=self.path, n=n)
+            if os.path.exists(source):
+                os.rename(source, "{p}.{n}".format(p=self.path, n=n + 1))
+
+        os.rename(self.path, self.path + ".1")
+
+        settings.logger.info("Message=Rotated Path={p}".format(p=self.path))
+
+    def open(self):
+        """
+        Returns:
+          logfile: self.path opened for appending and exclusively locked,
+                   reopened when another writer rotated it meanwhile
+        """
+        while True:
+            logfile = open(self.path, "a")
+            fcntl.flock(logfile, fcntl.LOCK_EX)
+
+            try:
+                if os.stat(self.path).st_ino == os.fstat(logfile.fileno()).st_ino:
+                    return logfile
+            except OSError:
+                pass
+
+            logfile.close()
+
+    def flush(self):
+        """
+        Raises:
+          IOError, OSError: the log file could not be written, the
+                            buffered lines are kept
+        """
+        with self.lock:
+            if not self.lines:
+                return
+
+            data = "".join(self.lines)
+            logfile = self.open()
+
+            try:
+                if self.shouldRotate(os.fstat(logfile.fileno()), len(data)):
+                    self.rotate()
+                    # the lock on the rotated file is held until the new
+                    # file is written and locked
+                    rotated, logfile = logfile, self.open()
+                    rotated.close()
+
+                logfile.write(data)
+            finally:
+                logfile.close()
+
+            settings.logger.debug("Message=Flushed Path={p} Lines={l} "
+                                  "Bytes={b}".format(p=self.path,
+                                                     l=len(self.lines),
+                                                     b=len(data)))
+            self.lines = []
+            self.size = 0
+
+    def close(self):
+        self.flush()
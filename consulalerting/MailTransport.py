@@ -0,0 +1,81 @@
+import smtplib
+import threading
+import settings
+
+
+class MailTransport(object):
+
+    """
+    A single SMTP connection shared by every email notification of a run.
+    The connection is opened, optionally upgraded with STARTTLS and
+    authenticated on first use, then reused for all messages and teams
+    until close(). A connection dropped by the server is reopened once
+    per message.
+
+    Example use:
+
+        transport = MailTransport(consul_email)
+        transport.sendmail("consul@example.com", ["ops@example.com"], body)
+        transport.close()
+    """
+
+    def __init__(self, consul_email, timeout=None):
+        """
+        Arguments:
+          consul_email: email plugin configuration, mail_domain_address,
+                        username, password and starttls are used
+          timeout: seconds for SMTP socket operations, settings.SMTP_TIMEOUT
+        """
+        self.consul_email = consul_email
+        self.timeout = timeout or settings.SMTP_TIMEOUT
+        self.server = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        server = smtplib.SMTP(self.consul_email["mail_domain_address"],
+                              timeout=self.timeout)
+
+        if self.consul_email.get("starttls"):
+            server.ehlo()
+            server.starttls()
+            server.ehlo()
+
+        if self.consul_email.get("username") and self.consul_email.get("password"):
+            server.login(self.consul_email["username"],
+                         self.consul_email["password"])
+
+        settings.logger.info("Message=SMTP connection opened "
+                             "Server={s}".format(
+                                 s=self.consul_email["mail_domain_address"]))
+        return server
+
+    def sendmail(self, from_address, to_addresses, body):
+        """
+        Send one message to all of to_addresses in a single SMTP transaction.
+
+        Returns:
+          refused: dictionary of refused recipients, see smtplib.SMTP.sendmail
+        """
+        with self.lock:
+            if self.server is None:
+                self.server = self.connect()
+
+            try:
+                return self.server.sendmail(from_address, to_addresses, body)
+            except smtplib.SMTPServerDisconnected:
+                settings.logger.info("Message=SMTP connection dropped, "
+                                     "reconnecting")
+                self.server = self.connect()
+                return self.server.sendmail(from_address, to_addresses, body)
+
+    def close(self):
+        with self.lock:
+            server, self.server = self.server, None
+
+        if server is None:
+            return
+
+        try:
+            server.quit()
+        except smtplib.SMTPException:
+            server.close()
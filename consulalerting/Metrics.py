@@ -0,0 +1,368 @@
+"""
+Counters and histograms about consulalerting itself, rendered in the
+Prometheus text exposition format (version 0.0.4). WatchCheckDaemon
+serves REGISTRY over HTTP on settings.METRICS_PORT. Forked watch
+invocations merge their increments into the state file
+settings.METRICS_STATE_PATH, next to settings.METRICS_TEXTFILE_PATH when
+not set, and write settings.METRICS_TEXTFILE_PATH for the node_exporter
+textfile collector.
+"""
+
+import os
+import fcntl
+import time
+import tempfile
+import threading
+import json as json
+from contextlib import contextmanager
+from functools import wraps
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+import settings
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds, the Prometheus client default buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return unicode(value).replace("\\", "\\\\").replace(
+        "\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value))
+
+
+class Metric(object):
+
+    """
+    Values of a metric by label values, thread safe.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(unicode(labels[label]) for label in self.labels)
+
+    def labelText(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+
+        if not pairs:
+            return ""
+
+        return "{" + ",".join('{n}="{v}"'.format(n=name, v=_escape(value))
+                              for name, value in pairs) + "}"
+
+    def reset(self):
+        with self.lock:
+            self.values = {}
+
+    def dump(self):
+        with self.lock:
+            return [[list(key), value] for key, value in self.values.items()]
+
+    def render(self):
+        lines = ["# HELP {n} {d}".format(n=self.name, d=self.documentation),
+                 "# TYPE {n} {k}".format(n=self.name, k=self.kind)]
+
+        with self.lock:
+            for key in sorted(self.values):
+                lines.extend(self.samples(key, self.values[key]))
+
+        return lines
+
+
+class Counter(Metric):
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self.key(labels), 0)
+
+    def merge(self, dumped):
+        with self.lock:
+            for key, value in dumped:
+                key = tuple(key)
+                self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self, key, value):
+        return ["{n}{l} {v}".format(n=self.name, l=self.labelText(key),
+                                    v=_number(value))]
+
+
+class Histogram(Metric):
+
+    """
+    Values are [bucket counts..., sum], the count being the last
+    (+Inf) bucket.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+
+        with self.lock:
+            observed = self.values.get(key)
+
+            if observed is None:
+                observed = self.values[key] = [0] * len(self.buckets) + [0.0]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    observed[i] += 1
+
+            observed[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start, **labels)
+
+    def timed(self, **labels):
+        """
+        Decorator observing the duration of every call.
+        """
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def get(self, **labels):
+        observed = self.values.get(self.key(labels))
+
+        if observed is None:
+            return 0, 0.0
+
+        return observed[-2], observed[-1]
+
+    def merge(self, dumped):
+        with self.lock:
+            for key, value in dumped:
+                # persisted with other buckets
+                if len(value) != len(self.buckets) + 1:
+                    continue
+
+                key = tuple(key)
+                observed = self.values.get(key)
+
+                if observed is None:
+                    self.values[key] = list(value)
+                else:
+                    self.values[key] = [a + b for a, b in zip(observed, value)]
+
+    def samples(self, key, observed):
+        lines = ["{n}_bucket{l} {v}".format(
+            n=self.name, l=self.labelText(key, [("le", _number(bound))]),
+            v=_number(count))
+            for bound, count in zip(self.buckets, observed)]
+
+        lines.append("{n}_sum{l} {v}".format(n=self.name, l=self.labelText(key),
+                                             v=_number(observed[-1])))
+        lines.append("{n}_count{l} {v}".format(n=self.name,
+                                               l=self.labelText(key),
+                                               v=_number(observed[-2])))
+
+        return lines
+
+
+class Registry(object):
+
+    """
+    Set of metrics rendered together.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+
+    def dump(self):
+        return dict((metric.name, metric.dump()) for metric in self.metrics)
+
+    def merge(self, state):
+        for metric in self.metrics:
+            metric.merge(state.get(metric.name, []))
+
+    def persist(self, state_path=None, textfile_path=None):
+        """
+        Add the values of this process to the cumulative state at
+        state_path and write the totals to textfile_path, both atomically
+        and under an flock so concurrent watch invocations do not lose
+        increments. The registry is reset afterwards, it only holds
+        increments not persisted yet.
+
+        Arguments:
+          state_path: settings.METRICS_STATE_PATH, "<textfile_path>.state"
+            when None
+          textfile_path: settings.METRICS_TEXTFILE_PATH, None disables
+        """
+        textfile_path = textfile_path or settings.METRICS_TEXTFILE_PATH
+
+        if not textfile_path:
+            return False
+
+        # the textfile collector only reads *.prom files
+        state_path = state_path or settings.METRICS_STATE_PATH or \
+            textfile_path + ".state"
+
+        try:
+            with open(state_path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+                try:
+                    with open(state_path) as state_file:
+                        self.merge(json.load(state_file))
+                except (IOError, ValueError):
+                    settings.logger.warn("Message=No previous metrics state "
+                                         "Path={p}".format(p=state_path))
+
+                _replace(state_path, json.dumps(self.dump()))
+                _replace(textfile_path, self.render().encode("utf-8"))
+        except (IOError, OSError), metrics_error:
+            settings.logger.error("Message=Could not write metrics "
+                                  "Path={p} Error={e}".format(p=textfile_path,
+                                                              e=metrics_error))
+            return False
+        finally:
+            self.reset()
+
+        return True
+
+
+def _replace(path, data):
+    # a new file next to path, never one planted there beforehand
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    prefix=os.path.basename(path) + ".",
+                                    suffix=".tmp")
+    try:
+        os.fchmod(fd, 0644)
+        with os.fdopen(fd, "w") as tmp_file:
+            tmp_file.write(data)
+
+        os.rename(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = self.registry.render().encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        settings.logger.debug("Message=Metrics scraped Client={c}".format(
+            c=self.client_address[0]))
+
+
+def serve(registry=None, address=None, port=None):
+    """
+    Serve registry on a daemon thread.
+
+    Returns:
+      server: HTTPServer, server.server_address holds the bound port
+    """
+    class Handler(MetricsHandler):
+        pass
+
+    Handler.registry = registry or REGISTRY
+
+    server = HTTPServer((address or settings.METRICS_ADDRESS,
+                         settings.METRICS_PORT if port is None else port),
+                        Handler)
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    settings.logger.info("Message=Serving metrics Address={a}:{p}".format(
+        a=server.server_address[0], p=server.server_address[1]))
+
+    return server
+
+
+REGISTRY = Registry()
+
+RUNS = REGISTRY.register(Counter(
+    "consulalerting_runs_total", "Evaluations of a health snapshot."))
+
+RUN_SECONDS = REGISTRY.register(Histogram(
+    "consulalerting_run_duration_seconds",
+    "Duration of an evaluation, notifications included."))
+
+LOCKS = REGISTRY.register(Counter(
+    "consulalerting_lock_acquisitions_total",
+    "Locks on a health fingerprint, won or lost to another instance.",
+    ("result",)))
+
+ALERTS = REGISTRY.register(Counter(
+    "consulalerting_alerts_total", "Alerts by transition, e.g. passing->critical.",
+    ("transition",)))
+
+DELIVERIES = REGISTRY.register(Counter(
+    "consulalerting_deliveries_total",
+    "Notification deliveries by plugin and status (ok, failed, timed_out).",
+    ("plugin", "status")))
+
+DELIVERY_SECONDS = REGISTRY.register(Histogram(
+    "consulalerting_delivery_duration_seconds",
+    "Duration of completed notification deliveries.", ("plugin",)))
+
+CONSUL_SECONDS = REGISTRY.register(Histogram(
+    "consulalerting_consul_request_duration_seconds",
+    "Duration of Consul API requests.", ("endpoint",)))
@@ -0,0 +1,148 @@
+import time
+import threading
+import settings
+from Queue import Queue, Empty
+
+
+class Delivery(object):
+
+    """
+    A single plugin call, e.g. plugins.notify_slack for one alert, and its
+    result once a NotificationDispatcher worker ran it.
+    """
+
+    def __init__(self, plugin, target, args):
+        """
+        Arguments:
+          plugin: plugin name, e.g. "slack"
+          target: function to call
+          args: tuple of arguments for target
+        """
+        self.plugin = plugin
+        self.target = target
+        self.args = args
+        self.result = None
+        self.error = None
+        self.elapsed = None
+        self.started = False
+        self.completed = False
+        # set once target returned or raised
+        self.done = threading.Event()
+
+    def run(self):
+        self.started = True
+        start = time.time()
+        try:
+            self.result = self.target(*self.args)
+        except Exception, delivery_error:
+            self.failed(delivery_error)
+        self.finished(start)
+
+    def failed(self, delivery_error):
+        self.error = delivery_error
+        settings.logger.exception("Message=Delivery failed "
+                                  "NotifyPlugin={p}".format(p=self.plugin))
+
+    def finished(self, start):
+        self.elapsed = time.time() - start
+        self.completed = True
+        self.done.set()
+
+    @property
+    def running(self):
+        """
+        target is still running on a thread, e.g. past the deadline
+        """
+        return self.started and not self.completed
+
+    @property
+    def ok(self):
+        return self.completed and self.error is None
+
+    def __repr__(self):
+        return "Delivery({plugin}, Result={result}, Error={error}, " \
+            "Elapsed={elapsed})".format(plugin=self.plugin,
+                                        result=self.result,
+                                        error=self.error,
+                                        elapsed=self.elapsed)
+
+
+class NotificationDispatcher(object):
+
+    """
+    Runs Deliveries on a bounded pool of worker threads fed from a queue,
+    instead of a Process per delivery. Run returns once every delivery
+    completed or the deadline passed, deliveries not started by then are
+    abandoned and flagged as timed out. A delivery already running keeps
+    its worker until it returns, see Delivery.running.
+
+    Example use:
+
+        deliveries = NotificationDispatcher(workers=4, deadline=30).Run(
+            [Delivery("slack", plugins.notify_slack, (message, rooms, slack))])
+    """
+
+    def __init__(self, workers=None, deadline=None):
+        """
+        Arguments:
+          workers: maximum concurrent deliveries, settings.NOTIFY_WORKERS
+          deadline: seconds to wait for all deliveries, settings.NOTIFY_DEADLINE
+        """
+        self.workers = workers or settings.NOTIFY_WORKERS
+        self.deadline = deadline or settings.NOTIFY_DEADLINE
+        self.queue = Queue()
+        self.expired = threading.Event()
+
+    def worker(self):
+        while not self.expired.is_set():
+            try:
+                delivery = self.queue.get_nowait()
+            except Empty:
+                return
+
+            delivery.run()
+
+    def Run(self, deliveries):
+        """
+        Returns:
+          deliveries: the given Deliveries with their results
+        """
+        if not deliveries:
+            return deliveries
+
+        for delivery in deliveries:
+            self.queue.put(delivery)
+
+        threads = [threading.Thread(target=self.worker)
+                   for _ in xrange(min(self.workers, len(deliveries)))]
+
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        deadline = time.time() + self.deadline
+        for thread in threads:
+            thread.join(max(deadline - time.time(), 0))
+
+        self.expired.set()
+
+        logDeliveries(deliveries, self.deadline)
+
+        return deliveries
+
+
+def logDeliveries(deliveries, deadline):
+    timed_out = [delivery for delivery in deliveries if not delivery.completed]
+    failed = [delivery for delivery in deliveries
+              if delivery.completed and not delivery.ok]
+
+    if timed_out:
+        settings.logger.error("Message=Notification deadline of {d}s "
+                              "exceeded, TimedOut={t}".format(d=deadline,
+                                                              t=len(timed_out)))
+
+    settings.logger.info("Message=Deliveries finished Total={total} "
+                         "Failed={failed} TimedOut={timed_out}".format(
+                             total=len(deliveries),
+                             failed=len(failed),
+                             timed_out=len(timed_out)))
@@ -1,13 +1,40 @@
+import threading
 import requests
 import consulate
 import json as json
-import smtplib
-import string
-import sys
 import settings
 import plugins
 import utilities
-from multiprocessing import Process
+import RetryPolicy
+from AlertingConfig import AlertingConfig
+from MailTransport import MailTransport
+from CachetComponents import CachetComponents
+from JSONLinesWriter import JSONLinesWriter
+from ElasticsearchBulkSink import ElasticsearchBulkSink
+from NotificationDispatcher import NotificationDispatcher, Delivery
+from FlapDetector import FLAPPING_STARTED, FLAPPING_STOPPED
+from RateLimiter import RateLimiter
+
+
+# plugins able to send one aggregated message per destination
+DIGEST_NOTIFIERS = {"hipchat": plugins.notify_hipchat,
+                    "slack": plugins.notify_slack,
+                    "mailgun": plugins.notify_mailgun,
+                    "email": plugins.notify_email}
+
+# plugins rate limited per destination (room, team, service key)
+RATE_LIMITED_NOTIFIERS = dict(DIGEST_NOTIFIERS,
+                              pagerduty=plugins.notify_pagerduty)
+
+# incident of the pagerduty rate limit summary, kept apart from the
+# Node/CheckID incidents of the alerts it holds
+PAGERDUTY_SUMMARY_INCIDENT_KEY = "consulalerting/rate-limited"
+
+# most severe first, picks the color of a hipchat digest
+STATUS_SEVERITY = {settings.CRITICAL_STATE: 0,
+                   settings.WARNING_STATE: 1,
+                   settings.UNKNOWN_STATE: 2,
+                   settings.PASSING_STATE: 3}
 
 
 class NotificationEngine(object):
@@ -33,23 +60,38 @@ class NotificationEngine(object):
         NotificationEngine([ConsulHealthNodeStruct,ConsulHealthNodeStruct]).Run()
     """
 
-    def __init__(self, alert_list, consulate_session):
+    def __init__(self, alert_list, consulate_session, config=None,
+                 cachet_components=None, rate_limiter=None):
         """consul_watch_handler_checks, will send a list of ConsulHealthNodeStruct
 
         Arguments:
           alert_list: List of ConsulHealthNodeStruct Object
           consulate_session: Consulate object
+          config: AlertingConfig, read from Consul when needed if not given
+          cachet_components: CachetComponents kept between runs, a new
+                             index is used for this run if not given
+          rate_limiter: RateLimiter kept between runs, limits only apply
+                        within this run if not given
         """
         self.alert_list = alert_list
         self.consul = consulate_session
+        self.config = config
+        self.cachet_components = cachet_components
+        self.rate_limiter = rate_limiter
 
     def __getattr__(self, item):
         return None
 
+    def get_config(self):
+        if self.config is None:
+            self.config = AlertingConfig.load()
+
+        return self.config
+
     def get_available_plugins(self):
         try:
             self.available_plugins = set(
-                json.loads(self.consul.kv[settings.KV_ALERTING_AVAILABLE_PLUGINS]))
+                self.get_config().available_plugins)
 
             settings.logger.info(
                 "Plugins available, Plugins={plug}".format(
@@ -86,127 +128,404 @@ class NotificationEngine(object):
             "Configuration files to load,"
             "Configurations={configs}".format(configs=list(configurations_files_to_load)))
 
-        if "hipchat" in configurations_files_to_load:
-            self.hipchat = utilities.load_plugin(
-                settings.KV_ALERTING_NOTIFY_HIPCHAT, "rooms")
-
-        if "slack" in configurations_files_to_load:
-            self.slack = utilities.load_plugin(
-                settings.KV_ALERTING_NOTIFY_SLACK, "rooms")
-
-        if "mailgun" in configurations_files_to_load:
-            self.mailgun = utilities.load_plugin(
-                settings.KV_ALERTING_NOTIFY_MAILGUN, "teams")
-
-        if "email" in configurations_files_to_load:
-            self.email = utilities.load_plugin(
-                settings.KV_ALERTING_NOTIFY_EMAIL, "teams")
+        plugins = self.get_config().plugins
 
-        if "pagerduty" in configurations_files_to_load:
-            self.pagerduty = utilities.load_plugin(
-                settings.KV_ALERTING_NOTIFY_PAGERDUTY, "teams")
-
-        if "influxdb" in configurations_files_to_load:
-            self.influxdb = utilities.load_plugin(
-                settings.KV_ALERTING_NOTIFY_INFLUXDB, "databases")
-
-        if "cachet" in configurations_files_to_load:
-            self.cachet = utilities.load_plugin(
-                settings.KV_ALERTING_NOTIFY_CACHET)
-
-        if "elasticsearchlog" in configurations_files_to_load:
-            self.elasticsearchlog = utilities.load_plugin(
-                settings.KV_ALERTING_NOTIFY_ELASTICSEARCHLOG)
+        for plugin in configurations_files_to_load:
+            if plugin in settings.NOTIFY_PLUGINS:
+                setattr(self, plugin, plugins.get(plugin))
 
         return (self.hipchat, self.slack, self.mailgun,
                 self.email, self.pagerduty, self.influxdb, self.elasticsearchlog)
 
     def message_pattern(self, obj):
 
+        if obj.Transition == FLAPPING_STARTED:
+            state = "flapping, last in a {state} state,".format(state=obj.Status)
+        elif obj.Transition == FLAPPING_STOPPED:
+            state = "no longer flapping, in a {state} state,".format(
+                state=obj.Status)
+        else:
+            state = "in a {state} state".format(state=obj.Status)
+
         if obj.ServiceName or obj.ServiceID:
 
             message_template = "Service {name}: "\
-                "is in a {state} state on {node}. "\
+                "is {state} on {node}. "\
                 "Output from check: {output}".format(name=obj.ServiceName,
-                                                     state=obj.Status,
+                                                     state=state,
                                                      node=obj.Node,
                                                      output=obj.Output)
 
         else:
 
             message_template = "System Check {name}: is "\
-                "in a {state} state on {node}. "\
+                "{state} on {node}. "\
                 "Output from check: {output}".format(name=obj.CheckID,
-                                                     state=obj.Status,
+                                                     state=state,
                                                      node=obj.Node,
                                                      output=obj.Output)
 
         return message_template
 
     def run_notifiers(self, obj):
+        """
+        Returns:
+          deliveries: List of Delivery for every plugin tagged on obj
+        """
 
         message_template = self.message_pattern(obj)
+        deliveries = []
 
-        if "hipchat" in obj.Tags and self.hipchat:
+        if "hipchat" in obj.Tags and self.hipchat and not self.digest("hipchat"):
             common_notifiers = utilities.common_notifiers(
                 obj, "rooms", self.hipchat)
+            common_notifiers = self.rate_limit("hipchat", obj, common_notifiers)
             hipchat = self.hipchat
-            _ = Process(target=plugins.notify_hipchat, args=(obj, message_template,
-                                                         common_notifiers,
-                                                         hipchat)).start()
+            if common_notifiers:
+                deliveries.append(Delivery("hipchat", plugins.notify_hipchat,
+                                           (obj, message_template,
+                                            common_notifiers,
+                                            hipchat)))
 
-        if "slack" in obj.Tags and self.slack:
+        if "slack" in obj.Tags and self.slack and not self.digest("slack"):
             common_notifiers = utilities.common_notifiers(
                 obj, "rooms", self.slack)
+            common_notifiers = self.rate_limit("slack", obj, common_notifiers)
             slack = self.slack
-            _ = Process(target=plugins.notify_slack, args=(message_template,
-                                                       common_notifiers,
-                                                       slack)).start()
+            if common_notifiers:
+                deliveries.append(Delivery("slack", plugins.notify_slack,
+                                           (message_template,
+                                            common_notifiers,
+                                            slack)))
 
-        if "mailgun" in obj.Tags and self.mailgun:
+        if "mailgun" in obj.Tags and self.mailgun and not self.digest("mailgun"):
             common_notifiers = utilities.common_notifiers(
                 obj, "teams", self.mailgun)
+            common_notifiers = self.rate_limit("mailgun", obj, common_notifiers)
             mailgun = self.mailgun
-            _ = Process(target=plugins.notify_mailgun, args=(message_template,
-                                                         common_notifiers,
-                                                         mailgun)).start()
+            if common_notifiers:
+                deliveries.append(Delivery("mailgun", plugins.notify_mailgun,
+                                           (message_template,
+                                            common_notifiers,
+                                            mailgun)))
 
-        if "email" in obj.Tags and self.email:
+        if "email" in obj.Tags and self.email and not self.digest("email"):
             common_notifiers = utilities.common_notifiers(
                 obj, "teams", self.email)
+            common_notifiers = self.rate_limit("email", obj, common_notifiers)
             email = self.email
-            _ = Process(target=plugins.notify_email, args=(message_template,
-                                                       common_notifiers,
-                                                       email)).start()
+            if common_notifiers:
+                deliveries.append(Delivery("email", plugins.notify_email,
+                                           (message_template,
+                                            common_notifiers,
+                                            email,
+                                            self.mail_transport)))
 
         if "pagerduty" in obj.Tags and self.pagerduty:
             common_notifiers = utilities.common_notifiers(
                 obj, "teams", self.pagerduty)
+            common_notifiers = self.rate_limit("pagerduty", obj, common_notifiers)
             pagerduty = self.pagerduty
-            _ = Process(target=plugins.notify_pagerduty, args=(obj,
-                                                           message_template,
-                                                           common_notifiers,
-                                                           pagerduty)).start()
-
-        if "influxdb" in obj.Tags and self.influxdb:
-            common_notifiers = utilities.common_notifiers(
-                obj, "databases", self.influxdb)
-            influxdb = self.influxdb
-            _ = Process(target=plugins.notify_influxdb, args=(obj, message_template,
-                                                         common_notifiers,
-                                                         influxdb)).start()
+            if common_notifiers:
+                deliveries.append(Delivery("pagerduty", plugins.notify_pagerduty,
+                                           (obj,
+                                            message_template,
+                                            common_notifiers,
+                                            pagerduty)))
 
         if "cachet" in obj.Tags and self.cachet:
-            _ = Process(target=plugins.notify_cache, args=(obj, message_template, self.cachet)).start()
+            deliveries.append(Delivery("cachet", plugins.notify_cache,
+                                       (obj, message_template, self.cachet,
+                                        self.cachet_components)))
 
         if "elasticsearchlog" in obj.Tags and self.elasticsearchlog:
-            _ = Process(target=plugins.notify_elasticsearchlog, args=(obj, message_template,
-                                                                      self.elasticsearchlog)).start()
+            deliveries.append(Delivery("elasticsearchlog",
+                                       plugins.notify_elasticsearchlog,
+                                       (obj, message_template,
+                                        self.elasticsearchlog,
+                                        self.eslog_writer)))
+
+        if "elasticsearch" in obj.Tags and self.elasticsearch:
+            deliveries.append(Delivery("elasticsearch",
+                                       plugins.notify_elasticsearch,
+                                       (obj, message_template,
+                                        self.elasticsearch,
+                                        self.es_sink)))
+
+        return deliveries
+
+    def digest(self, plugin):
+        """
+        Returns:
+          digest: True when alerts for `plugin` are aggregated per
+                  destination, "digest" in the plugin configuration,
+                  settings.NOTIFY_DIGEST when not set
+        """
+        plugin_config = getattr(self, plugin)
+
+        if plugin not in DIGEST_NOTIFIERS or not plugin_config:
+            return False
+
+        return bool(plugin_config.get("digest", settings.NOTIFY_DIGEST))
+
+    def digest_message(self, alerts, total, part, parts):
+        header = "{total} Consul alerts".format(total=total)
+
+        if parts > 1:
+            header += " (part {part} of {parts})".format(part=part, parts=parts)
+
+        return "\n".join([header + ":"] +
+                          ["- " + self.message_pattern(obj) for obj in alerts])
+
+    def destination_args(self, plugin, message, destination, alerts):
+        """
+        Returns:
+          args: of the plugin's notify function, sending one message
+                about `alerts` to a single destination
+        """
+        args = (message, set([destination]), getattr(self, plugin))
+
+        if plugin == "email":
+            args += (self.mail_transport,)
+
+        if plugin in ("hipchat", "pagerduty"):
+            # hipchat colors the message by the worst status, pagerduty
+            # triggers or resolves by it
+            args = (min(alerts, key=lambda obj: STATUS_SEVERITY.get(
+                obj.Status, len(STATUS_SEVERITY))),) + args
+
+        return args
+
+    def digest_notifiers(self):
+        """
+        Group the alerts of every digest enabled plugin by destination
+        (room or team), each destination gets one message holding at most
+        "digest_max_alerts" (settings.NOTIFY_DIGEST_MAX_ALERTS) alerts.
+
+        Returns:
+          deliveries: List of Delivery, one per destination and message
+        """
+        deliveries = []
+
+        for plugin in sorted(DIGEST_NOTIFIERS):
+            if not self.digest(plugin):
+                continue
+
+            plugin_config = getattr(self, plugin)
+            tags_dictname = settings.NOTIFY_PLUGINS[plugin][1]
+            max_alerts = max(int(plugin_config.get(
+                "digest_max_alerts", settings.NOTIFY_DIGEST_MAX_ALERTS)), 1)
+
+            destinations = {}
+            for obj in self.alert_list:
+                if plugin not in obj.Tags:
+                    continue
+
+                for destination in utilities.common_notifiers(
+                        obj, tags_dictname, plugin_config):
+                    destinations.setdefault(destination, []).append(obj)
+
+            for destination in sorted(destinations):
+                alerts = destinations[destination]
+                parts = (len(alerts) + max_alerts - 1) // max_alerts
+
+                for part in xrange(parts):
+                    chunk = alerts[part * max_alerts:(part + 1) * max_alerts]
+                    args = self.destination_args(
+                        plugin,
+                        self.digest_message(chunk, len(alerts), part + 1, parts),
+                        destination, chunk)
+
+                    deliveries.append(Delivery(plugin, DIGEST_NOTIFIERS[plugin], args))
+
+            settings.logger.info("Message=Digest built NotifyPlugin={p} "
+                                 "Destinations={d} Alerts={a}".format(
+                                     p=plugin,
+                                     d=len(destinations),
+                                     a=sum(len(alerts) for alerts in destinations.itervalues())))
+
+        return deliveries
+
+    def rate_limit(self, plugin, obj, destinations):
+        """
+        Returns:
+          destinations: the ones within their rate limits, obj is kept for
+                        the summary message of every other one. pagerduty
+                        resolves are never limited, a summary can not
+                        resolve their incidents
+        """
+        if self.rate_limiter is None:
+            return destinations
+
+        if plugin == "pagerduty" and obj.Status == settings.PASSING_STATE:
+            return destinations
+
+        plugin_config = getattr(self, plugin)
+        allowed = set()
+
+        for destination in destinations:
+            if self.rate_limiter.allow(plugin, destination, plugin_config):
+                allowed.add(destination)
+            else:
+                self.rate_limited.setdefault((plugin, destination),
+                                             []).append(obj)
+
+        return allowed
+
+    def summary_message(self, alerts):
+        max_alerts = settings.NOTIFY_DIGEST_MAX_ALERTS
+        lines = ["{total} Consul alerts held back by rate limiting:".format(
+            total=len(alerts))]
+
+        lines.extend("- " + self.message_pattern(obj)
+                     for obj in alerts[:max_alerts])
+
+        if len(alerts) > max_alerts:
+            lines.append("- and {more} more".format(more=len(alerts) - max_alerts))
+
+        return "\n".join(lines)
+
+    def summary_notifiers(self):
+        """
+        Returns:
+          deliveries: one summary message per rate limited destination,
+                      sent regardless of its rate limit
+        """
+        deliveries = []
+
+        for plugin, destination in sorted(self.rate_limited):
+            alerts = self.rate_limited[(plugin, destination)]
+
+            settings.logger.warn("Message=Rate limit exceeded, sending a "
+                                 "summary NotifyPlugin={p} Destination={d} "
+                                 "Alerts={a}".format(p=plugin, d=destination,
+                                                     a=len(alerts)))
+
+            args = self.destination_args(plugin, self.summary_message(alerts),
+                                         destination, alerts)
+
+            if plugin == "pagerduty":
+                args += (PAGERDUTY_SUMMARY_INCIDENT_KEY,)
+
+            deliveries.append(Delivery(
+                plugin, RATE_LIMITED_NOTIFIERS[plugin], args))
+
+        return deliveries
+
+    def influxdb_notifiers(self):
+        """
+        Returns:
+          deliveries: a single Delivery writing the points of every
+                      influxdb tagged alert, empty when there are none
+        """
+        if not self.influxdb:
+            return []
+
+        alerts = [(obj, self.message_pattern(obj),
+                   utilities.common_notifiers(obj, "databases", self.influxdb))
+                  for obj in self.alert_list if "influxdb" in obj.Tags]
+
+        if not alerts:
+            return []
+
+        return [Delivery("influxdb", plugins.notify_influxdb_batch,
+                         (alerts, self.influxdb))]
 
     def Run(self):
+        """
+        Returns:
+          deliveries: List of Delivery with the result of each plugin call
+        """
         self.get_available_plugins()
         self.get_unique_tags_keys()
         self.load_plugins_from_tags()
 
+        if self.cachet and self.cachet_components is None:
+            # one components fetch for every cachet alert of the run
+            self.cachet_components = CachetComponents()
+
+        if self.email:
+            # one SMTP connection for every email of the run
+            self.mail_transport = MailTransport(self.email)
+
+        if self.elasticsearchlog:
+            # every elasticsearchlog line of the run written in one flush
+            self.eslog_writer = JSONLinesWriter(
+                self.elasticsearchlog["logpath"],
+                max_bytes=self.elasticsearchlog.get("max_bytes"),
+                rotate_seconds=self.elasticsearchlog.get("rotate_seconds"),
+                backup_count=self.elasticsearchlog.get("backup_count"))
+
+        if self.elasticsearch:
+            # documents of the run indexed in _bulk batches
+            self.es_sink = ElasticsearchBulkSink(self.elasticsearch,
+                                                 plugins.SESSIONS)
+
+        # retries left to the deliveries of this run
+        RetryPolicy.BUDGET.reset()
+
+        if self.rate_limiter is None:
+            self.rate_limiter = RateLimiter()
+
+        # alerts held back per (plugin, destination), sent as a summary
+        self.rate_limited = {}
+
+        deliveries = []
         for obj in self.alert_list:
-            self.run_notifiers(obj)
+            deliveries.extend(self.run_notifiers(obj))
+
+        deliveries.extend(self.summary_notifiers())
+        deliveries.extend(self.digest_notifiers())
+        deliveries.extend(self.influxdb_notifiers())
+
+        running = []
+        try:
+            deliveries = self.dispatcher().Run(deliveries)
+            running = [delivery for delivery in deliveries if delivery.running]
+            return deliveries
+        finally:
+            if running:
+                # deliveries past the deadline still use the transports,
+                # they are closed from a thread once those returned
+                settings.logger.info("Message=Closing notification transports "
+                                     "once running deliveries return "
+                                     "Running={r}".format(r=len(running)))
+                closer = threading.Thread(target=self.closeTransports,
+                                          args=(running,))
+                closer.daemon = True
+                closer.start()
+            else:
+                self.closeTransports()
+
+    def closeTransports(self, running=()):
+        """
+        Close the transports shared by the deliveries of a run once every
+        delivery in `running` returned.
+        """
+        for delivery in running:
+            delivery.done.wait()
+
+        if self.mail_transport:
+            self.mail_transport.close()
+
+        if self.es_sink:
+            try:
+                self.es_sink.close()
+            except requests.RequestException:
+                settings.logger.exception("Message=Elasticsearch bulk "
+                                          "request failed")
+
+        if self.eslog_writer:
+            try:
+                self.eslog_writer.close()
+            except (IOError, OSError), es_log_error:
+                settings.logger.error("There was an issue writing to {logpath}: {error}".format(
+                    logpath=self.eslog_writer.path, error=es_log_error))
+
+    def dispatcher(self):
+        if settings.NOTIFY_DISPATCHER == "async":
+            # tornado is only required for the async dispatcher
+            from AsyncNotificationDispatcher import AsyncNotificationDispatcher
+            return AsyncNotificationDispatcher()
+
+        return NotificationDispatcher()
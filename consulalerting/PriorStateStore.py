@@ -0,0 +1,317 @@
+import hashlib
+import time
+import zlib
+import requests
+import json as json
+import settings
+import utilities
+import Metrics
+
+
+# Fields kept per check, the identity used by ConsulHealthStruct.__hash__
+# followed by Status
+PRIOR_STATE_FIELDS = ("Node", "CheckID", "Name", "ServiceID", "ServiceName",
+                      "Status")
+
+# Fields added by version 3, the flap detection state of each check
+PRIOR_STATE_HISTORY_FIELDS = ("History", "Flapping")
+
+
+def encode(object_list, version=None, fingerprint=None):
+    """
+    Encode a list of ConsulHealthStruct as prior state.
+
+      version 1: the full /v1/health/state/any JSON list, Output included
+      version 2: {"Version": 2, "Fields": [...], "Checks": [[...], ...]},
+                 only PRIOR_STATE_FIELDS of each check are kept
+      version 3: version 2 with PRIOR_STATE_HISTORY_FIELDS appended, the
+                 Status change timestamps and flapping flag of FlapDetector
+
+    version defaults to settings.PRIOR_STATE_VERSION. Versions 2 and 3 also
+    keep `fingerprint`, the WatchCheckHandler.processedFingerprint of the
+    run the prior state was written by.
+    """
+    if version is None:
+        version = settings.PRIOR_STATE_VERSION
+
+    if version == 1:
+        return json.dumps([obj.asDict() for obj in object_list])
+
+    fields = PRIOR_STATE_FIELDS
+    if version >= 3:
+        fields += PRIOR_STATE_HISTORY_FIELDS
+
+    prior = {"Version": version,
+             "Fields": fields,
+             "Checks": [[getattr(obj, field) for field in fields]
+                        for obj in object_list]}
+
+    if fingerprint:
+        prior["Fingerprint"] = fingerprint
+
+    return json.dumps(prior, separators=(",", ":"))
+
+
+def decode(value):
+    """
+    Decode prior state written by any version of encode into a list of
+    dictionaries usable by utilities.createConsulHealthList.
+
+    Raises:
+      TypeError, ValueError: value is not valid JSON
+    """
+    return decodeState(value)[0]
+
+
+def decodeState(value):
+    """
+    Returns:
+      (checks, fingerprint): checks as decode, fingerprint given to
+        encode or None
+    Raises:
+      TypeError, ValueError: value is not valid JSON
+    """
+    prior = json.loads(value)
+
+    # version 1, a plain /v1/health/state/any list
+    if isinstance(prior, list):
+        return prior, None
+
+    if isinstance(prior, dict) and prior.get("Version") in (2, 3):
+        fields = prior["Fields"]
+        return ([dict(zip(fields, check)) for check in prior["Checks"]],
+                prior.get("Fingerprint"))
+
+    settings.logger.error("Message=Unknown prior state format "
+                          "ConsulURI={l}".format(l=settings.KV_PRIOR_STATE))
+    raise ValueError("unknown prior state format")
+
+
+def isPriorKey(key):
+    return key == settings.KV_PRIOR_STATE or \
+        key.startswith(settings.KV_PRIOR_STATE + "/")
+
+
+def read(values, modify_indexes=None):
+    """
+    Select the most recently written prior state out of the alerting/
+    KV values, either the single KV_PRIOR_STATE key or the chunked
+    manifest, whichever has the higher ModifyIndex.
+
+    Returns:
+      value: encoded prior state for decode, None when there is none
+    Raises:
+      ValueError: chunked prior state is incomplete or corrupt
+    """
+    modify_indexes = modify_indexes or {}
+
+    if values.get(settings.KV_PRIOR_STATE_MANIFEST) and \
+            modify_indexes.get(settings.KV_PRIOR_STATE_MANIFEST, 0) >= \
+            modify_indexes.get(settings.KV_PRIOR_STATE, 0):
+        return ChunkedPriorStateStore.assemble(values)
+
+    return values.get(settings.KV_PRIOR_STATE)
+
+
+def store(consulate_session, config):
+    """
+    Returns:
+      store: the prior state store selected by settings.PRIOR_STATE_STORE
+    """
+    if settings.PRIOR_STATE_STORE == "chunked":
+        return ChunkedPriorStateStore(consulate_session, config.prior_keys,
+                                      config.prior_manifest)
+
+    return KVPriorStateStore(consulate_session)
+
+
+class KVPriorStateStore(object):
+
+    """
+    Stores prior state under the single key settings.KV_PRIOR_STATE.
+    """
+
+    def __init__(self, consulate_session, key=settings.KV_PRIOR_STATE):
+        """
+        Arguments:
+          consulate_session: Consulate session object
+          key: KV location of the prior state
+        """
+        self.consul = consulate_session
+        self.key = key
+
+    def write(self, object_list, fingerprint=None):
+        """
+        Returns:
+          size: bytes written
+        """
+        value = encode(object_list, fingerprint=fingerprint)
+        with Metrics.CONSUL_SECONDS.time(endpoint="kv_put"):
+            self.consul.kv[self.key] = value
+
+        settings.logger.info("Message=Prior state written "
+                             "Checks={c} Bytes={b}".format(c=len(object_list),
+                                                           b=len(value)))
+        return len(value)
+
+
+class ChunkedPriorStateStore(object):
+
+    """
+    Stores prior state zlib compressed and split into chunks of
+    settings.PRIOR_STATE_CHUNK_SIZE under KV_PRIOR_STATE/<generation>/<n>.
+    The manifest key KV_PRIOR_STATE_MANIFEST is written last and names
+    the generation to read, so readers never see a partially written
+    prior state. All chunks come back with the recursive alerting/ read
+    done by AlertingConfig.
+
+    Manifest:
+      {"Generation": "<hex ms>", "Chunks": n, "Encoding": "zlib",
+       "Size": bytes, "Digest": "<md5 of compressed data>"}
+    """
+
+    def __init__(self, consulate_session, prior_keys=(), prior_manifest=None):
+        """
+        Arguments:
+          consulate_session: Consulate session object
+          prior_keys: keys under KV_PRIOR_STATE at the time of reading
+          prior_manifest: manifest at the time of reading
+        """
+        self.consul = consulate_session
+        self.prior_keys = prior_keys
+        self.prior_manifest = prior_manifest or {}
+
+    @staticmethod
+    def chunkKey(generation, n):
+        return "{p}/{g}/{n}".format(p=settings.KV_PRIOR_STATE, g=generation, n=n)
+
+    @staticmethod
+    def generation(key):
+        """
+        Returns:
+          generation: of a chunk key, None for other keys
+        """
+        parts = key[len(settings.KV_PRIOR_STATE) + 1:].split("/")
+
+        if len(parts) != 2:
+            return None
+
+        return parts[0]
+
+    @staticmethod
+    def assemble(values):
+        """
+        Returns:
+          value: decompressed prior state named by the manifest in values
+        Raises:
+          ValueError: manifest, chunk or digest is missing or invalid
+        """
+        manifest = json.loads(values[settings.KV_PRIOR_STATE_MANIFEST])
+
+        chunks = []
+        for n in xrange(manifest["Chunks"]):
+            chunk = values.get(ChunkedPriorStateStore.chunkKey(
+                manifest["Generation"], n))
+
+            if chunk is None:
+                raise ValueError("prior state chunk {n} of generation {g} "
+                                 "missing".format(n=n, g=manifest["Generation"]))
+            chunks.append(chunk)
+
+        data = "".join(chunks)
+
+        if hashlib.md5(data).hexdigest() != manifest["Digest"]:
+            raise ValueError("prior state digest mismatch for generation "
+                             "{g}".format(g=manifest["Generation"]))
+
+        try:
+            return zlib.decompress(data)
+        except zlib.error:
+            raise ValueError("prior state of generation {g} could not be "
+                             "decompressed".format(g=manifest["Generation"]))
+
+    def write(self, object_list, fingerprint=None):
+        """
+        Returns:
+          size: bytes written
+        """
+        data = zlib.compress(encode(object_list,
+                                    max(settings.PRIOR_STATE_VERSION, 2),
+                                    fingerprint),
+                             settings.PRIOR_STATE_COMPRESSION_LEVEL)
+        generation = "{g:x}".format(g=int(time.time() * 1000))
+        chunk_size = settings.PRIOR_STATE_CHUNK_SIZE
+
+        chunks = [data[i:i + chunk_size]
+                  for i in xrange(0, len(data), chunk_size)]
+
+        for n, chunk in enumerate(chunks):
+            utilities.putRawKey(self.chunkKey(generation, n), chunk)
+
+        manifest = json.dumps({"Generation": generation,
+                               "Chunks": len(chunks),
+                               "Encoding": "zlib",
+                               "Size": len(data),
+                               "Digest": hashlib.md5(data).hexdigest()})
+
+        utilities.putRawKey(settings.KV_PRIOR_STATE_MANIFEST, manifest)
+
+        settings.logger.info("Message=Prior state written "
+                             "Checks={c} Bytes={b} Chunks={n} "
+                             "Generation={g}".format(c=len(object_list),
+                                                     b=len(data),
+                                                     n=len(chunks),
+                                                     g=generation))
+
+        self.cleanup(generation)
+
+        return len(data) + len(manifest)
+
+    def cleanup(self, generation):
+        """
+        Remove the generation replaced by `generation`, chunks left behind
+        by concurrent writers once older than PRIOR_STATE_ORPHAN_TTL, and
+        the single KV_PRIOR_STATE key.
+        """
+        oldest = int(time.time() * 1000) - settings.PRIOR_STATE_ORPHAN_TTL * 1000
+        stale = set()
+
+        for key in self.prior_keys:
+            if key == settings.KV_PRIOR_STATE:
+                self.delete(key)
+                continue
+
+            key_generation = self.generation(key)
+
+            if not key_generation or key_generation == generation:
+                continue
+
+            if key_generation == self.prior_manifest.get("Generation"):
+                stale.add(key_generation)
+                continue
+
+            try:
+                if int(key_generation, 16) < oldest:
+                    stale.add(key_generation)
+            except ValueError:
+                continue
+
+        for key_generation in stale:
+            # trailing slash, recurse is a plain prefix match
+            self.delete("{p}/{g}/".format(p=settings.KV_PRIOR_STATE,
+                                          g=key_generation),
+                        recurse=True)
+
+    @staticmethod
+    def delete(key, recurse=False):
+        """
+        Best effort, the new manifest is already written and a run must
+        not fail before notifying because of leftover keys. Keys not
+        removed are retried by the cleanup of a later write.
+        """
+        try:
+            utilities.deleteKey(key, recurse=recurse)
+        except requests.RequestException, delete_error:
+            settings.logger.warn("Message=Could not remove stale prior state "
+                                 "Key={k} Error={e}".format(k=key,
+                                                            e=delete_error))
@@ -0,0 +1,112 @@
+import time
+import threading
+import settings
+
+
+class TokenBucket(object):
+
+    """
+    Allows `limit` notifications per minute, in bursts of up to `limit`.
+    Tokens refill continuously at limit/60 per second.
+    """
+
+    def __init__(self, limit, now=None):
+        self.limit = limit
+        self.tokens = float(limit)
+        self.updated = time.time() if now is None else now
+
+    def refill(self, now):
+        elapsed = max(now - self.updated, 0)
+        self.tokens = min(self.tokens + elapsed * self.limit / 60.0,
+                          float(self.limit))
+        self.updated = now
+
+    def __repr__(self):
+        return "TokenBucket(Limit={l}, Tokens={t:.2f})".format(l=self.limit,
+                                                              t=self.tokens)
+
+
+class RateLimiter(object):
+
+    """
+    Token buckets limiting notifications per plugin and per plugin
+    destination (room, team, service key). A notification is only allowed
+    when both its plugin and destination buckets hold a token.
+
+    Limits are notifications per minute, read from the plugin's KV
+    configuration:
+
+      "rate_limit": for the whole plugin, settings.NOTIFY_RATE_LIMIT
+      "destination_rate_limit": per destination,
+                                settings.NOTIFY_DESTINATION_RATE_LIMIT
+
+    0 disables a limit. A NotificationEngine run shares one RateLimiter
+    between all its alerts, WatchCheckDaemon keeps one for its lifetime
+    so limits also hold across runs.
+
+    Example use:
+
+        limiter = RateLimiter()
+        if limiter.allow("slack", "#devops", slack_config):
+            plugins.notify_slack(message, set(["#devops"]), slack_config)
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def limits(plugin_config):
+        """
+        Returns:
+          (plugin_limit, destination_limit): notifications per minute
+        """
+        plugin_config = plugin_config or {}
+
+        return (int(plugin_config.get("rate_limit",
+                                      settings.NOTIFY_RATE_LIMIT) or 0),
+                int(plugin_config.get("destination_rate_limit",
+                                      settings.NOTIFY_DESTINATION_RATE_LIMIT) or 0))
+
+    def bucket(self, key, limit, now):
+        bucket = self.buckets.get(key)
+
+        if bucket is None or bucket.limit != limit:
+            bucket = self.buckets[key] = TokenBucket(limit, now)
+        else:
+            bucket.refill(now)
+
+        return bucket
+
+    def allow(self, plugin, destination, plugin_config, now=None):
+        """
+        Take a token from the plugin and destination buckets.
+
+        Returns:
+          allowed: False when either bucket is empty, no token is taken
+        """
+        plugin_limit, destination_limit = self.limits(plugin_config)
+
+        if not plugin_limit and not destination_limit:
+            return True
+
+        if now is None:
+            now = time.time()
+
+        with self.lock:
+            buckets = []
+
+            if plugin_limit:
+                buckets.append(self.bucket((plugin,), plugin_limit, now))
+
+            if destination_limit:
+                buckets.append(self.bucket((plugin, destination),
+                                           destination_limit, now))
+
+            if any(bucket.tokens < 1 for bucket in buckets):
+                return False
+
+            for bucket in buckets:
+                bucket.tokens -= 1
+
+            return True
@@ -0,0 +1,154 @@
+import random
+import threading
+import time
+import settings
+
+
+class RetryBudget(object):
+
+    """
+    Retries left to the deliveries of one NotificationEngine run, so an
+    unreachable endpoint cannot hold every worker in backoff until the
+    NOTIFY_DEADLINE passes. Reset at the start of each run.
+    """
+
+    def __init__(self, retries=None):
+        self.lock = threading.Lock()
+        self.reset(retries)
+
+    def reset(self, retries=None):
+        """
+        Arguments:
+          retries: retries allowed, settings.NOTIFY_RETRY_BUDGET
+        """
+        with self.lock:
+            self.remaining = settings.NOTIFY_RETRY_BUDGET \
+                if retries is None else retries
+
+    def take(self):
+        """
+        Returns:
+          allowed: False once the budget is spent
+        """
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+
+            self.remaining -= 1
+            return True
+
+
+# shared by every delivery of the current run
+BUDGET = RetryBudget()
+
+
+class RetryPolicy(object):
+
+    """
+    When and how long to wait before resending a failed notification
+    request. Status codes in `statuses` (throttling and server errors)
+    and connection errors are retried, any other status is permanent.
+    Attempt n waits a random delay between 0 and
+    min(max_delay, base_delay * 2 ** n), or the response's Retry-After
+    when given, capped by max_delay. Every retry takes one from the
+    run's RetryBudget.
+
+    Overridden per plugin with "retry" in its KV configuration:
+
+        {"retry": {"attempts": 5, "base_delay": 1, "max_delay": 30,
+                   "statuses": [429, 503]}}
+
+    Example use:
+
+        retry = RetryPolicy.fromConfig(consul_slack)
+        if retry.retryable(status_code) and retry.again(attempt):
+            time.sleep(retry.backoff(attempt, "Slack", status_code))
+    """
+
+    def __init__(self, attempts=None, base_delay=None, max_delay=None,
+                 statuses=None, budget=None):
+        """
+        Arguments:
+          attempts: requests made at most, first one included,
+                    settings.NOTIFY_RETRY_ATTEMPTS
+          base_delay: seconds, settings.NOTIFY_RETRY_BASE_DELAY
+          max_delay: seconds, settings.NOTIFY_RETRY_MAX_DELAY
+          statuses: retryable status codes, settings.NOTIFY_RETRY_STATUSES
+          budget: RetryBudget, the module's BUDGET
+        """
+        self.attempts = settings.NOTIFY_RETRY_ATTEMPTS \
+            if attempts is None else int(attempts)
+        self.base_delay = settings.NOTIFY_RETRY_BASE_DELAY \
+            if base_delay is None else float(base_delay)
+        self.max_delay = settings.NOTIFY_RETRY_MAX_DELAY \
+            if max_delay is None else float(max_delay)
+        self.statuses = frozenset(settings.NOTIFY_RETRY_STATUSES
+                                  if statuses is None else statuses)
+        self.budget = budget or BUDGET
+
+    @classmethod
+    def fromConfig(cls, plugin_config):
+        """
+        Returns:
+          policy: from the "retry" dictionary of a plugin configuration
+        """
+        retry = (plugin_config or {}).get("retry") or {}
+
+        return cls(retry.get("attempts"), retry.get("base_delay"),
+                   retry.get("max_delay"), retry.get("statuses"))
+
+    def retryable(self, status_code):
+        return status_code in self.statuses
+
+    def again(self, attempt):
+        """
+        Arguments:
+          attempt: number of the failed attempt, starting at 0
+        Returns:
+          retry: True when attempts and the run's budget are left
+        """
+        if attempt + 1 >= self.attempts:
+            return False
+
+        if not self.budget.take():
+            settings.logger.warn("Message=Retry budget of the run spent")
+            return False
+
+        return True
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Returns:
+          seconds: to wait before the attempt following `attempt`
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+
+        return random.uniform(0, min(self.max_delay,
+                                     self.base_delay * 2 ** attempt))
+
+    def backoff(self, attempt, description, reason, retry_after=None):
+        """
+        Returns:
+          seconds: to sleep before the next attempt, logged with the
+                   reason of the failed one
+        """
+        delay = self.delay(attempt, retry_after)
+
+        settings.logger.warn("Message=Retrying notification {d} "
+                             "Attempt={a} Reason={r} Delay={s:.2f}".format(
+                                 d=description, a=attempt + 2, r=reason,
+                                 s=delay))
+
+        return delay
+
+
+def retryAfter(headers):
+    """
+    Returns:
+      seconds: of a Retry-After header given in seconds, otherwise None
+    """
+    try:
+        return max(float(headers.get("Retry-After")), 0)
+    except (TypeError, ValueError):
+        return None
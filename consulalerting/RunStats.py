@@ -0,0 +1,122 @@
+import os
+import time
+import tempfile
+import json as json
+from contextlib import contextmanager
+import settings
+
+
+# phases of a run in the order they happen, used to order the log line
+PHASES = ("health", "lock", "config", "prior", "blacklist", "diff",
+          "priorWrite", "catalogTags", "notify")
+
+
+class RunStats(object):
+
+    """
+    Per phase timings and counters of one WatchCheckHandler run and its
+    notifications, emitted as a single log line and written as JSON to
+    settings.RUN_STATS_PATH.
+
+    Phases (seconds, repeated phases add up):
+      health: STDIN, the given snapshot or /v1/health/state/any
+      lock: Consul session and the lock on the health fingerprint
+      config: the alerting/ KV prefixes, blacklists and prior state included
+      prior: prior state into ConsulHealthStruct
+      blacklist: blacklist filtering
+      diff: checkForAlertChanges and flap detection
+      priorWrite: writing the prior state
+      catalogTags: /v1/catalog/node lookups of nodeCatalogTags
+      notify: NotificationEngine.Run
+
+    Example use:
+
+        stats = RunStats()
+        with stats.phase("health"):
+            health = utilities.currentState()
+        stats.count("Checks", len(health))
+        stats.emit()
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.timings = {}
+        self.counts = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0) + \
+                time.time() - start
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def summary(self):
+        """
+        Returns:
+          summary: {"Started": epoch, "Elapsed": seconds,
+                    "Phases": {phase: seconds}, "Counts": {name: n}}
+        """
+        return {"Started": self.started,
+                "Elapsed": time.time() - self.started,
+                "Phases": dict(self.timings),
+                "Counts": dict(self.counts)}
+
+    def logLine(self, summary):
+        phases = sorted(summary["Phases"],
+                        key=lambda name: (PHASES.index(name)
+                                          if name in PHASES else len(PHASES),
+                                          name))
+
+        return "Message=Run summary Elapsed={e:.3f} {p} {c}".format(
+            e=summary["Elapsed"],
+            p=" ".join("{n}={s:.3f}".format(n=name, s=summary["Phases"][name])
+                       for name in phases),
+            c=" ".join("{n}={v}".format(n=name, v=summary["Counts"][name])
+                       for name in sorted(summary["Counts"])))
+
+    def write(self, summary, path):
+        """
+        Atomically replace the JSON file at path with summary.
+        """
+        tmp_path = None
+        try:
+            # a new file next to path, never one planted there beforehand
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(path)),
+                prefix=os.path.basename(path) + ".", suffix=".tmp")
+            os.fchmod(fd, 0644)
+            with os.fdopen(fd, "w") as stats_file:
+                json.dump(summary, stats_file, sort_keys=True)
+            os.rename(tmp_path, path)
+        except (IOError, OSError), stats_error:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            settings.logger.error("Message=Could not write run stats "
+                                  "Path={p} Error={e}".format(p=path,
+                                                              e=stats_error))
+            return False
+
+        return True
+
+    def emit(self, path=None):
+        """
+        Log the summary and write it to path, settings.RUN_STATS_PATH,
+        None only logs.
+
+        Returns:
+          summary: as written
+        """
+        path = path or settings.RUN_STATS_PATH
+        summary = self.summary()
+
+        settings.logger.info(self.logLine(summary))
+
+        if path:
+            self.write(summary, path)
+
+        return summary
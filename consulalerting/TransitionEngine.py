@@ -0,0 +1,112 @@
+import settings
+
+
+class Transition(object):
+
+    """
+    A change in Status of a single check between the prior and current
+    health snapshot. `Kind` is "new warning" for checks not found in the
+    prior snapshot, otherwise "<prior>-><current>", e.g. "critical->passing".
+
+    Plugins can read the same information from the alerting
+    ConsulHealthStruct, TransitionEngine sets `PriorStatus` and `Transition`
+    on each object it emits.
+    """
+
+    def __init__(self, obj, prior_status):
+        """
+        Arguments:
+          obj: ConsulHealthStruct from the current snapshot
+          prior_status: Status in the prior snapshot, None if not present
+        """
+        self.obj = obj
+        self.prior_status = prior_status
+        self.status = obj.Status
+
+    @property
+    def Kind(self):
+        if self.prior_status is None:
+            return "new {status}".format(status=self.status)
+
+        return "{prior}->{status}".format(prior=self.prior_status,
+                                          status=self.status)
+
+    def __repr__(self):
+        return "Transition({kind}, {node}, {check})".format(kind=self.Kind,
+                                                            node=self.obj.Node,
+                                                            check=self.obj.CheckID)
+
+
+def isAlerting(prior_status, status):
+    """
+    Determines if a change from prior_status to status needs a
+    notification, prior_status is None for checks never seen before.
+
+      unknown: always
+      passing: when previously warning or critical
+      warning: when not previously warning
+      critical: when not previously critical
+    """
+    if status == settings.UNKNOWN_STATE:
+        return True
+
+    if status == settings.PASSING_STATE:
+        return prior_status in (settings.WARNING_STATE, settings.CRITICAL_STATE)
+
+    if status in (settings.WARNING_STATE, settings.CRITICAL_STATE):
+        return prior_status != status
+
+    return False
+
+
+class TransitionEngine(object):
+
+    """
+    Diffs two lists of ConsulHealthStruct in a single pass each. The prior
+    snapshot is indexed once into a dictionary of identity to Status, the
+    current snapshot is then walked once emitting a Transition for every
+    check that needs a notification.
+
+    Example use:
+
+        engine = TransitionEngine(health_prior_object_list)
+        for transition in engine.diff(health_current_object_list):
+            print transition.Kind
+    """
+
+    def __init__(self, health_prior_object_list):
+        """
+        Arguments:
+          health_prior_object_list: List of ConsulHealthStruct
+        """
+        self.prior_index = self.index(health_prior_object_list)
+
+    @staticmethod
+    def index(object_list):
+        """
+        Build the identity to Status dictionary of a snapshot, identity
+        being the same fields as ConsulHealthStruct.__hash__.
+        """
+        return dict((obj, obj.Status) for obj in object_list)
+
+    def diff(self, health_current_object_list):
+        """
+        Returns:
+          transitions: List of Transition, in the order of the current
+            snapshot. Each object also gets `PriorStatus` and `Transition`.
+        """
+        prior_index = self.prior_index
+        transitions = []
+
+        for obj in health_current_object_list:
+            prior_status = prior_index.get(obj)
+
+            if not isAlerting(prior_status, obj.Status):
+                continue
+
+            transition = Transition(obj, prior_status)
+            obj.PriorStatus = prior_status
+            obj.Transition = transition.Kind
+            transitions.append(transition)
+
+        return transitions
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+import signal
+import socket
+import time
+import requests
+import utilities
+import settings
+import Metrics
+from WatchCheckHandler import WatchCheckHandler
+from ConfigCache import ConfigCache
+from CachetComponents import CachetComponents
+from RateLimiter import RateLimiter
+
+
+class WatchCheckDaemon(object):
+
+    """
+    WatchCheckDaemon keeps a single consulalerting process alive instead
+    of Consul forking WatchCheckHandler.py on every health change.
+    /v1/health/state/any is long-polled with blocking queries, each new
+    snapshot is handed to WatchCheckHandler and NotificationEngine.
+
+    Example use:
+
+        WatchCheckDaemon(settings.consul).Run()
+    """
+
+    def __init__(self, consulate_session, wait=settings.DAEMON_BLOCKING_WAIT,
+                 quiet_period=settings.COALESCE_QUIET_PERIOD,
+                 max_delay=settings.COALESCE_MAX_DELAY):
+        """
+        Arguments:
+          consulate_session: Consulate session object
+          wait: seconds a blocking query may be held open by Consul
+          quiet_period: seconds without a change before a snapshot is
+                        evaluated, 0 evaluates every snapshot
+          max_delay: maximum seconds to wait for a quiet period
+        """
+        self.consul = consulate_session
+        self.wait = wait
+        self.index = None
+        self.session_id = None
+        self.running = False
+        self.metrics_server = None
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+
+        # Cachet components and statuses pushed, kept between snapshots
+        self.cachet_components = CachetComponents()
+
+        # notification rate limits hold across snapshots
+        self.rate_limiter = RateLimiter()
+
+        # keep the parsed configuration in memory between snapshots
+        self.config_cache = None
+        if settings.CONFIG_CACHE_PATH:
+            self.config_cache = ConfigCache(settings.CONFIG_CACHE_PATH)
+
+    def poll(self, wait=None):
+        """
+        Perform one blocking query, returns the health state when the
+        X-Consul-Index moved past the last seen index, otherwise None.
+        """
+        index, health = utilities.blockingState(self.index, wait or self.wait)
+
+        # index going backwards (e.g. snapshot restore), start over as
+        # recommended by Consul
+        if self.index is not None and index < self.index:
+            settings.logger.warn("Message=ConsulIndex went backwards "
+                                 "Prior={p} Current={c}".format(p=self.index,
+                                                                c=index))
+            self.index = None
+            return health
+
+        if index == self.index:
+            return None
+
+        self.index = index
+        return health
+
+    def coalesce(self, health):
+        """
+        Keep taking newer snapshots until none arrived for the quiet period
+        or the maximum delay passed, superseded snapshots are dropped.
+
+        Returns:
+          health: newest health state
+        """
+        deadline = time.time() + self.max_delay
+        superseded = 0
+
+        while self.running:
+            wait = min(self.quiet_period, deadline - time.time())
+            if wait <= 0:
+                break
+
+            newer = self.poll(wait)
+            if newer is None:
+                break
+
+            health = newer
+            superseded += 1
+
+        if superseded:
+            settings.logger.info("Message=Superseded snapshots dropped "
+                                 "Superseded={s} ConsulIndex={i}".format(
+                                     s=superseded, i=self.index))
+
+        return health
+
+    def session(self):
+        """
+        Reuse one Consul session across evaluations, renewing its TTL and
+        creating a new one only when it has expired.
+        """
+        if not self.session_id or not utilities.renewSession(self.session_id):
+            self.session_id = utilities.createSession()
+
+        return self.session_id
+
+    def process(self, health):
+        """
+        Feed a health snapshot through WatchCheckHandler and notify on any
+        alerts, mirrors WatchCheckHandler.py's __main__.
+        """
+        w = WatchCheckHandler(self.consul, self.config_cache)
+        try:
+            alert_list = w.Run(health, self.session())
+
+            if alert_list:
+                w.notify(alert_list, self.cachet_components, self.rate_limiter)
+        except:
+            settings.logger.exception("Uncaught Exception")
+        w.Cleanup()
+        w.report()
+
+    def Stop(self, *args):
+        settings.logger.info("Message=Stopping WatchCheckDaemon")
+        self.running = False
+
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+
+    def Run(self):
+        self.running = True
+        settings.logger.info("Message=Starting WatchCheckDaemon "
+                             "Wait={w}".format(w=self.wait))
+
+        if settings.METRICS_PORT is not None:
+            try:
+                self.metrics_server = Metrics.serve()
+            except socket.error:
+                settings.logger.exception("Message=Could not serve metrics "
+                                          "Port={p}".format(p=settings.METRICS_PORT))
+
+        while self.running:
+            try:
+                health = self.poll()
+            except (requests.RequestException, ValueError):
+                settings.logger.exception("Message=Blocking query failed, "
+                                          "retrying in {s}s".format(
+                                              s=settings.DAEMON_RETRY_INTERVAL))
+                time.sleep(settings.DAEMON_RETRY_INTERVAL)
+                continue
+
+            if health is None:
+                continue
+
+            if self.quiet_period:
+                try:
+                    health = self.coalesce(health)
+                except (requests.RequestException, ValueError):
+                    settings.logger.exception("Message=Blocking query failed, "
+                                              "evaluating last snapshot")
+
+            self.process(health)
+
+
+if __name__ == "__main__":
+    d = WatchCheckDaemon(settings.consul)
+    signal.signal(signal.SIGTERM, d.Stop)
+    signal.signal(signal.SIGINT, d.Stop)
+    d.Run()
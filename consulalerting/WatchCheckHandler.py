@@ -1,12 +1,20 @@
 #!/usr/bin/env python
 
-import consulate
 import json as json
 import sys
+import hashlib
 import utilities
 import settings
+import PriorStateStore
+import Metrics
+from multiprocessing.pool import ThreadPool
 from NotificationEngine import NotificationEngine
-from ConsulHealthStruct import ConsulHealthStruct
+from TransitionEngine import TransitionEngine
+from AlertingConfig import AlertingConfig
+from HealthStream import HealthStream
+from Fingerprint import Fingerprint
+from FlapDetector import FlapDetector
+from RunStats import RunStats
 
 
 class WatchCheckHandler(object):
@@ -20,12 +28,16 @@ class WatchCheckHandler(object):
     filtered by blacklists in Consul KV.
     """
 
-    def __init__(self, consulate_session):
+    def __init__(self, consulate_session, config_cache=None):
         """
         Arguments:
           consulate_session: Consulate session object
+          config_cache: ConfigCache to parse the alerting configuration
+            with, the on-disk cache is read when not given
         """
         self.consul = consulate_session
+        self.config_cache = config_cache
+        self.stats = RunStats()
 
     def __getattr__(self, item):
         return None
@@ -39,6 +51,31 @@ class WatchCheckHandler(object):
         except:
             settings.logger.excepton("Uncaught exception during Cleanup")
 
+    def setConfig(self, config):
+        self.config = config
+
+        self.health_prior = config.prior
+
+        self.health_check_tags = config.health_check_tags
+
+        self.node_blacklist = config.node_blacklist
+
+        self.service_blacklist = config.service_blacklist
+
+        self.check_blacklist = config.check_blacklist
+
+    def processedFingerprint(self):
+        """
+        Fingerprint of the health snapshot together with the blacklists it
+        was filtered with, stored with the prior state. A run repeating it
+        has nothing new to diff, a blacklist change alone is processed.
+        """
+        blacklists = json.dumps([sorted(self.node_blacklist),
+                                 sorted(self.service_blacklist),
+                                 sorted(self.check_blacklist)])
+
+        return hashlib.md5(self.currMD5Hash + blacklists).hexdigest()
+
     def filterByBlacklists(self, object_list):
         """
         Filter a list of ConsulHealthStruct by the blacklists in the KV.
@@ -87,9 +124,46 @@ class WatchCheckHandler(object):
         if not health_check_tags:
             health_check_tags = self.health_check_tags
 
+        node_catalogs = self.nodeCatalogs(object_list)
+
         for obj in object_list:
-            node_catalog = self.consul.catalog.node(obj.Node)
-            obj.addTags(node_catalog, health_check_tags)
+            obj.addTags(node_catalogs.get(obj.Node), health_check_tags)
+
+    def nodeCatalogs(self, object_list,
+                     concurrency=settings.CATALOG_LOOKUP_CONCURRENCY):
+        """
+        Acquire /v1/catalog/node/<node> once for each distinct 'Node' in a
+        list of ConsulHealthStruct, lookups run concurrently with at most
+        `concurrency` in flight. System checks take their tags from
+        health_check_tags so their nodes are not looked up.
+
+        Returns:
+          node_catalogs: dictionary of Node to catalog
+        """
+        nodes = list(set(obj.Node for obj in object_list
+                         if obj.ServiceID or obj.ServiceName))
+
+        if not nodes:
+            return {}
+
+        self.stats.count("CatalogLookups", len(nodes))
+
+        pool = ThreadPool(min(concurrency, len(nodes)))
+        try:
+            catalogs = pool.map(self.nodeCatalog, nodes)
+        finally:
+            pool.close()
+            pool.join()
+
+        settings.logger.info("Message=Catalog lookups "
+                             "Nodes={n} Alerts={a}".format(n=len(nodes),
+                                                           a=len(object_list)))
+
+        return dict(zip(nodes, catalogs))
+
+    def nodeCatalog(self, node):
+        with Metrics.CONSUL_SECONDS.time(endpoint="catalog_node"):
+            return self.consul.catalog.node(node)
 
     def checkForAlertChanges(
             self,
@@ -99,30 +173,21 @@ class WatchCheckHandler(object):
         Return alerts that have changed in status, if never PUT in Consul KV
         return object list if there any warning/critical statuses.
 
-        If PUT beforehand compare based on object hash values, if there are
-        any changes return object list (ConsulHealthStruct)
+        If PUT beforehand compare using TransitionEngine, if there are
+        any changes return object list (ConsulHealthStruct), each object
+        carries its `Transition` (e.g. "critical->passing").
         """
 
-        # list is empty, need to put current_health in KV when
-        # completed
+        # list is empty, current health is PUT in KV by Run
 
         if not health_prior_object_list:
 
             try:
-                # filter by state
-                current_state_warning = utilities.getObjectListByState(
-                    health_current_object_list,
-                    settings.WARNING_STATE)
-                current_state_critical = utilities.getObjectListByState(
-                    health_current_object_list,
-                    settings.CRITICAL_STATE)
-
-                # PUT current health (json)
-                self.consul.kv[
-                    settings.KV_PRIOR_STATE] = json.dumps(
-                    self.health_current)
-
-                alert_list = current_state_warning + current_state_critical
+                # unknown checks are not alerted on without a prior state
+                alert_list = [
+                    transition.obj for transition in
+                    TransitionEngine([]).diff(health_current_object_list)
+                    if transition.status != settings.UNKNOWN_STATE]
 
                 if alert_list:
                     settings.logger.debug("NoPriorAlertList={alert_list}".format(
@@ -140,71 +205,11 @@ class WatchCheckHandler(object):
         else:
 
             try:
-                health_current_object_set_pass = utilities.getHashStateSet(
-                    health_current_object_list,
-                    settings.PASSING_STATE)
-
-                health_current_object_set_warning = utilities.getHashStateSet(
-                    health_current_object_list,
-                    settings.WARNING_STATE)
-
-                health_current_object_set_critical = utilities.getHashStateSet(
-                    health_current_object_list,
-                    settings.CRITICAL_STATE)
-
-                health_current_object_set_unknown = utilities.getHashStateSet(
-                    health_current_object_list,
-                    settings.UNKNOWN_STATE)
-
-                health_prior_object_set_warning = utilities.getHashStateSet(
-                    health_prior_object_list, settings.WARNING_STATE)
-
-                health_prior_object_set_critical = utilities.getHashStateSet(
-                    health_prior_object_list, settings.CRITICAL_STATE)
-
-                # Check for all current passing that were in prior
-                #  warning/critical, set
-                # intersection
-                from_crit_to_pass = health_current_object_set_pass & \
-                    health_prior_object_set_critical
-
-                # Check for all current passing that were in prior
-                #  warning, set
-                # intersection
-                from_warn_to_pass = health_current_object_set_pass & \
-                    health_prior_object_set_warning
-
-                # Check for current warning in prior warning,
-                #  if not in prior new alert,
-                # set difference
-                warning_to_warning_diff = health_current_object_set_warning - \
-                    health_prior_object_set_warning
-
-                # check for current warning in prior critical,
-                #  set intersection
-                from_critical_to_warning = health_current_object_set_warning &\
-                    health_prior_object_set_critical
-
-                # check for current critical in prior critical, if not
-                #  in prior new alert,
-                # set difference
-                crit_to_crit_diff = health_current_object_set_critical - \
-                    health_prior_object_set_critical
-
-                # combine set results, set union
-                alert_hash_set = health_current_object_set_unknown | \
-                    from_crit_to_pass | \
-                    from_warn_to_pass | \
-                    warning_to_warning_diff | \
-                    from_critical_to_warning | \
-                    crit_to_crit_diff
-
-                if alert_hash_set:
-
-                    # Find alerts based on hash value
-                    alert_list = [
-                        obj for obj in health_current_object_list
-                        if hash(obj) in alert_hash_set]
+                transitions = TransitionEngine(
+                    health_prior_object_list).diff(health_current_object_list)
+
+                if transitions:
+                    alert_list = [transition.obj for transition in transitions]
 
                     settings.logger.debug("PriorAlertList={alert_list}".format(
                         alert_list=alert_list))
@@ -219,83 +224,145 @@ class WatchCheckHandler(object):
                     "Message=Failed to create alert list with prior catalog")
                 raise
 
-    def Run(self):
+    def Run(self, health_current=None, session_id=None, config=None):
         """ Performs the internal operations to create an alert_list
         if there is one at all. Will not run if another consulalerting
         instance has acquired a lock on the same catalog
 
+        Arguments:
+          health_current: /v1/health/state/any, list, when given STDIN and
+            the Consul lookup are skipped (used by WatchCheckDaemon).
+          session_id: existing Consul session to lock with, a new session
+            is created when not given.
+          config: AlertingConfig, read from Consul when not given.
         Returns:
           alert_list: A list of ConsulHealthChecks to notify on or blank list
         """
         settings.logger.info("Message=Performing consul api lookups")
 
+        health_current_object_list = None
+        blacklists = config
+        from_stdin = health_current is None and not sys.stdin.isatty()
+
+        if from_stdin and config is None:
+            # blacklists are needed to filter the stream as it is read, the
+            # rest of the configuration and the prior state wait for the lock
+            with self.stats.phase("config"):
+                blacklists = self.loadConfig(
+                    prefixes=(settings.KV_ALERTING_BLACKLIST,), prior=False)
+
         try:
-            if not sys.stdin.isatty():
-                settings.logger.info("Message=STDIN is given")
-                self.health_current = json.loads(sys.__stdin__.read())
-                settings.logger.info("Message=STDIN is valid JSON")
-            else:
-                settings.logger.info("Message=STDIN not given")
-                raise ValueError
+            with self.stats.phase("health"):
+                if health_current is not None:
+                    settings.logger.info("Message=Health state given")
+                    self.health_current = health_current
+                elif from_stdin:
+                    settings.logger.info("Message=STDIN is given")
+                    self.setConfig(blacklists)
+
+                    # fingerprint every streamed check, blacklisted ones
+                    # included, like the other paths do
+                    fingerprint = Fingerprint()
+                    health_current_object_list = self.filterByBlacklists(
+                        fingerprint.track(HealthStream(sys.__stdin__)))
+                    self.currMD5Hash = fingerprint.hexdigest()
+                    self.stats.count("Checks", fingerprint.count)
+                    settings.logger.info("Message=STDIN is valid JSON")
+                else:
+                    settings.logger.info("Message=STDIN not given")
+                    raise ValueError
         except ValueError:
             settings.logger.info("Message=STDIN is invalid JSON using Consul lookup")
-            self.health_current = utilities.currentState()
+            health_current_object_list = None
+            with self.stats.phase("health"):
+                self.health_current = utilities.currentState()
 
-        self.currMD5Hash = utilities.getHash(self.health_current)
-        self.session_id = utilities.createSession()
+        streamed = health_current_object_list is not None
 
-        self.lock_result = utilities.acquireLock("{k}/{h}".format(k=settings.KV_ALERTING_HASHES,
-                                                                  h=self.currMD5Hash), self.session_id)
+        if not streamed:
+            with self.stats.phase("health"):
+                health_current_object_list = utilities.createConsulHealthList(
+                    self.health_current)
+                self.currMD5Hash = Fingerprint.of(health_current_object_list)
+            self.stats.count("Checks", len(health_current_object_list))
+
+        with self.stats.phase("lock"):
+            self.session_id = session_id or utilities.createSession()
 
+            self.lock_result = utilities.acquireLock("{k}/{h}".format(k=settings.KV_ALERTING_HASHES,
+                                                                      h=self.currMD5Hash), self.session_id)
+
+        self.stats.count("LockAcquired", int(bool(self.lock_result)))
+        Metrics.LOCKS.inc(result="won" if self.lock_result else "lost")
 
         if not self.lock_result:
             settings.logger.info("Message=Other consul alerting instance"
                                  "Processing alert and notifcation")
             return []
 
-        self.health_prior = utilities.priorState(settings.KV_PRIOR_STATE)
-
-        self.health_check_tags = utilities.getCheckTags(
-            settings.KV_ALERTING_HEALTH_CHECK_TAGS)
+        settings.logger.info("Message=Obtaining alerting configuration")
 
-        settings.logger.info("Message=Obtaining blacklists")
+        if config is None:
+            with self.stats.phase("config"):
+                config = self.loadConfig(base=blacklists)
 
-        self.node_blacklist = utilities.getBlacklist(
-            settings.KV_ALERTING_BLACKLIST_NODES)
+        self.setConfig(config)
 
-        self.service_blacklist = utilities.getBlacklist(
-            settings.KV_ALERTING_BLACKLIST_SERVICES)
+        processed_fingerprint = self.processedFingerprint()
+        flapping = [check for check in config.prior if check.get("Flapping")]
 
-        self.check_blacklist = utilities.getBlacklist(
-            settings.KV_ALERTING_BLACKLIST_CHECKS)
+        if config.prior_fingerprint == processed_fingerprint and not flapping:
+            # only Output changed since the prior state was written. With a
+            # flapping check the run goes on, its score decays over time
+            settings.logger.info("Message=Health unchanged since the last "
+                                 "processed run Fingerprint={f}".format(
+                                     f=processed_fingerprint))
+            return []
 
         settings.logger.info("Message=Creating current and prior health "
                              "ConsulHealthStruct lists")
 
-        health_prior_object_list = utilities.createConsulHealthList(
-            self.health_prior)
-
-        health_current_object_list = utilities.createConsulHealthList(
-            self.health_current)
+        with self.stats.phase("prior"):
+            health_prior_object_list = utilities.createConsulHealthList(
+                self.health_prior)
+        self.stats.count("PriorChecks", len(health_prior_object_list))
 
         settings.logger.info(
             "Message=Filtering current and prior health against blacklists")
 
-        health_prior_object_list_filtered = self.filterByBlacklists(
-            health_prior_object_list)
+        with self.stats.phase("blacklist"):
+            health_prior_object_list_filtered = self.filterByBlacklists(
+                health_prior_object_list)
 
-        health_current_object_list_filtered = self.filterByBlacklists(
-            health_current_object_list)
+            if not streamed:
+                health_current_object_list_filtered = self.filterByBlacklists(
+                    health_current_object_list)
+            else:
+                # streamed from STDIN, blacklisted checks were never kept
+                health_current_object_list_filtered = health_current_object_list
 
+        settings.logger.info("Message=Creating alert list")
 
-        self.consul.kv[settings.KV_PRIOR_STATE] = json.dumps(
-            self.health_current)
+        with self.stats.phase("diff"):
+            alert_list = self.checkForAlertChanges(
+                health_current_object_list_filtered,
+                health_prior_object_list_filtered)
 
-        settings.logger.info("Message=Creating alert list")
+            flap_detector = FlapDetector(health_prior_object_list_filtered)
+            flap_detector.update(health_current_object_list_filtered)
+            alert_list = flap_detector.filter(alert_list)
+
+        self.stats.count("Alerts", len(alert_list))
+        for obj in alert_list:
+            Metrics.ALERTS.inc(transition=obj.Transition)
 
-        alert_list = self.checkForAlertChanges(
-            health_current_object_list_filtered,
-            health_prior_object_list_filtered)
+        # written after the diff, it carries the updated flap history.
+        # Blacklisted checks are left out in every path, a streamed run
+        # never kept them
+        with self.stats.phase("priorWrite"):
+            self.stats.count("KVBytesWritten", PriorStateStore.store(
+                self.consul, config).write(health_current_object_list_filtered,
+                                           processed_fingerprint) or 0)
 
         if alert_list:
             settings.logger.info(
@@ -304,7 +371,8 @@ class WatchCheckHandler(object):
             settings.logger.info(
                 "Message=Obtaining Tags for new alerts")
 
-            self.nodeCatalogTags(alert_list)
+            with self.stats.phase("catalogTags"):
+                self.nodeCatalogTags(alert_list)
 
             return alert_list
         else:
@@ -312,16 +380,73 @@ class WatchCheckHandler(object):
 
             return alert_list
 
+    def loadConfig(self, prefixes=None, prior=True, base=None):
+        """
+        AlertingConfig.load with the handler's ConfigCache, bytes read are
+        counted in the run's stats.
+        """
+        config = AlertingConfig.load(self.config_cache, prefixes, prior, base)
+        self.stats.count("KVBytesRead",
+                         config.size - (base.size if base is not None else 0))
 
-if __name__ == "__main__":
+        return config
+
+    def notify(self, alert_list, cachet_components=None, rate_limiter=None):
+        """
+        Send alert_list with NotificationEngine, counted in the run's stats.
+        """
+        with self.stats.phase("notify"):
+            deliveries = NotificationEngine(alert_list, self.consul,
+                                            self.config, cachet_components,
+                                            rate_limiter).Run()
+
+        self.stats.count("Deliveries", len(deliveries))
+        self.stats.count("DeliveriesFailed",
+                         len([delivery for delivery in deliveries
+                              if not delivery.ok]))
+
+        for delivery in deliveries:
+            if delivery.ok:
+                status = "ok"
+            elif delivery.completed:
+                status = "failed"
+            else:
+                status = "timed_out"
+
+            Metrics.DELIVERIES.inc(plugin=delivery.plugin, status=status)
+
+            if delivery.completed:
+                Metrics.DELIVERY_SECONDS.observe(delivery.elapsed,
+                                                 plugin=delivery.plugin)
+
+        return deliveries
+
+    def report(self):
+        """
+        Emit the run's stats and record the run in Metrics.
+        """
+        summary = self.stats.emit()
+
+        Metrics.RUNS.inc()
+        Metrics.RUN_SECONDS.observe(summary["Elapsed"])
+
+        return summary
+
+
+def evaluate():
     w = WatchCheckHandler(settings.consul)
     try:
         alert_list = w.Run()
 
         if alert_list:
-            n = NotificationEngine(alert_list, settings.consul)
-            n.Run()
+            w.notify(alert_list)
     except:
         settings.logger.exception("Uncaught Exception")
     w.Cleanup()
+    w.report()
+    Metrics.REGISTRY.persist()
+
+
+if __name__ == "__main__":
+    evaluate()
 
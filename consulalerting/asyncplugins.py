@@ -0,0 +1,197 @@
+"""
+Coroutine implementations of the notify_* plugins for
+AsyncNotificationDispatcher. Requests are built by the *_requests functions
+in plugins.py and sent with tornado's AsyncHTTPClient, plugins missing from
+NOTIFIERS run their blocking implementation on the dispatcher's executor.
+"""
+
+import ssl
+from tornado import gen
+from tornado.escape import json_decode
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+
+import settings
+import plugins
+from CachetComponents import CachetComponents
+from RetryPolicy import retryAfter
+
+
+def tornado_request(plugin_request, timeout=None):
+    """
+    Returns:
+      request: tornado HTTPRequest for a plugins.PluginRequest
+    """
+    timeout = timeout or settings.NOTIFY_ASYNC_TIMEOUT
+
+    kwargs = {}
+    if plugin_request.auth:
+        kwargs["auth_username"], kwargs["auth_password"] = plugin_request.auth
+
+    if plugin_request.method in ("POST", "PUT"):
+        kwargs["body"] = plugin_request.body()
+
+    return HTTPRequest(plugin_request.full_url(),
+                       method=plugin_request.method,
+                       headers=plugin_request.headers,
+                       connect_timeout=timeout,
+                       request_timeout=timeout,
+                       **kwargs)
+
+
+@gen.coroutine
+def send_request(plugin_request, message_template):
+    """
+    Send a PluginRequest, retried as its RetryPolicy allows. tornado
+    reports connection errors and timeouts as status 599.
+
+    Returns:
+      status_code: of the last response
+    """
+    retry = plugin_request.retry
+    description = "NotifyPlugin={plugin} {description}".format(
+        plugin=plugin_request.plugin, description=plugin_request.description)
+    attempt = 0
+
+    while True:
+        response = yield AsyncHTTPClient().fetch(tornado_request(plugin_request),
+                                                 raise_error=False)
+
+        # certificate errors are permanent, like in plugins.send_request
+        if response.code != 599 and not retry.retryable(response.code) or \
+                isinstance(response.error, ssl.SSLError) or \
+                not retry.again(attempt):
+            break
+
+        yield gen.sleep(retry.backoff(attempt, description,
+                                      response.error or response.code,
+                                      retryAfter(response.headers)))
+        attempt += 1
+
+    plugins.log_response(plugin_request, message_template, response.code)
+
+    raise gen.Return(response.code)
+
+
+@gen.coroutine
+def send_requests(plugin_requests, message_template):
+    """
+    Send every request concurrently.
+
+    Returns:
+      status_code: of the last request, None when there was nothing to send
+    """
+    status_codes = yield [send_request(plugin_request, message_template)
+                          for plugin_request in plugin_requests]
+
+    raise gen.Return(status_codes[-1] if status_codes else None)
+
+
+@gen.coroutine
+def notify_hipchat(obj, message_template, common_notifiers, consul_hipchat):
+    status_code = yield send_requests(
+        plugins.hipchat_requests(obj, message_template, common_notifiers,
+                                 consul_hipchat),
+        message_template)
+
+    raise gen.Return(status_code)
+
+
+@gen.coroutine
+def notify_slack(message_template, common_notifiers, consul_slack):
+    status_code = yield send_requests(
+        plugins.slack_requests(message_template, common_notifiers, consul_slack),
+        message_template)
+
+    raise gen.Return(status_code)
+
+
+@gen.coroutine
+def notify_mailgun(message_template, common_notifiers, consul_mailgun):
+    status_code = yield send_requests(
+        plugins.mailgun_requests(message_template, common_notifiers,
+                                 consul_mailgun),
+        message_template)
+
+    raise gen.Return(status_code)
+
+
+@gen.coroutine
+def notify_pagerduty(obj, message_template, common_notifiers, consul_pagerduty,
+                     incident_key=None):
+    status_code = yield send_requests(
+        plugins.pagerduty_requests(obj, message_template, common_notifiers,
+                                   consul_pagerduty, incident_key),
+        message_template)
+
+    raise gen.Return(status_code)
+
+
+@gen.coroutine
+def notify_influxdb(obj, message_template, common_notifiers, consul_influxdb):
+    status_code = yield send_requests(
+        plugins.influxdb_requests(obj, message_template, common_notifiers,
+                                  consul_influxdb),
+        message_template)
+
+    raise gen.Return(status_code)
+
+
+@gen.coroutine
+def notify_influxdb_batch(alerts, consul_influxdb):
+    status_code = yield send_requests(
+        plugins.influxdb_batch_requests(alerts, consul_influxdb),
+        "{n} alerts".format(n=len(alerts)))
+
+    raise gen.Return(status_code)
+
+
+@gen.coroutine
+def notify_cache(obj, message_template, cachet_config, components=None):
+    if not plugins.cachet_configured(cachet_config):
+        raise gen.Return(None)
+
+    if components is None:
+        components = CachetComponents()
+
+    if components.stale(cachet_config):
+        response = yield AsyncHTTPClient().fetch(
+            HTTPRequest(plugins.cachet_components_url(cachet_config),
+                        connect_timeout=settings.NOTIFY_ASYNC_TIMEOUT,
+                        request_timeout=settings.NOTIFY_ASYNC_TIMEOUT),
+            raise_error=False)
+
+        if response.code != 200:
+            settings.logger.error('Unable to retrieve Cachet components: {error}.'
+                                  'Shipping incident reporting.'.format(
+                                      error=response.error or response.code))
+            raise gen.Return(None)
+
+        components.load(cachet_config, json_decode(response.body).get('data'))
+
+    incident = plugins.cachet_incident_request(obj, message_template,
+                                               cachet_config, components)
+
+    if incident is None:
+        raise gen.Return(None)
+
+    component_id, plugin_request = incident
+    status_code = yield send_request(plugin_request, message_template)
+
+    if not 200 <= status_code < 300:
+        components.forget(component_id)
+        raise gen.Return(None)
+
+    raise gen.Return(status_code)
+
+
+# coroutine replacing each blocking plugins.notify_* Delivery target. The
+# others (email, elasticsearchlog and elasticsearch, whose bulk sink buffers
+# documents and retries on its own) run unchanged on the executor of
+# AsyncNotificationDispatcher
+NOTIFIERS = {plugins.notify_hipchat: notify_hipchat,
+             plugins.notify_slack: notify_slack,
+             plugins.notify_mailgun: notify_mailgun,
+             plugins.notify_pagerduty: notify_pagerduty,
+             plugins.notify_influxdb: notify_influxdb,
+             plugins.notify_influxdb_batch: notify_influxdb_batch,
+             plugins.notify_cache: notify_cache}
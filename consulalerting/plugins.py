@@ -1,367 +1,583 @@
-import smtplib
 import string
+import time
+import urllib
 import json as json
 from datetime import datetime
 from urlparse import urljoin
 
 import requests
 import settings
-from requests import ConnectionError, HTTPError
+from requests import ConnectionError
+from HTTPSessionPool import HTTPSessionPool
+from RetryPolicy import RetryPolicy, retryAfter
+from MailTransport import MailTransport
+from CachetComponents import CachetComponents
+from ElasticsearchBulkSink import ElasticsearchBulkSink
+
+
+HIPCHAT_COLORS = {settings.PASSING_STATE: ("green", 0),
+                  settings.WARNING_STATE: ("yellow", 1),
+                  settings.CRITICAL_STATE: ("red", 1),
+                  settings.UNKNOWN_STATE: ("gray", 1)}
+
+# numeric status field written by the InfluxDB plugin, nagios exit codes
+INFLUXDB_STATUS = {settings.PASSING_STATE: 0,
+                   settings.WARNING_STATE: 1,
+                   settings.CRITICAL_STATE: 2,
+                   settings.UNKNOWN_STATE: 3}
+
+SLACK_URL = "https://slack.com/api/chat.postMessage"
+MAILGUN_URL = "https://api.mailgun.net/v2/{domain}/messages"
+PAGERDUTY_URL = "https://events.pagerduty.com/generic/2010-04-15/create_event.json"
+
+CACHET_COMPONENT_ENDPOINT = "/api/v1/components"
+CACHET_INCIDENT_ENDPOINT = "/api/v1/incidents"
+
+CACHET_INCIDENT_STATUS = {
+    'Investigating': 1,
+    'Identified': 2,
+    'Watching': 3,
+    'Fixed': 4
+}
+
+CACHET_COMPONENT_STATUS = {
+    'Operational': 1,
+    'Performance Issues': 2,
+    'Partial Outage': 3,
+    'Major Outage': 4
+}
+
+CACHET_STATUS_INCIDENT_MAP = {
+    settings.PASSING_STATE: CACHET_INCIDENT_STATUS['Fixed'],
+    settings.WARNING_STATE: CACHET_INCIDENT_STATUS['Investigating'],
+    settings.CRITICAL_STATE: CACHET_INCIDENT_STATUS['Investigating'],
+    settings.UNKNOWN_STATE: CACHET_INCIDENT_STATUS['Investigating']
+}
+
+CACHET_STATUS_COMPONENT_MAP = {
+    settings.PASSING_STATE: CACHET_COMPONENT_STATUS['Operational'],
+    settings.WARNING_STATE: CACHET_COMPONENT_STATUS['Performance Issues'],
+    settings.CRITICAL_STATE: CACHET_COMPONENT_STATUS['Major Outage'],
+    settings.UNKNOWN_STATE: CACHET_COMPONENT_STATUS['Partial Outage']
+}
+
+# keep-alive sessions shared by every plugin, see HTTPSessionPool
+SESSIONS = HTTPSessionPool()
+
+
+class PluginRequest(object):
+
+    """
+    An HTTP request a plugin makes to deliver a notification to one
+    destination. Built once by the *_requests functions and sent either
+    with requests (send_request) or tornado (asyncplugins).
+    """
+
+    def __init__(self, plugin, description, url, method="POST", params=None,
+                 data=None, headers=None, auth=None, retry=None):
+        """
+        Arguments:
+          plugin: name used in log lines, e.g. "Slack"
+          description: destination for log lines, e.g. "Room=#devops"
+          url: endpoint
+          method: HTTP method
+          params: dictionary of query string parameters
+          data: dictionary (form encoded) or string body
+          headers: dictionary of HTTP headers
+          auth: (username, password) for basic authentication
+          retry: RetryPolicy, settings.NOTIFY_RETRY_* when not given
+        """
+        self.plugin = plugin
+        self.description = description
+        self.url = url
+        self.method = method
+        self.params = params
+        self.data = data
+        self.headers = headers
+        self.auth = auth
+        self.retry = retry or RetryPolicy()
+
+    def body(self):
+        """
+        Returns:
+          body: data encoded the way requests would send it
+        """
+        if isinstance(self.data, dict):
+            return urllib.urlencode(_utf8_items(self.data), doseq=True)
+
+        return self.data or ""
+
+    def full_url(self):
+        """
+        Returns:
+          url: with params encoded into the query string
+        """
+        if not self.params:
+            return self.url
+
+        return "{url}{sep}{query}".format(url=self.url,
+                                          sep="&" if "?" in self.url else "?",
+                                          query=urllib.urlencode(
+                                              _utf8_items(self.params)))
+
+
+def _utf8_items(dictionary):
+    # urllib.urlencode only handles ascii unicode
+    items = []
+    for key, value in dictionary.iteritems():
+        if isinstance(value, unicode):
+            value = value.encode("utf-8")
+        elif isinstance(value, (list, tuple)):
+            value = [item.encode("utf-8") if isinstance(item, unicode) else item
+                     for item in value]
+        items.append((key, value))
+
+    return items
+
+
+def log_response(plugin_request, message_template, status_code):
+    if 200 <= status_code < 300:
+        log = settings.logger.info
+    else:
+        log = settings.logger.error
+
+    log("NotifyPlugin={plugin} {description} Message={message} "
+        "Status_Code={status}".format(plugin=plugin_request.plugin,
+                                      description=plugin_request.description,
+                                      message=message_template,
+                                      status=status_code))
+
+
+def send_request(plugin_request, message_template):
+    """
+    Send a PluginRequest with requests over the shared SESSIONS pool,
+    retried as its RetryPolicy allows.
+
+    Returns:
+      status_code: of the last response
+    Raises:
+      requests.RequestException: of the last attempt
+    """
+    retry = plugin_request.retry
+    description = "NotifyPlugin={plugin} {description}".format(
+        plugin=plugin_request.plugin, description=plugin_request.description)
+    attempt = 0
+
+    while True:
+        try:
+            response = SESSIONS.request(plugin_request.method,
+                                        plugin_request.url,
+                                        params=plugin_request.params,
+                                        data=plugin_request.data,
+                                        headers=plugin_request.headers,
+                                        auth=plugin_request.auth)
+        except requests.exceptions.SSLError:
+            # permanent, a certificate does not get valid by retrying
+            raise
+        except (ConnectionError, requests.Timeout), request_error:
+            if not retry.again(attempt):
+                raise
+
+            time.sleep(retry.backoff(attempt, description,
+                                     type(request_error).__name__))
+        else:
+            if not retry.retryable(response.status_code) or \
+                    not retry.again(attempt):
+                break
 
+            time.sleep(retry.backoff(attempt, description, response.status_code,
+                                     retryAfter(response.headers)))
 
-def notify_hipchat(obj, message_template, common_notifiers, consul_hipchat):
-    notify_value = 0
-    color_value = "yellow"
+        attempt += 1
 
-    for roomname in common_notifiers:
+    log_response(plugin_request, message_template, response.status_code)
 
-        if obj.Status == settings.PASSING_STATE:
-            color_value = "green"
-            notify_value = 0
+    return response.status_code
 
-        elif obj.Status == settings.WARNING_STATE:
-            color_value = "yellow"
-            notify_value = 1
 
-        elif obj.Status == settings.CRITICAL_STATE:
-            color_value = "red"
-            notify_value = 1
+def send_requests(plugin_requests, message_template):
+    """
+    Returns:
+      status_code: of the last response, None when there was nothing to send
+    """
+    status_code = None
 
-        elif obj.Status == settings.UNKNOWN_STATE:
-            color_value = "gray"
-            notify_value = 1
+    for plugin_request in plugin_requests:
+        status_code = send_request(plugin_request, message_template)
 
-        try:
-            response = requests.post(
-                consul_hipchat["url"],
-                params={
-                    'room_id': int(consul_hipchat["rooms"][roomname]),
-                    'from': 'Consul',
-                    'message': message_template,
-                    'notify': notify_value,
-                    'color': color_value,
-                    'auth_token': consul_hipchat["api_token"]})
+    return status_code
 
-        except requests.exceptions.SSLError:
 
-            response = requests.post(
-                consul_hipchat["url"],
-                verify=False,
-                params={
-                    'room_id': int(consul_hipchat["rooms"][roomname]),
-                    'from': 'Consul',
-                    'message': message_template,
-                    'notify': notify_value,
-                    'color': color_value,
-                    'auth_token': consul_hipchat["api_token"]},
-            )
-
-        if response.status_code == 200:
-            settings.logger.info(
-                "NotifyPlugin=Hipchat Server={url} "
-                "Room={room} Message={message} "
-                "Status_Code={status}".format(
-                    url=consul_hipchat["url"],
-                    room=consul_hipchat["rooms"][roomname],
-                    message=message_template,
-                    status=response.status_code))
-
-            return response.status_code
-        else:
-            settings.logger.error(
-                "NotifyPlugin=Hipchat Server={url} "
-                "Room={room} Message={message} "
-                "Status_Code={status}".format(
-                    url=consul_hipchat["url"],
-                    room=consul_hipchat["rooms"][roomname],
-                    message=message_template,
-                    status=response.status_code))
+def hipchat_requests(obj, message_template, common_notifiers, consul_hipchat):
+    color_value, notify_value = HIPCHAT_COLORS.get(obj.Status, ("yellow", 0))
 
-            return response.status_code
+    return [PluginRequest(
+        "Hipchat",
+        "Server={url} Room={room}".format(url=consul_hipchat["url"],
+                                          room=consul_hipchat["rooms"][roomname]),
+        consul_hipchat["url"],
+        params={
+            'room_id': int(consul_hipchat["rooms"][roomname]),
+            'from': 'Consul',
+            'message': message_template,
+            'notify': notify_value,
+            'color': color_value,
+            'auth_token': consul_hipchat["api_token"]},
+        retry=RetryPolicy.fromConfig(consul_hipchat))
+        for roomname in common_notifiers]
 
 
-def notify_slack(message_template, common_notifiers, consul_slack):
-    for roomname in common_notifiers:
-
-        response = requests.post(
-            "https://slack.com/api/chat.postMessage",
-            params={
-                'channel': consul_slack["rooms"][roomname],
-                'username': 'Consul',
-                'token': consul_slack["api_token"],
-                'text': message_template})
-
-        if response.status_code == 200:
-            settings.logger.info(
-                "NotifyPlugin=Slack "
-                "Room={room} "
-                "Message={message} "
-                "Status_Code={status}".format(
-                    room=consul_slack["rooms"][roomname],
-                    message=message_template,
-                    status=response.status_code))
-
-            return response.status_code
-        else:
-            settings.logger.error(
-                "NotifyPlugin=Slack "
-                "Room={room} "
-                "Message={message} "
-                "Status_code={status}".format(
-                    room=consul_slack["rooms"][roomname],
-                    message=message_template,
-                    status=response.status_code))
-            return response.status_code
-
+def notify_hipchat(obj, message_template, common_notifiers, consul_hipchat):
+    return send_requests(hipchat_requests(obj, message_template,
+                                          common_notifiers, consul_hipchat),
+                         message_template)
 
-def notify_mailgun(message_template, common_notifiers, consul_mailgun):
-    api_endpoint = "https://api.mailgun.net/v2/{domain}/messages".format(
-        domain=consul_mailgun["mailgun_domain"])
-    auth_tuple = ('api', consul_mailgun["api_token"])
-
-    for teamname in common_notifiers:
-
-        response = requests.post(api_endpoint,
-                                 auth=auth_tuple,
-                                 data={'from': consul_mailgun["from"],
-                                       'to': consul_mailgun["teams"][teamname],
-                                       'subject': 'Consul Alert',
-                                       'text': message_template})
-
-        if response.status_code == 200:
-            settings.logger.info(
-                "NotifyPlugin=Mailgun "
-                "Endpoint={url} Message={message} "
-                "Status_Code={status}".format(url=api_endpoint,
-                                              message=message_template,
-                                              status=response.status_code))
-
-            return response.status_code
-        else:
-            settings.logger.error(
-                "NotifyPlugin=Mailgun "
-                "Endpoint={url} "
-                "Message={message} "
-                "Status_code={status}".format(url=api_endpoint,
-                                              message=message_template,
-                                              status=response.status_code))
-            return response.status_code
 
+def slack_requests(message_template, common_notifiers, consul_slack):
+    return [PluginRequest(
+        "Slack",
+        "Room={room}".format(room=consul_slack["rooms"][roomname]),
+        SLACK_URL,
+        params={
+            'channel': consul_slack["rooms"][roomname],
+            'username': 'Consul',
+            'token': consul_slack["api_token"],
+            'text': message_template},
+        retry=RetryPolicy.fromConfig(consul_slack))
+        for roomname in common_notifiers]
 
-def notify_email(message_template, common_notifiers, consul_email):
-    server = smtplib.SMTP(consul_email["mail_domain_address"])
 
-    if consul_email["username"] and consul_email["password"]:
-        server.login(consul_email["username"], consul_email["password"])
+def notify_slack(message_template, common_notifiers, consul_slack):
+    return send_requests(slack_requests(message_template, common_notifiers,
+                                        consul_slack),
+                         message_template)
 
-    from_address = consul_email["from"]
-    subject = "Consul Alert"
 
-    for teamname in common_notifiers:
-        body = string.join((
-            "From: %s" % from_address,
-            "To: %s" % ', '.join(consul_email["teams"][teamname]),
-            "Subject: %s" % subject,
-            "",
-            message_template
-        ), "\r\n")
+def mailgun_requests(message_template, common_notifiers, consul_mailgun):
+    api_endpoint = MAILGUN_URL.format(domain=consul_mailgun["mailgun_domain"])
 
-        server.sendmail(from_address, consul_email["teams"][teamname], body)
+    return [PluginRequest(
+        "Mailgun",
+        "Endpoint={url}".format(url=api_endpoint),
+        api_endpoint,
+        auth=('api', consul_mailgun["api_token"]),
+        data={'from': consul_mailgun["from"],
+              'to': consul_mailgun["teams"][teamname],
+              'subject': 'Consul Alert',
+              'text': message_template},
+        retry=RetryPolicy.fromConfig(consul_mailgun))
+        for teamname in common_notifiers]
 
-    server.quit()
 
+def notify_mailgun(message_template, common_notifiers, consul_mailgun):
+    return send_requests(mailgun_requests(message_template, common_notifiers,
+                                          consul_mailgun),
+                         message_template)
+
+
+def notify_email(message_template, common_notifiers, consul_email,
+                 transport=None):
+    """
+    Arguments:
+      transport: MailTransport shared by the run, a connection of its own
+                 is opened and closed when not given
+    """
+    own_transport = transport is None
+    if own_transport:
+        transport = MailTransport(consul_email)
 
-def notify_pagerduty(
-        obj, message_template, common_notifiers, consul_pagerduty):
-    for teamname in common_notifiers:
+    from_address = consul_email["from"]
+    subject = "Consul Alert"
 
-        if obj.Status == settings.PASSING_STATE:
-            pagerduty_event_type = "resolve"
-        else:
-            pagerduty_event_type = "trigger"
+    try:
+        for teamname in common_notifiers:
+            body = string.join((
+                "From: %s" % from_address,
+                "To: %s" % ', '.join(consul_email["teams"][teamname]),
+                "Subject: %s" % subject,
+                "",
+                message_template
+            ), "\r\n")
+
+            transport.sendmail(from_address, consul_email["teams"][teamname], body)
+    finally:
+        if own_transport:
+            transport.close()
+
+
+def pagerduty_requests(obj, message_template, common_notifiers, consul_pagerduty,
+                       incident_key=None):
+    if obj.Status == settings.PASSING_STATE:
+        pagerduty_event_type = "resolve"
+    else:
+        pagerduty_event_type = "trigger"
+
+    pagerduty_incident_key = incident_key or "{node}/{CheckID}".format(
+        node=obj.Node, CheckID=obj.CheckID)
+
+    return [PluginRequest(
+        "PagerDuty",
+        "Team={team}".format(team=teamname),
+        PAGERDUTY_URL,
+        data=json.dumps({"service_key": consul_pagerduty["teams"][teamname],
+                         "event_type": pagerduty_event_type,
+                         "description": message_template,
+                         "incident_key": pagerduty_incident_key}),
+        headers={'content-type': 'application/json'},
+        retry=RetryPolicy.fromConfig(consul_pagerduty))
+        for teamname in common_notifiers]
 
-        pagerduty_incident_key = "{node}/{CheckID}".format(node=obj.Node,
-                                                           CheckID=obj.CheckID)
 
-        pagerduty_data = {"service_key": consul_pagerduty["teams"][teamname],
-                          "event_type": pagerduty_event_type,
-                          "description": message_template,
-                          "incident_key": pagerduty_incident_key}
+def notify_pagerduty(
+        obj, message_template, common_notifiers, consul_pagerduty,
+        incident_key=None):
+    return send_requests(pagerduty_requests(obj, message_template,
+                                            common_notifiers, consul_pagerduty,
+                                            incident_key),
+                         message_template)
+
+
+def _influxdb_escape(value, characters):
+    if isinstance(value, unicode):
+        value = value.encode("utf-8")
+
+    value = str(value)
+    for character in characters:
+        value = value.replace(character, "\\" + character)
+
+    return value
+
+
+def influxdb_line(obj, message_template, consul_influxdb, timestamp):
+    """
+    Returns:
+      line: line protocol point for obj, e.g.
+            alerts,Node=consul,CheckID=service:redis,Status=critical status=2i,value="..." 1458230400000000000
+    """
+    tags = "".join(",{key}={value}".format(
+        key=key, value=_influxdb_escape(value, ", ="))
+        for key, value in (("Node", obj.Node),
+                           ("ServiceID", obj.ServiceID),
+                           ("CheckID", obj.CheckID),
+                           ("Status", obj.Status))
+        # empty tag values are not valid line protocol
+        if value)
+
+    return '{series}{tags} status={status}i,value="{msg}" {timestamp}'.format(
+        series=_influxdb_escape(consul_influxdb["series"], ", "),
+        tags=tags,
+        status=INFLUXDB_STATUS.get(obj.Status, INFLUXDB_STATUS[settings.UNKNOWN_STATE]),
+        msg=_influxdb_escape(message_template.replace('\n', ' '), '\\"'),
+        timestamp=timestamp)
+
+
+def influxdb_batch_requests(alerts, consul_influxdb, timestamp=None):
+    """
+    One write per database holding every point for it, split in batches
+    of at most "batch_size" (settings.INFLUXDB_BATCH_SIZE) points.
+
+    Arguments:
+      alerts: list of (obj, message_template, common_notifiers)
+      timestamp: nanoseconds since the epoch, defaults to now
+    """
+    if timestamp is None:
+        timestamp = int(time.time() * 1000000000)
+
+    batch_size = max(int(consul_influxdb.get("batch_size",
+                                             settings.INFLUXDB_BATCH_SIZE)), 1)
+    lines = {}
+
+    for obj, message_template, common_notifiers in alerts:
+        line = influxdb_line(obj, message_template, consul_influxdb, timestamp)
+
+        for database in common_notifiers:
+            lines.setdefault(consul_influxdb["databases"][database], []).append(line)
+
+    plugin_requests = []
+    for database in sorted(lines):
+        for i in xrange(0, len(lines[database]), batch_size):
+            batch = lines[database][i:i + batch_size]
+            plugin_requests.append(PluginRequest(
+                "InfluxDB",
+                "Server={url} Database={database} Points={points}".format(
+                    url=consul_influxdb["url"],
+                    database=database,
+                    points=len(batch)),
+                consul_influxdb["url"],
+                params={'db': database, 'precision': 'ns'},
+                data="\n".join(batch),
+                retry=RetryPolicy.fromConfig(consul_influxdb)))
 
-        response = requests.post(
-            "https://events.pagerduty.com/generic/2010-04-15/create_event.json",
-            data=json.dumps(pagerduty_data),
-            headers={'content-type': 'application/json'})
+    return plugin_requests
 
 
-        if response.status_code == 200:
-            settings.logger.info(
-                "NotifyPlugin=PagerDuty "
-                "Message={message} "
-                "Status_Code={status}".format(message=message_template,
-                                              status=response.status_code))
-            return response.status_code
-        else:
-            settings.logger.error(
-                "NotifyPlugin=Mailgun "
-                "Message={message} "
-                "Status_Code={status}".format(message=message_template,
-                                              status=response.status_code))
-            return response.status_code
+def influxdb_requests(obj, message_template, common_notifiers, consul_influxdb):
+    return influxdb_batch_requests([(obj, message_template, common_notifiers)],
+                                   consul_influxdb)
 
 
 def notify_influxdb(obj, message_template, common_notifiers, consul_influxdb):
-    for database in common_notifiers:
-
-        message_template = message_template.replace('\n', ' ')
-
-        tags = 'ServiceID={ServiceID},CheckID={CheckID},Status={Status}'.format(
-            ServiceID=obj.ServiceID,
-            CheckID=obj.CheckID,
-            Status=obj.Status)
-
-        message_template = '{series},{tags} value="{msg}"'.format(
-            series=consul_influxdb["series"],
-            tags=tags,
-            msg=message_template)
-
-        response = requests.post(
-            consul_influxdb["url"],
-            params={'db': consul_influxdb["databases"][database]},
-            data=message_template)
-
-        if response.status_code == 200:
-            settings.logger.info(
-                "NotifyPlugin=InfluxDB Server={url} "
-                "Database={database} Message={message} "
-                "Status_Code={status}".format(
-                    url=consul_influxdb["url"],
-                    database=consul_influxdb["databases"][database],
-                    message=message_template,
-                    status=response.status_code))
+    return send_requests(influxdb_requests(obj, message_template,
+                                           common_notifiers, consul_influxdb),
+                         message_template)
 
-            return response.status_code
-        else:
-            settings.logger.error(
-                "NotifyPlugin=InfluxDB Server={url} "
-                "Database={database} Message={message} "
-                "Status_Code={status}".format(
-                    url=consul_influxdb["url"],
-                    database=consul_influxdb["databases"][database],
-                    message=message_template,
-                    status=response.status_code))
 
-            return response.status_code
+def notify_influxdb_batch(alerts, consul_influxdb):
+    return send_requests(influxdb_batch_requests(alerts, consul_influxdb),
+                         "{n} alerts".format(n=len(alerts)))
 
 
-def notify_cache(obj, message_template, cachet_config):
+def cachet_configured(cachet_config):
     if not cachet_config.get('api_token'):
         settings.logger.error("A Cachet API token must be provided in order to post incidents!")
-        return None
+        return False
 
     if not cachet_config.get('site_url'):
         settings.logger.error('A Cachet site url must be provided in order to post incidients!')
-        return None
+        return False
 
-    # Constants and configuration for the rest of the function
-    component_endpoint = "/api/v1/components"
-    component_url = urljoin(cachet_config['site_url'], component_endpoint)
+    return True
 
-    incident_endpoint = "/api/v1/incidents"
-    incident_url = urljoin(cachet_config['site_url'], incident_endpoint)
 
-    headers = {
-        'X-Cachet-Token': cachet_config['api_token'],
-        'content-type': 'application/json',
-    }
+def cachet_components_url(cachet_config):
+    return urljoin(cachet_config['site_url'], CACHET_COMPONENT_ENDPOINT)
 
-    incident_status = {
-        'Investigating': 1,
-        'Identified': 2,
-        'Watching': 3,
-        'Fixed': 4
-    }
 
-    component_statuses = {
-        'Operational': 1,
-        'Performance Issues': 2,
-        'Partial Outage': 3,
-        'Major Outage': 4
-    }
+def cachet_fetch_components(cachet_config):
+    """
+    Returns:
+      components: 'data' list of the Cachet components GET
+    Raises:
+      requests.RequestException: components could not be retrieved
+    """
+    components_response = SESSIONS.get(cachet_components_url(cachet_config))
+    components_response.raise_for_status()
+    return components_response.json().get('data')
 
-    status_incident_map = {
-        settings.PASSING_STATE: incident_status['Fixed'],
-        settings.WARNING_STATE: incident_status['Investigating'],
-        settings.CRITICAL_STATE: incident_status['Investigating'],
-        settings.UNKNOWN_STATE: incident_status['Investigating']
-    }
 
-    status_component_map = {
-        settings.PASSING_STATE: component_statuses['Operational'],
-        settings.WARNING_STATE: component_statuses['Performance Issues'],
-        settings.CRITICAL_STATE: component_statuses['Major Outage'],
-        settings.UNKNOWN_STATE: component_statuses['Partial Outage']
-    }
+def cachet_incident_request(obj, message_template, cachet_config, components):
+    """
+    Build the incident POST for the component intersecting obj.Tags and
+    claim its new status in components.
 
-    # Get existing components from Cachet
-    component_id = None
-    component_name = None
-    intersecting_tag = None
-    try:
-        components_response = requests.get(component_url)
-        components_response.raise_for_status()
-        components = components_response.json().get('data')
-        if components:
-            component_names = [component['name'].lower() for component in components]
-            intersecting_tag, = set(component_names).intersection(obj.Tags)
-            component_id, component_name = [(comp['id'], comp['name']) for comp in components
-                                            if comp['name'].lower() == intersecting_tag][0]
-        else:
-            settings.logger.error('No components were retrieved from Cachet. Skipping incident reporting.')
-    except (ConnectionError, HTTPError) as components_exception:
-        settings.logger.error('Unable to retrieve Cachet components: {error}.'
-                              'Shipping incident reporting.'.format(error=components_exception))
-    except ValueError:
-        # there was no intersecting tag to unpack
+    Arguments:
+      components: CachetComponents holding the fetched components
+    Returns:
+      incident: (component_id, PluginRequest), None when no component
+                matches or the component already is in that status
+    """
+    if not components.components:
+        settings.logger.error('No components were retrieved from Cachet. Skipping incident reporting.')
+        return None
+
+    component = components.match(obj.Tags)
+
+    if component is None:
+        # there was no single intersecting tag
         settings.logger.error('A matching component could not be found. Skipping incident reporting.')
+        return None
+
+    component_id, component_name = component['id'], component['name']
+    component_status = CACHET_STATUS_COMPONENT_MAP.get(obj.Status)
 
-    if not all([component_id, component_name, intersecting_tag]):
-        # an exception was encountered above and we are unable to construct the POST
+    if not components.claim(component_id, component_status):
+        settings.logger.info('Component={component} already has status {status}. '
+                             'Skipping incident reporting.'.format(
+                                 component=component_name, status=component_status))
         return None
 
     # Construct the payload
     data = {
         'name': '{service} is in a {status} state'.format(service=component_name, status=obj.Status),
         'message': message_template.replace('\n', ' '),
-        'status': status_incident_map.get(obj.Status),
+        'status': CACHET_STATUS_INCIDENT_MAP.get(obj.Status),
         'visible': 1,  # always visible
         'notify': cachet_config['notify_subscribers'] if cachet_config['notify_subscribers'] else False,
         'component_id': component_id,
-        'component_status': status_component_map.get(obj.Status)
+        'component_status': component_status
     }
 
+    return component_id, PluginRequest(
+        "Cachet",
+        "Component={component}".format(component=component_name),
+        urljoin(cachet_config['site_url'], CACHET_INCIDENT_ENDPOINT),
+        data=json.dumps(data),
+        headers={
+            'X-Cachet-Token': cachet_config['api_token'],
+            'content-type': 'application/json',
+        },
+        retry=RetryPolicy.fromConfig(cachet_config))
+
+
+def notify_cache(obj, message_template, cachet_config, components=None):
+    """
+    Arguments:
+      components: CachetComponents shared by the run, the components are
+                  fetched for this alert alone when not given
+    """
+    if not cachet_configured(cachet_config):
+        return None
+
+    if components is None:
+        components = CachetComponents()
+
+    # Get existing components from Cachet
+    try:
+        components.refresh(cachet_config, cachet_fetch_components)
+    except requests.RequestException as components_exception:
+        settings.logger.error('Unable to retrieve Cachet components: {error}.'
+                              'Shipping incident reporting.'.format(error=components_exception))
+        return None
+
+    incident = cachet_incident_request(obj, message_template,
+                                       cachet_config, components)
+
+    if incident is None:
+        # unable to construct the POST
+        return None
+
+    component_id, plugin_request = incident
+
     try:
-        response = requests.post(incident_url, headers=headers, data=json.dumps(data))
-        response.raise_for_status()
-        return response.status_code
-    except (ConnectionError, HTTPError) as incidents_exception:
+        status_code = send_request(plugin_request, message_template)
+    except requests.RequestException as incidents_exception:
+        components.forget(component_id)
         settings.logger.error('Unable to post Cachet incident: {error}'.format(error=incidents_exception))
         return None
 
+    if not 200 <= status_code < 300:
+        components.forget(component_id)
+        settings.logger.error('Unable to post Cachet incident: {status}'.format(status=status_code))
+        return None
+
+    return status_code
 
-def notify_elasticsearchlog(obj, message_template, es_logpath):
 
-    logdata = {"@timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
-               "Message": message_template.replace('\n', ' '),
-               "Node": obj.Node,
-               "CheckID": obj.CheckID,
-               "Name": obj.Name,
-               "Tags": ', '.join(obj.Tags),
-               "Notes": obj.Notes,
-               "Output": obj.Output,
-               "ServiceID": obj.ServiceID,
-               "ServiceName": obj.ServiceName
-               }
+def elasticsearchlog_document(obj, message_template):
+    return {"@timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+            "Message": message_template.replace('\n', ' '),
+            "Node": obj.Node,
+            "CheckID": obj.CheckID,
+            "Name": obj.Name,
+            "Tags": ', '.join(obj.Tags),
+            "Notes": obj.Notes,
+            "Output": obj.Output,
+            "ServiceID": obj.ServiceID,
+            "ServiceName": obj.ServiceName
+            }
+
+
+def notify_elasticsearchlog(obj, message_template, es_logpath, writer=None):
+    """
+    Arguments:
+      writer: JSONLinesWriter shared by the run, the line is appended to
+              es_logpath["logpath"] right away when not given
+    """
+    logdata = elasticsearchlog_document(obj, message_template)
+
+    if writer is not None:
+        writer.write(logdata)
+        return
 
     try:
         with open(es_logpath["logpath"], "a") as elasticsearchlog:
@@ -371,3 +587,23 @@ def notify_elasticsearchlog(obj, message_template, es_logpath):
     except IOError, es_log_error:
         settings.logger.error("There was an issue writing to {logpath}: {error}".format(logpath=es_logpath,
                                                                                         error=es_log_error))
+
+
+def notify_elasticsearch(obj, message_template, consul_elasticsearch, sink=None):
+    """
+    Index the elasticsearchlog document of obj through the _bulk API.
+
+    Arguments:
+      sink: ElasticsearchBulkSink shared by the run, the document is sent
+            on its own when not given
+    Returns:
+      status_code: of the last bulk request, None when still buffered
+    """
+    document = elasticsearchlog_document(obj, message_template)
+
+    if sink is not None:
+        return sink.add(document)
+
+    sink = ElasticsearchBulkSink(consul_elasticsearch, SESSIONS)
+    sink.add(document)
+    return sink.close() or sink.status_code
@@ -18,10 +18,51 @@ KV_ALERTING_NOTIFY_PAGERDUTY = "alerting/notify/pagerduty"
 KV_ALERTING_NOTIFY_INFLUXDB = "alerting/notify/influxdb"
 KV_ALERTING_NOTIFY_ELASTICSEARCHLOG = "alerting/notify/elasticsearchlog"
 KV_ALERTING_NOTIFY_CACHET = "alerting/notify/cachet"
+KV_ALERTING_NOTIFY_ELASTICSEARCH = "alerting/notify/elasticsearch"
 
+# plugin name: (KV location, dictionary of tags to lowercase)
+NOTIFY_PLUGINS = {"hipchat": (KV_ALERTING_NOTIFY_HIPCHAT, "rooms"),
+                  "slack": (KV_ALERTING_NOTIFY_SLACK, "rooms"),
+                  "mailgun": (KV_ALERTING_NOTIFY_MAILGUN, "teams"),
+                  "email": (KV_ALERTING_NOTIFY_EMAIL, "teams"),
+                  "pagerduty": (KV_ALERTING_NOTIFY_PAGERDUTY, "teams"),
+                  "influxdb": (KV_ALERTING_NOTIFY_INFLUXDB, "databases"),
+                  "cachet": (KV_ALERTING_NOTIFY_CACHET, None),
+                  "elasticsearchlog": (KV_ALERTING_NOTIFY_ELASTICSEARCHLOG, None),
+                  "elasticsearch": (KV_ALERTING_NOTIFY_ELASTICSEARCH, None)}
+
+KV_ALERTING = "alerting"
+KV_ALERTING_BLACKLIST = "alerting/blacklist/"
+KV_ALERTING_NOTIFY = "alerting/notify/"
 KV_PRIOR_STATE = "alerting/prior"
+KV_PRIOR_STATE_MANIFEST = "alerting/prior/manifest"
 KV_ALERTING_HASHES = "alerting/hashes"
 
+# Prior state format written to KV_PRIOR_STATE, 2 keeps only the fields
+# needed to diff, 3 adds the flap detection history. Set to 2 (or 1) while
+# older consulalerting versions still run, every format is always read.
+PRIOR_STATE_VERSION = 3
+
+# Prior state backend, "kv" uses the single key KV_PRIOR_STATE, "chunked"
+# compresses the prior state and splits it across
+# KV_PRIOR_STATE/<generation>/<n> keys tied together by a manifest key, for
+# datacenters whose prior state exceeds Consul's 512KB value limit.
+PRIOR_STATE_STORE = "kv"
+PRIOR_STATE_CHUNK_SIZE = 256 * 1024
+PRIOR_STATE_COMPRESSION_LEVEL = 6
+# seconds before chunks not referenced by the manifest are removed
+PRIOR_STATE_ORPHAN_TTL = 600
+
+# Flap detection, the timestamps of the last FLAP_HISTORY_SIZE Status
+# changes of each check are kept with the prior state. A change scores 1,
+# halving every FLAP_HALF_LIFE seconds, a check starts flapping once its
+# score reaches FLAP_START_SCORE and stops below FLAP_STOP_SCORE. Alerts of
+# flapping checks are suppressed, FLAP_START_SCORE = 0 disables detection.
+FLAP_HISTORY_SIZE = 10
+FLAP_HALF_LIFE = 300
+FLAP_START_SCORE = 4
+FLAP_STOP_SCORE = 1.5
+
 WARNING_STATE = "warning"
 CRITICAL_STATE = "critical"
 PASSING_STATE = "passing"
@@ -30,6 +71,122 @@ ANY_STATE = "any"
 
 CONSUL_HOST = "0.0.0.0"
 CONSUL_PORT = 8500
+CONSUL_URI = "http://{host}:{port}/v1".format(host=CONSUL_HOST, port=CONSUL_PORT)
+
+# WatchCheckDaemon, seconds a blocking query on /v1/health/state/any
+# may be held open by Consul and seconds to back off after a failed query
+DAEMON_BLOCKING_WAIT = 300
+DAEMON_RETRY_INTERVAL = 5
+
+# Bursts of health changes are evaluated once, after no change arrived for
+# COALESCE_QUIET_PERIOD seconds or COALESCE_MAX_DELAY seconds passed, 0
+# evaluates every change. Only WatchCheckDaemon coalesces, Consul runs one
+# watch handler at a time and evaluates each of its snapshots.
+COALESCE_QUIET_PERIOD = 0
+COALESCE_MAX_DELAY = 10
+
+# Timings and counters of the last run, written as JSON to a file in a
+# directory writable only by consulalerting, e.g.
+# "/var/lib/consulalerting/run-stats.json", None only logs them
+RUN_STATS_PATH = None
+
+# Prometheus metrics, served by WatchCheckDaemon on METRICS_ADDRESS:
+# METRICS_PORT (None disables). Forked watch invocations write
+# METRICS_TEXTFILE_PATH for the node_exporter textfile collector, e.g.
+# "/var/lib/node_exporter/textfile_collector/consulalerting.prom", None
+# disables, and add up their metrics in METRICS_STATE_PATH, None keeps
+# them in "<METRICS_TEXTFILE_PATH>.state".
+METRICS_ADDRESS = "127.0.0.1"
+METRICS_PORT = 9199
+METRICS_TEXTFILE_PATH = None
+METRICS_STATE_PATH = None
+
+# alerting/ configuration, read together with the prior state as get-tree
+# operations of a single /v1/txn request
+KV_ALERTING_CONFIG_PREFIXES = (KV_ALERTING_BLACKLIST,
+                               KV_ALERTING_NOTIFY,
+                               KV_ALERTING_HEALTH_CHECK_TAGS)
+
+# parsed alerting/ configuration cached between runs, a value is only parsed
+# again once its ModifyIndex moved. The file holds plugin api tokens and
+# is created readable by its owner only, e.g.
+# "/var/lib/consulalerting/config_cache.json", None disables.
+CONFIG_CACHE_PATH = None
+
+# NotificationEngine, worker threads sending notifications and seconds
+# a run waits for all of them to finish
+NOTIFY_WORKERS = 8
+NOTIFY_DEADLINE = 60
+
+# "threads" runs plugins on NOTIFY_WORKERS threads, "async" runs them as
+# tornado coroutines with at most NOTIFY_ASYNC_MAX_CLIENTS requests in
+# flight, each with a timeout of NOTIFY_ASYNC_TIMEOUT seconds
+NOTIFY_DISPATCHER = "threads"
+NOTIFY_ASYNC_MAX_CLIENTS = 100
+NOTIFY_ASYNC_TIMEOUT = 10
+
+# hipchat, slack, mailgun and email send one message per room/team holding
+# up to NOTIFY_DIGEST_MAX_ALERTS alerts instead of one message per alert,
+# overridden with "digest" and "digest_max_alerts" in the plugin KV
+NOTIFY_DIGEST = False
+NOTIFY_DIGEST_MAX_ALERTS = 25
+
+# Notifications per minute of each plugin, and of each room/team/service key
+# of hipchat, slack, mailgun, email and pagerduty. "rate_limit" and
+# "destination_rate_limit" in the plugin's KV configuration override, 0
+# disables. Held back alerts are sent as one summary per destination.
+NOTIFY_RATE_LIMIT = 0
+NOTIFY_DESTINATION_RATE_LIMIT = 0
+
+# HTTP notifications failing with a NOTIFY_RETRY_STATUSES status or a
+# connection error are sent up to NOTIFY_RETRY_ATTEMPTS times, waiting a
+# random 0 to min(NOTIFY_RETRY_MAX_DELAY, NOTIFY_RETRY_BASE_DELAY * 2 ** n)
+# seconds in between, at most NOTIFY_RETRY_BUDGET retries per run.
+# Overridden with "retry" in the plugin KV
+NOTIFY_RETRY_ATTEMPTS = 3
+NOTIFY_RETRY_BASE_DELAY = 0.5
+NOTIFY_RETRY_MAX_DELAY = 10
+NOTIFY_RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+NOTIFY_RETRY_BUDGET = 50
+
+# Seconds the Cachet components index is reused by WatchCheckDaemon
+CACHET_COMPONENTS_TTL = 300
+
+# elasticsearchlog plugin, rotate the log before it exceeds
+# ELASTICSEARCHLOG_MAX_BYTES or once every ELASTICSEARCHLOG_ROTATE_SECONDS
+# (0 disables either), keeping ELASTICSEARCHLOG_BACKUP_COUNT files.
+# Overridden with "max_bytes", "rotate_seconds" and "backup_count" in KV
+ELASTICSEARCHLOG_MAX_BYTES = 100 * 1024 * 1024
+ELASTICSEARCHLOG_ROTATE_SECONDS = 0
+ELASTICSEARCHLOG_BACKUP_COUNT = 5
+ELASTICSEARCHLOG_BUFFER_BYTES = 1024 * 1024
+
+# elasticsearch plugin, _bulk requests hold up to ELASTICSEARCH_BATCH_SIZE
+# documents and are sent at least every ELASTICSEARCH_FLUSH_INTERVAL
+# seconds, documents go to the strftime formatted ELASTICSEARCH_INDEX.
+# Overridden with "batch_size", "flush_interval" and "index" in KV
+ELASTICSEARCH_BATCH_SIZE = 500
+ELASTICSEARCH_FLUSH_INTERVAL = 5
+ELASTICSEARCH_INDEX = "consulalerting-%Y.%m.%d"
+
+# Seconds for SMTP socket operations of the email plugin
+SMTP_TIMEOUT = 30
+
+# Maximum points in one InfluxDB write, "batch_size" in the influxdb KV
+INFLUXDB_BATCH_SIZE = 5000
+
+# Notification plugins keep a pool of up to NOTIFY_HTTP_POOL_MAXSIZE
+# keep-alive connections per endpoint, with NOTIFY_HTTP_POOL_BLOCK senders
+# wait for a free connection instead of opening a throwaway one
+NOTIFY_HTTP_POOL_MAXSIZE = NOTIFY_WORKERS
+NOTIFY_HTTP_POOL_BLOCK = False
+NOTIFY_HTTP_TIMEOUT = 10
+
+# Bytes read at a time while streaming the watch payload from STDIN
+HEALTH_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Maximum /v1/catalog/node/<node> lookups in flight while tagging alerts
+CATALOG_LOOKUP_CONCURRENCY = 8
 
 if sys.version_info >= (2, 6, 0):
     consul = consulate.Consul(host=CONSUL_HOST,port=CONSUL_PORT)
@@ -1,11 +1,12 @@
-import consulate
-import hashlib
+import base64
 import requests
 import json
 import settings
+import Metrics
 from ConsulHealthStruct import ConsulHealthStruct
 
 
+@Metrics.CONSUL_SECONDS.timed(endpoint="health_state")
 def currentState():
     try:
         current = settings.consul.health.state("any")
@@ -17,44 +18,117 @@ def currentState():
                      "ConsulURI={u}".format(u=settings.consul._base_uri))
 
 
-def priorState(key):
-    try:
-        prior = settings.consul.kv[key]
-        settings.logger.debug("PriorConsulHealth={health}".format(
-            health=prior))
+@Metrics.CONSUL_SECONDS.timed(endpoint="health_state_blocking")
+def blockingState(index=None, wait=settings.DAEMON_BLOCKING_WAIT):
+    """
+    Blocking query on /v1/health/state/any, Consul holds the request open
+    until the health state changes past `index` or `wait` seconds elapse.
 
-        return json.loads(prior)
-    except:
-        prior = []
-        settings.logger.warn("Message=No previous prior catalog health found from "
-                    "ConsulURI={l}".format(l=key))
+    Returns:
+      (index, health): X-Consul-Index of the response and the health list
+    """
+    params = {"wait": "{wait}s".format(wait=wait)}
+    if index:
+        params["index"] = index
 
-        return prior
+    # Consul adds up to wait/16 of jitter to a blocking query
+    response = requests.get("{uri}/health/state/{state}".format(
+        uri=settings.CONSUL_URI, state=settings.ANY_STATE),
+        params=params,
+        timeout=wait + wait / 16 + settings.consul._adapter.timeout)
+    response.raise_for_status()
 
+    consul_index = int(response.headers.get("X-Consul-Index", 0))
+    settings.logger.debug("Message=Blocking query returned "
+                          "ConsulIndex={i}".format(i=consul_index))
 
-def getCheckTags(key):
-    try:
-        tags = settings.consul.kv[key]
-        settings.logger.debug("HealthCheckTags={tags}".format(
-            tags=tags))
+    return consul_index, response.json()
 
-        return json.loads(tags)
-    except:
-        tags = []
-        settings.logger.warn("Message=Could not obtain system check tags from "
-                    "ConsulURI={l}".format(l=key))
 
-        return tags
+@Metrics.CONSUL_SECONDS.timed(endpoint="kv_txn")
+def getKVTrees(prefixes):
+    """
+    Every key starting with one of `prefixes`, read with a single /v1/txn
+    request of get-tree operations, values are base64 decoded.
+
+    Returns:
+      (index, rows): X-Consul-Index and a list of dictionaries with
+        Key, Value and ModifyIndex
+    """
+    operations = [{"KV": {"Verb": "get-tree", "Key": prefix}}
+                  for prefix in prefixes]
+
+    if not operations:
+        return 0, []
+
+    response = requests.put("{uri}/txn".format(uri=settings.CONSUL_URI),
+                            data=json.dumps(operations),
+                            timeout=settings.consul._adapter.timeout)
+    response.raise_for_status()
+
+    consul_index = int(response.headers.get("X-Consul-Index", 0))
+
+    rows = []
+    for result in response.json().get("Results") or []:
+        row = result.get("KV")
+        if not row:
+            continue
+
+        value = row.get("Value")
+        rows.append({"Key": row["Key"],
+                     "Value": base64.b64decode(value) if value else None,
+                     "ModifyIndex": row.get("ModifyIndex", 0)})
+
+    settings.logger.debug("Message=KV trees read Prefixes={p} Keys={k} "
+                          "ConsulIndex={i}".format(p=",".join(prefixes),
+                                                   k=len(rows),
+                                                   i=consul_index))
+    return consul_index, rows
+
+
+@Metrics.CONSUL_SECONDS.timed(endpoint="kv_put")
+def putRawKey(key, value):
+    """
+    PUT `value` as is (no JSON encoding) under `key` with a single request.
+    """
+    response = requests.put("{uri}/kv/{key}".format(uri=settings.CONSUL_URI,
+                                                    key=key),
+                            data=value,
+                            timeout=settings.consul._adapter.timeout)
+    response.raise_for_status()
+
+    return response.json() is True
 
 
+@Metrics.CONSUL_SECONDS.timed(endpoint="kv_delete")
+def deleteKey(key, recurse=False):
+    params = {"recurse": ""} if recurse else {}
+    response = requests.delete("{uri}/kv/{key}".format(uri=settings.CONSUL_URI,
+                                                       key=key),
+                               params=params,
+                               timeout=settings.consul._adapter.timeout)
+    response.raise_for_status()
 
+    return response.json() is True
 
+
+@Metrics.CONSUL_SECONDS.timed(endpoint="session_create")
 def createSession():
     return settings.consul.session.create(ttl='10s', delay='0s', behavior='delete')
 
 
-def getHash(currentState):
-    return hashlib.md5(str(currentState)).hexdigest()
+@Metrics.CONSUL_SECONDS.timed(endpoint="session_renew")
+def renewSession(session_id):
+    """
+    Renew a session created by createSession, returns False when Consul
+    no longer knows the session (TTL expired) and a new one is needed.
+    """
+    try:
+        return isinstance(settings.consul.session.renew(session_id), (dict, list))
+    except Exception:
+        settings.logger.warn("Message=Could not renew "
+                             "Session={s}".format(s=session_id))
+        return False
 
 
 def checkForKey(key):
@@ -69,30 +143,18 @@ def putKey(key, value):
         pass
 
 
+@Metrics.CONSUL_SECONDS.timed(endpoint="lock_acquire")
 def acquireLock(key, session_id):
 
     return settings.consul.kv.acquire_lock(key, session_id)
 
 
+@Metrics.CONSUL_SECONDS.timed(endpoint="lock_release")
 def releaseLock(key, session_id):
 
     return settings.consul.kv.release_lock(key, session_id)
 
 
-def getBlacklist(key):
-
-    try:
-        bl = settings.consul.kv[key]
-        settings.logger.debug("Key={k} Tags={t}".format(k=key, t=bl))
-
-        return json.loads(bl)
-
-    except KeyError:
-        settings.logger.warn("Message=Could not obtain node blacklist from "
-                    "ConsulURI={location}".format(location=key))
-        return []
-
-
 def createConsulHealthList(object_list):
     """
     Creates a list of ConsulHealthStruct
@@ -108,23 +170,6 @@ def createConsulHealthList(object_list):
         raise
 
 
-def getHashStateSet(object_list, state):
-    """
-    Used to compare prior node state to current
-    """
-    return set(
-        [hash(obj) for obj in object_list if obj.Status == state])
-
-
-def getObjectListByState(object_list, state):
-    """
-    Filter a list of ConsulHealtNodeStruct by state
-    States: passing,warning,critical,unknown
-    """
-    return filter(
-        lambda obj: obj.Status == state, object_list)
-
-
 def common_notifiers(obj, kv_tags_dictname, kv_dict):
     keynames = set(kv_dict[kv_tags_dictname].keys())
     obj_tags = set(obj.Tags)
@@ -134,10 +179,8 @@ def common_notifiers(obj, kv_tags_dictname, kv_dict):
     return common
 
 
-def load_plugin(KV_LOCATION, tags_dictname=None):
-    # get request to 0.0.0.0:8500/v1/kv/notify/<plugin_name>
-    #  which routes to consul master
-    plugin = json.loads(settings.consul.kv[KV_LOCATION])
+def parse_plugin(value, tags_dictname=None):
+    plugin = json.loads(value)
 
     # Convert Keys to lower case
     plugin = _dict_keys_to_low(plugin)
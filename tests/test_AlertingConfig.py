@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+import base64
+import responses
+import json as json
+import consulalerting.settings as settings
+from consulalerting.AlertingConfig import AlertingConfig
+from consulalerting.ConfigCache import ConfigCache
+
+
+TXN_URI = settings.CONSUL_URI + "/txn"
+
+CONSUL_SLACK = {"API_TOKEN": "testing123testing123",
+                "rooms": {"DevOps": "#devops"}}
+
+
+def kv_row(key, value, modify_index=1):
+    return {"Key": key,
+            "Value": base64.b64encode(json.dumps(value)),
+            "ModifyIndex": modify_index}
+
+
+KV_TREE = [kv_row(settings.KV_ALERTING_AVAILABLE_PLUGINS, ["slack", "hipchat"]),
+           kv_row(settings.KV_ALERTING_NOTIFY_SLACK, CONSUL_SLACK),
+           kv_row(settings.KV_ALERTING_BLACKLIST_NODES, ["foobar"]),
+           kv_row(settings.KV_ALERTING_HEALTH_CHECK_TAGS, ["devops"]),
+           {"Key": settings.KV_ALERTING_BLACKLIST_CHECKS, "Value": None,
+            "ModifyIndex": 1}]
+
+
+class AlertingConfigTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_path = settings.CONFIG_CACHE_PATH
+        settings.CONFIG_CACHE_PATH = None
+        self.directory = tempfile.mkdtemp()
+        self.kv = list(KV_TREE)
+
+    def tearDown(self):
+        settings.CONFIG_CACHE_PATH = self.cache_path
+        shutil.rmtree(self.directory)
+
+    def consul(self, request):
+        """
+        /v1/txn answering get-tree operations over self.kv, X-Consul-Index
+        being the highest ModifyIndex of the whole KV
+        """
+        results = []
+        for operation in json.loads(request.body):
+            self.assertEqual("get-tree", operation["KV"]["Verb"])
+            results.extend({"KV": row} for row in self.kv
+                           if row["Key"].startswith(operation["KV"]["Key"]))
+
+        headers = {"X-Consul-Index": str(max([0] + [row["ModifyIndex"]
+                                                    for row in self.kv]))}
+
+        return 200, headers, json.dumps({"Results": results, "Errors": None})
+
+    def requested(self):
+        """
+        prefixes of each transaction sent
+        """
+        return [sorted(operation["KV"]["Key"]
+                       for operation in json.loads(call.request.body))
+                for call in responses.calls]
+
+    @responses.activate
+    def test_load(self):
+        self.kv.append(kv_row(settings.KV_ALERTING_NOTIFY_PAGERDUTY, {}, 42))
+        responses.add_callback(responses.PUT, TXN_URI, callback=self.consul)
+
+        config = AlertingConfig.load()
+
+        self.assertEqual([sorted(settings.KV_ALERTING_CONFIG_PREFIXES +
+                                 (settings.KV_PRIOR_STATE,))],
+                         self.requested())
+        self.assertEqual(42, config.consul_index)
+        self.assertEqual(("foobar",), config.node_blacklist)
+        self.assertEqual((), config.service_blacklist)
+        self.assertEqual((), config.check_blacklist)
+        self.assertEqual(("devops",), config.health_check_tags)
+        self.assertEqual((), config.prior)
+        self.assertEqual(frozenset(["slack", "hipchat"]), config.available_plugins)
+        self.assertEqual({"api_token": "testing123testing123",
+                          "rooms": {"devops": "#devops"}}, config.plugins["slack"])
+        self.assertFalse("hipchat" in config.plugins)
+
+    @responses.activate
+    def test_loadBase(self):
+        responses.add_callback(responses.PUT, TXN_URI, callback=self.consul)
+
+        blacklists = AlertingConfig.load(
+            prefixes=(settings.KV_ALERTING_BLACKLIST,), prior=False)
+
+        self.assertEqual([[settings.KV_ALERTING_BLACKLIST]], self.requested())
+        self.assertEqual(("foobar",), blacklists.node_blacklist)
+        self.assertEqual({}, blacklists.plugins)
+        responses.calls.reset()
+
+        config = AlertingConfig.load(base=blacklists)
+
+        self.assertEqual([sorted([settings.KV_ALERTING_NOTIFY,
+                                  settings.KV_ALERTING_HEALTH_CHECK_TAGS,
+                                  settings.KV_PRIOR_STATE])],
+                         self.requested())
+        self.assertEqual(("foobar",), config.node_blacklist)
+        self.assertTrue("slack" in config.plugins)
+        self.assertEqual(sorted(settings.KV_ALERTING_CONFIG_PREFIXES),
+                         sorted(config.prefixes))
+
+    @responses.activate
+    def test_loadMissingTree(self):
+        self.kv = []
+        responses.add_callback(responses.PUT, TXN_URI, callback=self.consul)
+
+        config = AlertingConfig.load()
+
+        self.assertEqual(None, config.available_plugins)
+        self.assertEqual({}, config.plugins)
+
+    @responses.activate
+    def test_loadWithCache(self):
+        self.kv.append(kv_row(settings.KV_PRIOR_STATE, [], 7))
+        responses.add_callback(responses.PUT, TXN_URI, callback=self.consul)
+        settings.CONFIG_CACHE_PATH = os.path.join(self.directory, "config.json")
+
+        AlertingConfig.load()
+
+        self.assertEqual(0600, stat.S_IMODE(
+            os.stat(settings.CONFIG_CACHE_PATH).st_mode))
+        responses.calls.reset()
+
+        cache = ConfigCache(settings.CONFIG_CACHE_PATH)
+        config = AlertingConfig.load(cache)
+
+        # one request per load, unchanged values are not parsed again
+        self.assertEqual(1, len(responses.calls))
+        self.assertEqual(4, cache.hits)
+        self.assertEqual(("foobar",), config.node_blacklist)
+        self.assertEqual("#devops", config.plugins["slack"]["rooms"]["devops"])
+        self.assertEqual((settings.KV_PRIOR_STATE,), config.prior_keys)
+
+        self.kv[2] = kv_row(settings.KV_ALERTING_BLACKLIST_NODES, ["baz"], 8)
+        cache = ConfigCache(settings.CONFIG_CACHE_PATH)
+
+        config = AlertingConfig.load(cache)
+
+        self.assertEqual(3, cache.hits)
+        self.assertEqual(("baz",), config.node_blacklist)
+        self.assertEqual(8, ConfigCache(settings.CONFIG_CACHE_PATH).consul_index)
+
+    @responses.activate
+    def test_loadSkipsOtherPriorKeys(self):
+        self.kv.append(kv_row(settings.KV_PRIOR_STATE + "ity", ["foo"]))
+        responses.add_callback(responses.PUT, TXN_URI, callback=self.consul)
+
+        config = AlertingConfig.load()
+
+        self.assertEqual((), config.prior_keys)
+        self.assertFalse(settings.KV_PRIOR_STATE + "ity" in config._values)
+
+    def test_immutable(self):
+        config = AlertingConfig({})
+
+        self.assertRaises(AttributeError, setattr, config, "prior", [])
+        self.assertRaises(AttributeError, delattr, config, "prior")
+
+
+if __name__ == '__main__':
+    unittest.main()
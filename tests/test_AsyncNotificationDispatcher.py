@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+import time
+import threading
+import unittest
+import json as json
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from consulalerting import plugins
+from consulalerting.ConsulHealthStruct import ConsulHealthStruct
+from consulalerting.NotificationDispatcher import Delivery
+from consulalerting.AsyncNotificationDispatcher import AsyncNotificationDispatcher
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self, status, body=""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.calls.append(("GET", self.path, None))
+        self.respond(200, json.dumps({"data": [{"id": 3, "name": "Web"}]}))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.getheader("Content-Length", 0)))
+        self.server.calls.append(("POST", self.path, body))
+        self.respond(500 if self.path.startswith("/error") else 200)
+
+
+class AsyncNotificationDispatcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.calls = []
+        self.url = "http://127.0.0.1:{p}".format(p=self.server.server_port)
+
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        self.obj = ConsulHealthStruct(Node="consul", CheckID="service:web",
+                                      Name="web", Status="critical",
+                                      ServiceID="web", ServiceName="web",
+                                      Tags=["web"])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_RunHTTPPlugins(self):
+        consul_hipchat = {"url": self.url + "/hipchat", "api_token": "token",
+                          "rooms": {"devops": "1", "web": "2"}}
+        consul_influxdb = {"url": self.url + "/write", "series": "alerts",
+                           "databases": {"devops": "alerting"}}
+
+        deliveries = AsyncNotificationDispatcher(deadline=10).Run([
+            Delivery("hipchat", plugins.notify_hipchat,
+                     (self.obj, "web critical", ["devops", "web"], consul_hipchat)),
+            Delivery("influxdb", plugins.notify_influxdb_batch,
+                     ([(self.obj, "web critical", ["devops"])], consul_influxdb))])
+
+        self.assertEqual([200, 200], [delivery.result for delivery in deliveries])
+        self.assertTrue(all(delivery.ok for delivery in deliveries))
+        paths = sorted(path.split("?")[0] for _, path, _ in self.server.calls)
+        self.assertEqual(["/hipchat", "/hipchat", "/write"], paths)
+
+    def test_RunCachet(self):
+        cachet = {"api_token": "token", "site_url": self.url,
+                  "notify_subscribers": False}
+
+        delivery, = AsyncNotificationDispatcher(deadline=10).Run(
+            [Delivery("cachet", plugins.notify_cache,
+                      (self.obj, "web critical", cachet))])
+
+        self.assertEqual(200, delivery.result)
+        self.assertEqual(["GET", "POST"],
+                         [method for method, _, _ in self.server.calls])
+        self.assertEqual(3, json.loads(self.server.calls[1][2])["component_id"])
+
+    def test_RunHTTPError(self):
+        consul_influxdb = {"url": self.url + "/error", "series": "alerts",
+                           "databases": {"devops": "alerting"}}
+
+        delivery, = AsyncNotificationDispatcher(deadline=10).Run(
+            [Delivery("influxdb", plugins.notify_influxdb,
+                      (self.obj, "web critical", ["devops"], consul_influxdb))])
+
+        self.assertEqual(500, delivery.result)
+
+    def test_RunExecutorTarget(self):
+        def fail():
+            raise ValueError("boom")
+
+        ok, failed = AsyncNotificationDispatcher(deadline=10).Run(
+            [Delivery("custom", lambda value: value, ("done",)),
+             Delivery("custom", fail, ())])
+
+        self.assertEqual("done", ok.result)
+        self.assertTrue(ok.ok)
+        self.assertTrue(failed.completed)
+        self.assertTrue(isinstance(failed.error, ValueError))
+
+    def test_RunDeadline(self):
+        release = threading.Event()
+        start = time.time()
+
+        delivery, = AsyncNotificationDispatcher(deadline=0.1).Run(
+            [Delivery("custom", release.wait, (5,))])
+
+        self.assertTrue(time.time() - start < 5)
+        self.assertFalse(delivery.completed)
+        self.assertTrue(delivery.running)
+        self.assertFalse(delivery.ok)
+
+        release.set()
+        self.assertTrue(delivery.done.wait(5))
+
+    def test_RunEmpty(self):
+        self.assertEqual([], AsyncNotificationDispatcher().Run([]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+import unittest
+import responses
+from mock import Mock
+from consulalerting import plugins
+from consulalerting.CachetComponents import CachetComponents
+from consulalerting.ConsulHealthStruct import ConsulHealthStruct
+
+
+CONSUL_CACHET = {"api_token": "notreallyatoken",
+                 "site_url": "http://status.company.com",
+                 "notify_subscribers": False}
+
+COMPONENTS = [{"id": 2, "name": "Redis", "status": "1"},
+              {"id": 4, "name": "mysql", "status": 4},
+              {"id": 6, "name": "web"}]
+
+
+class CachetComponentsTests(unittest.TestCase):
+
+    def test_match(self):
+        components = CachetComponents()
+        components.load(CONSUL_CACHET, COMPONENTS)
+
+        self.assertEqual(2, components.match(["devops", "redis"])["id"])
+        self.assertEqual(None, components.match(["redis", "mysql"]))
+        self.assertEqual(None, components.match(["devops"]))
+
+    def test_claim(self):
+        components = CachetComponents()
+        components.load(CONSUL_CACHET, COMPONENTS)
+
+        self.assertFalse(components.claim(2, 1))
+        self.assertTrue(components.claim(2, 4))
+        self.assertFalse(components.claim(2, 4))
+        self.assertTrue(components.claim(6, 1))
+
+        components.forget(6)
+        self.assertTrue(components.claim(6, 1))
+
+    def test_refreshOnlyWhenStale(self):
+        fetch = Mock(return_value=COMPONENTS)
+        components = CachetComponents(ttl=60)
+
+        components.refresh(CONSUL_CACHET, fetch)
+        components.refresh(CONSUL_CACHET, fetch)
+        self.assertEqual(1, fetch.call_count)
+
+        components.fetched -= 61
+        components.refresh(CONSUL_CACHET, fetch)
+        self.assertEqual(2, fetch.call_count)
+
+        components.refresh(dict(CONSUL_CACHET, site_url="http://other"), fetch)
+        self.assertEqual(3, fetch.call_count)
+
+    @responses.activate
+    def test_notifyCacheSharedIndex(self):
+        responses.add(responses.GET, "http://status.company.com/api/v1/components",
+                      json={"data": COMPONENTS}, status=200)
+        responses.add(responses.POST, "http://status.company.com/api/v1/incidents",
+                      json=True, status=200)
+        components = CachetComponents()
+        critical = ConsulHealthStruct(Node="consul", CheckID="service:redis",
+                                      Status="critical", Tags=["redis"])
+
+        self.assertEqual(200, plugins.notify_cache(critical, "redis critical",
+                                                   CONSUL_CACHET, components))
+        self.assertEqual(None, plugins.notify_cache(critical, "redis critical",
+                                                    CONSUL_CACHET, components))
+
+        self.assertEqual(["GET", "POST"],
+                         [c.request.method for c in responses.calls])
+
+    @responses.activate
+    def test_notifyCachePostFailForgets(self):
+        responses.add(responses.GET, "http://status.company.com/api/v1/components",
+                      json={"data": COMPONENTS}, status=200)
+        responses.add(responses.POST, "http://status.company.com/api/v1/incidents",
+                      status=500)
+        components = CachetComponents()
+        critical = ConsulHealthStruct(Node="consul", CheckID="service:web",
+                                      Status="critical", Tags=["web"])
+
+        self.assertEqual(None, plugins.notify_cache(critical, "web critical",
+                                                    CONSUL_CACHET, components))
+        self.assertTrue(components.claim(6, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
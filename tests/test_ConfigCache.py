@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+import json as json
+from consulalerting.ConfigCache import ConfigCache
+
+
+class ConfigCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "config.json")
+        self.parsed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def parser(self, value):
+        self.parsed.append(value)
+        return json.loads(value)
+
+    def test_getParsesOncePerModifyIndex(self):
+        cache = ConfigCache(self.path)
+
+        self.assertEqual(["a"], cache.get("alerting/blacklist/nodes", 5, '["a"]', self.parser))
+        self.assertEqual(["a"], cache.get("alerting/blacklist/nodes", 5, '["a"]', self.parser))
+        self.assertEqual(["b"], cache.get("alerting/blacklist/nodes", 6, '["b"]', self.parser))
+
+        self.assertEqual(['["a"]', '["b"]'], self.parsed)
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(2, cache.misses)
+
+    def test_savePersistsAcrossInstances(self):
+        cache = ConfigCache(self.path)
+        cache.get("alerting/notify/slack", 7, '{"rooms": {}}', self.parser)
+        self.assertTrue(cache.save())
+
+        self.assertEqual(0600, stat.S_IMODE(os.stat(self.path).st_mode))
+
+        cache = ConfigCache(self.path)
+        self.assertEqual({"rooms": {}},
+                         cache.get("alerting/notify/slack", 7, None, self.parser))
+        self.assertEqual(1, len(self.parsed))
+        self.assertFalse(cache.save())
+
+    def test_indexBackwardsDropsEntries(self):
+        cache = ConfigCache(self.path)
+        cache.index(10)
+        cache.get("alerting/notify/slack", 7, '{}', self.parser)
+        cache.save()
+
+        cache = ConfigCache(self.path)
+        self.assertEqual(10, cache.consul_index)
+        cache.index(12)
+        self.assertEqual(["alerting/notify/slack"], cache.entries.keys())
+
+        cache.index(3)
+        self.assertEqual({}, cache.entries)
+        self.assertEqual(3, cache.consul_index)
+
+    def test_prune(self):
+        cache = ConfigCache(self.path)
+        cache.get("alerting/notify/slack", 7, '{}', self.parser)
+        cache.get("alerting/notify/hipchat", 7, '{}', self.parser)
+
+        cache.prune(["alerting/notify/slack"])
+
+        self.assertEqual(["alerting/notify/slack"], cache.entries.keys())
+
+    def test_readCorruptFile(self):
+        with open(self.path, "w") as cache_file:
+            cache_file.write("{not json")
+
+        self.assertEqual({}, ConfigCache(self.path).entries)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -98,6 +98,25 @@ class ConsulHealthStructTests(unittest.TestCase):
 
 		self.assertEqual(2,len(obj[0].Tags))
 
+	def test_Slots(self):
+		obj = ConsulHealthStruct.ConsulHealthStruct(CreateIndex=10,Definition={},**CURRENT_STATE[1])
+
+		self.assertRaises(AttributeError,setattr,obj,"Definition",{})
+		self.assertEqual(None,obj.CreateIndex)
+		self.assertEqual(None,obj.Tags)
+		self.assertEqual(CURRENT_STATE[1],obj.asDict())
+
+		obj.Transition = "new warning"
+		self.assertEqual("new warning",obj.asDict()["Transition"])
+
+	def test_NotEqual(self):
+		obj_Current = utilities.createConsulHealthList(CURRENT_STATE)
+		obj_Prior = utilities.createConsulHealthList(PRIOR_STATE)
+
+		self.assertFalse(obj_Current[1] != obj_Prior[1])
+		self.assertTrue(obj_Current[0] != obj_Prior[1])
+		self.assertFalse(obj_Current[0] == "serfHealth")
+
 
 
 
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+import threading
+import unittest
+import json as json
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from requests import ConnectionError
+from consulalerting import plugins
+from consulalerting.ConsulHealthStruct import ConsulHealthStruct
+from consulalerting.ElasticsearchBulkSink import ElasticsearchBulkSink
+
+
+class BulkHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.getheader("Content-Length", 0)))
+        lines = body.splitlines()
+        self.server.requests.append((self.path, lines))
+
+        items = []
+        for action, document in zip(lines[0::2], lines[1::2]):
+            index = json.loads(action)["index"]["_index"]
+            if json.loads(document).get("Node") == "broken":
+                items.append({"index": {"_index": index, "status": 400,
+                                        "error": {"type": "mapper_parsing_exception"}}})
+            else:
+                items.append({"index": {"_index": index, "status": 201}})
+
+        response = json.dumps({"errors": any(item["index"]["status"] >= 300
+                                             for item in items),
+                               "items": items})
+        self.send_response(self.server.statuses.pop(0) if self.server.statuses
+                           else self.server.status)
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+
+class ElasticsearchBulkSinkTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), BulkHandler)
+        self.server.requests = []
+        self.server.status = 200
+        self.server.statuses = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        self.config = {"url": "http://127.0.0.1:{p}/".format(p=self.server.server_port),
+                       "index": "alerts-%Y", "batch_size": 3,
+                       "flush_interval": 60,
+                       "retry": {"attempts": 2, "base_delay": 0}}
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def document(self, node):
+        return {"Node": node, "CheckID": "serfHealth"}
+
+    def test_batches(self):
+        sink = ElasticsearchBulkSink(self.config)
+
+        for n in xrange(7):
+            sink.add(self.document("node-{n}".format(n=n)))
+        self.assertEqual(2, len(self.server.requests))
+
+        self.assertEqual(200, sink.close())
+        self.assertEqual([6, 6, 2], [len(lines) for _, lines in self.server.requests])
+        self.assertEqual("/_bulk", self.server.requests[0][0])
+        self.assertEqual(7, sink.indexed)
+        self.assertEqual(0, sink.failed)
+
+    def test_flushInterval(self):
+        sink = ElasticsearchBulkSink(dict(self.config, flush_interval=0))
+
+        sink.add(self.document("consul"))
+
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_flushIntervalString(self):
+        sink = ElasticsearchBulkSink(dict(self.config, flush_interval="0"))
+
+        sink.add(self.document("consul"))
+
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_flushIntervalQuietPeriod(self):
+        sink = ElasticsearchBulkSink(dict(self.config, flush_interval=0.05))
+
+        sink.add(self.document("consul"))
+        sink.add(self.document("foobar"))
+        sink.timer.join(5)
+
+        self.assertEqual([4], [len(lines) for _, lines in self.server.requests])
+        self.assertEqual(None, sink.timer)
+        self.assertEqual(None, sink.close())
+
+    def test_itemErrors(self):
+        sink = ElasticsearchBulkSink(self.config)
+
+        sink.add(self.document("consul"))
+        sink.add(self.document("broken"))
+        sink.close()
+
+        self.assertEqual(1, sink.indexed)
+        self.assertEqual(1, sink.failed)
+
+    def test_requestError(self):
+        self.server.status = 500
+        sink = ElasticsearchBulkSink(self.config)
+
+        sink.add(self.document("consul"))
+
+        self.assertEqual(500, sink.close())
+        self.assertEqual(2, len(self.server.requests))
+        self.assertEqual(1, sink.failed)
+        self.assertEqual(1, sink.dropped)
+
+    def test_requestRetried(self):
+        self.server.statuses = [503]
+        sink = ElasticsearchBulkSink(self.config)
+
+        sink.add(self.document("consul"))
+
+        self.assertEqual(200, sink.close())
+        self.assertEqual(2, len(self.server.requests))
+        self.assertEqual(1, sink.indexed)
+        self.assertEqual(0, sink.dropped)
+
+    def test_connectionError(self):
+        sink = ElasticsearchBulkSink(dict(self.config, url="http://127.0.0.1:1/"))
+
+        sink.add(self.document("consul"))
+
+        self.assertRaises(ConnectionError, sink.close)
+        self.assertEqual(1, sink.dropped)
+
+    def test_closeEmpty(self):
+        self.assertEqual(None, ElasticsearchBulkSink(self.config).close())
+        self.assertEqual([], self.server.requests)
+
+    def test_notifyElasticsearch(self):
+        obj = ConsulHealthStruct(Node="consul", CheckID="serfHealth",
+                                 Status="critical", Tags=["devops"])
+
+        status_code = plugins.notify_elasticsearch(obj, "serf\ncritical", self.config)
+
+        self.assertEqual(200, status_code)
+        (path, (action, document)), = self.server.requests
+        self.assertEqual("serf critical", json.loads(document)["Message"])
+        self.assertTrue(json.loads(action)["index"]["_index"].startswith("alerts-2"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+import unittest
+from consulalerting.Fingerprint import Fingerprint
+from consulalerting.ConsulHealthStruct import ConsulHealthStruct
+
+
+def checks(status="passing", output=""):
+    return [ConsulHealthStruct(Node="node-{n}".format(n=n),
+                               CheckID="service:redis",
+                               Name="Service 'redis' check",
+                               Status=status if n == 3 else "passing",
+                               Output=output,
+                               ServiceID="redis",
+                               ServiceName="redis") for n in xrange(10)]
+
+
+class FingerprintTests(unittest.TestCase):
+
+    def test_orderIndependent(self):
+        object_list = checks()
+
+        self.assertEqual(Fingerprint.of(object_list),
+                         Fingerprint.of(list(reversed(object_list))))
+
+    def test_outputIgnored(self):
+        self.assertEqual(Fingerprint.of(checks(output="took 10ms")),
+                         Fingerprint.of(checks(output="took 12ms")))
+
+    def test_statusChange(self):
+        self.assertNotEqual(Fingerprint.of(checks()),
+                            Fingerprint.of(checks(status="critical")))
+
+    def test_unicodeFields(self):
+        self.assertEqual(Fingerprint.of([ConsulHealthStruct(Node="consul", CheckID="serfHealth",
+                                                            Status="passing")]),
+                         Fingerprint.of([ConsulHealthStruct(Node=u"consul", CheckID=u"serfHealth",
+                                                            Status=u"passing")]))
+
+    def test_track(self):
+        fingerprint = Fingerprint()
+
+        object_list = list(fingerprint.track(checks()))
+
+        self.assertEqual(10, fingerprint.count)
+        self.assertEqual(Fingerprint.of(object_list), fingerprint.hexdigest())
+        self.assertEqual(32, len(fingerprint.hexdigest()))
+
+
+if __name__ == '__main__':
+    unittest.main()
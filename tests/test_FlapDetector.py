@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+import unittest
+import consulalerting.settings as settings
+from consulalerting.ConsulHealthStruct import ConsulHealthStruct
+from consulalerting.FlapDetector import FlapDetector, FLAPPING_STARTED, \
+    FLAPPING_STOPPED
+
+
+def check(status, history=None, flapping=None):
+    return ConsulHealthStruct(Node="foobar", CheckID="service:redis",
+                              Name="Service 'redis' check", ServiceID="redis",
+                              ServiceName="redis", Status=status,
+                              History=history, Flapping=flapping)
+
+
+class FlapDetectorTests(unittest.TestCase):
+
+    def detector(self, prior, now=1000):
+        return FlapDetector(prior, now=now, history_size=5, half_life=100,
+                            start_score=3, stop_score=1)
+
+    def test_recordsChange(self):
+        current = check(settings.CRITICAL_STATE)
+        detector = self.detector([check(settings.PASSING_STATE, [900])])
+
+        detector.update([current])
+
+        self.assertEqual([900, 1000], current.History)
+        self.assertFalse(current.Flapping)
+        self.assertEqual([current], detector.filter([current]))
+
+    def test_historyIsBounded(self):
+        current = check(settings.CRITICAL_STATE)
+        detector = self.detector([check(settings.PASSING_STATE, [1, 2, 3, 4, 5])],
+                                 now=100000)
+
+        detector.update([current])
+
+        self.assertEqual([2, 3, 4, 5, 100000], current.History)
+
+    def test_flappingStarted(self):
+        current = check(settings.CRITICAL_STATE)
+        detector = self.detector([check(settings.PASSING_STATE, [980, 985, 990])])
+
+        detector.update([current])
+        alert_list = detector.filter([current])
+
+        self.assertTrue(current.Flapping)
+        self.assertEqual([current], alert_list)
+        self.assertEqual(FLAPPING_STARTED, alert_list[0].Transition)
+
+    def test_flappingSuppressed(self):
+        current = check(settings.PASSING_STATE)
+        detector = self.detector([check(settings.CRITICAL_STATE,
+                                        [970, 980, 990], True)])
+
+        detector.update([current])
+
+        self.assertTrue(current.Flapping)
+        self.assertEqual([], detector.filter([current]))
+
+    def test_flappingStopped(self):
+        current = check(settings.PASSING_STATE)
+        detector = self.detector([check(settings.PASSING_STATE,
+                                        [570, 580, 590], True)])
+
+        detector.update([current])
+        alert_list = detector.filter(None)
+
+        self.assertFalse(current.Flapping)
+        self.assertEqual([current], alert_list)
+        self.assertEqual(FLAPPING_STOPPED, alert_list[0].Transition)
+
+    def test_disabled(self):
+        current = check(settings.CRITICAL_STATE)
+        detector = FlapDetector([check(settings.PASSING_STATE, [980, 990], True)],
+                                now=1000, start_score=0)
+
+        detector.update([current])
+
+        self.assertFalse(current.Flapping)
+        self.assertEqual([current], detector.filter([current]))
+
+
+if __name__ == '__main__':
+    unittest.main()
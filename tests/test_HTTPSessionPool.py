@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+import threading
+import unittest
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from consulalerting.HTTPSessionPool import HTTPSessionPool
+from mock import patch
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.getheader("Content-Length", 0)))
+        self.server.clients.add(self.client_address)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class HTTPSessionPoolTests(unittest.TestCase):
+
+    def test_sessionPerEndpoint(self):
+        pool = HTTPSessionPool(pool_maxsize=4)
+
+        slack = pool.session("https://slack.com/api/chat.postMessage")
+
+        self.assertTrue(slack is pool.session("https://SLACK.com/api/other"))
+        self.assertFalse(slack is pool.session("http://slack.com/api/chat.postMessage"))
+        self.assertFalse(slack is pool.session("https://api.mailgun.net/v2"))
+        self.assertEqual(4, slack.get_adapter("https://slack.com/")._pool_maxsize)
+
+    @patch("requests.Session.request")
+    def test_requestDefaultTimeout(self, request):
+        pool = HTTPSessionPool(timeout=3)
+
+        pool.post("https://slack.com/api/chat.postMessage", data={"text": "hi"})
+        pool.post("https://slack.com/api/chat.postMessage", timeout=10)
+
+        self.assertEqual([3, 10], [call[1]["timeout"]
+                                   for call in request.call_args_list])
+
+    def test_connectionReused(self):
+        server = HTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        server.clients = set()
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        pool = HTTPSessionPool()
+        url = "http://127.0.0.1:{p}/notify".format(p=server.server_port)
+
+        try:
+            for _ in xrange(5):
+                self.assertEqual(200, pool.post(url, data="alert").status_code)
+        finally:
+            pool.close()
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(1, len(server.clients))
+
+    def test_close(self):
+        pool = HTTPSessionPool()
+        session = pool.session("https://events.pagerduty.com/")
+
+        pool.close()
+
+        self.assertEqual({}, pool.sessions)
+        self.assertFalse(session is pool.session("https://events.pagerduty.com/"))
+
+
+if __name__ == '__main__':
+    unittest.main()
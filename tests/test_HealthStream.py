@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+import unittest
+import json as json
+from StringIO import StringIO
+from consulalerting.HealthStream import HealthStream
+
+
+HEALTH = [{"Node": "node-{n}".format(n=n),
+           "CheckID": "service:redis",
+           "Name": "Service 'redis' check",
+           "Status": "passing",
+           "Output": "x" * n,
+           "ServiceID": "redis",
+           "ServiceName": "redis",
+           "CreateIndex": n,
+           "Definition": {}} for n in xrange(40)]
+
+
+class HealthStreamTests(unittest.TestCase):
+
+    def test_iterChunks(self):
+        payload = json.dumps(HEALTH, indent=2)
+
+        for chunk_size in (1, 7, 64, 1024 * 1024):
+            stream = HealthStream(StringIO(payload), chunk_size)
+            object_list = list(stream)
+
+            self.assertEqual(40, len(object_list))
+            self.assertEqual("node-39", object_list[-1].Node)
+            self.assertEqual("x" * 12, object_list[12].Output)
+            self.assertEqual(None, object_list[0].CreateIndex)
+
+    def test_iterFiltered(self):
+        stream = HealthStream(StringIO(json.dumps(HEALTH)), 16)
+
+        object_list = [obj for obj in stream if obj.Node.endswith("7")]
+
+        self.assertEqual(["node-7", "node-17", "node-27", "node-37"],
+                         [obj.Node for obj in object_list])
+        self.assertEqual(40, stream.count)
+
+    def test_iterEmpty(self):
+        self.assertEqual([], list(HealthStream(StringIO(" [ ]\n"))))
+
+    def test_iterInvalid(self):
+        for payload in ("", "{}", "[1, 2]", '[{"Node": "a"}', '[{"Node": "a"}}',
+                        '[{"Node": "a"}] []', "[{\"Node\": "):
+            self.assertRaises(ValueError, list, HealthStream(StringIO(payload), 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
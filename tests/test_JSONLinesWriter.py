@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import json as json
+from consulalerting import plugins
+from consulalerting.JSONLinesWriter import JSONLinesWriter
+from consulalerting.ConsulHealthStruct import ConsulHealthStruct
+
+
+class JSONLinesWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "alerts.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, path=None):
+        with open(path or self.path) as logfile:
+            return [json.loads(line) for line in logfile]
+
+    def test_writeBuffered(self):
+        writer = JSONLinesWriter(self.path, max_bytes=0, rotate_seconds=0)
+
+        writer.write({"n": 1})
+        writer.write({"n": 2})
+        self.assertFalse(os.path.exists(self.path))
+
+        writer.close()
+        self.assertEqual([{"n": 1}, {"n": 2}], self.read())
+
+    def test_writeFlushesFullBuffer(self):
+        writer = JSONLinesWriter(self.path, buffer_bytes=20)
+
+        writer.write({"n": "a" * 20})
+
+        self.assertEqual(1, len(self.read()))
+        self.assertEqual([], writer.lines)
+
+    def test_rotateSize(self):
+        with open(self.path, "w") as logfile:
+            logfile.write('{"old": true}\n')
+        writer = JSONLinesWriter(self.path, max_bytes=15, rotate_seconds=0,
+                                 backup_count=2)
+
+        writer.write({"n": 1})
+        writer.close()
+        writer.write({"n": 2})
+        writer.close()
+
+        self.assertEqual([{"n": 2}], self.read())
+        self.assertEqual([{"n": 1}], self.read(self.path + ".1"))
+        self.assertEqual([{"old": True}], self.read(self.path + ".2"))
+
+    def test_rotateTime(self):
+        with open(self.path, "w") as logfile:
+            logfile.write('{"old": true}\n')
+        yesterday = time.time() - 86400
+        os.utime(self.path, (yesterday, yesterday))
+        writer = JSONLinesWriter(self.path, max_bytes=0, rotate_seconds=3600)
+
+        writer.write({"n": 1})
+        writer.close()
+
+        self.assertEqual([{"n": 1}], self.read())
+        self.assertEqual([{"old": True}], self.read(self.path + ".1"))
+
+    def test_concurrentWriters(self):
+        writers = [JSONLinesWriter(self.path, buffer_bytes=512) for _ in xrange(4)]
+
+        def write(writer):
+            for n in xrange(500):
+                writer.write({"n": n, "padding": "x" * 64})
+            writer.close()
+
+        threads = [threading.Thread(target=write, args=(writer,)) for writer in writers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(2000, len(self.read()))
+
+    def test_notifyElasticsearchlogWriter(self):
+        writer = JSONLinesWriter(self.path)
+        obj = ConsulHealthStruct(Node="consul", CheckID="serfHealth",
+                                 Status="critical", Tags=["devops"])
+
+        plugins.notify_elasticsearchlog(obj, "serf\ncritical",
+                                        {"logpath": self.path}, writer)
+        writer.close()
+
+        line, = self.read()
+        self.assertEqual("serf critical", line["Message"])
+        self.assertEqual("consul", line["Node"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+import smtplib
+import unittest
+from mock import patch, call, ANY
+from consulalerting import plugins
+from consulalerting.MailTransport import MailTransport
+
+
+CONSUL_EMAIL = {"mail_domain_address": "smtp.example.com",
+                "username": "consul",
+                "password": "secret",
+                "starttls": True,
+                "from": "consul@example.com",
+                "teams": {"devops": ["ops@example.com", "oncall@example.com"],
+                          "dev": ["dev@example.com"]}}
+
+
+class MailTransportTests(unittest.TestCase):
+
+    @patch("consulalerting.MailTransport.smtplib.SMTP")
+    def test_sendmailReusesConnection(self, smtp):
+        transport = MailTransport(CONSUL_EMAIL)
+
+        transport.sendmail("consul@example.com", ["ops@example.com"], "one")
+        transport.sendmail("consul@example.com", ["dev@example.com"], "two")
+        transport.close()
+
+        self.assertEqual(1, smtp.call_count)
+        server = smtp.return_value
+        server.starttls.assert_called_once_with()
+        server.login.assert_called_once_with("consul", "secret")
+        self.assertEqual(2, server.sendmail.call_count)
+        server.quit.assert_called_once_with()
+
+    @patch("consulalerting.MailTransport.smtplib.SMTP")
+    def test_sendmailReconnects(self, smtp):
+        smtp.return_value.sendmail.side_effect = [
+            None, smtplib.SMTPServerDisconnected("gone"), None]
+        transport = MailTransport(CONSUL_EMAIL)
+
+        transport.sendmail("consul@example.com", ["ops@example.com"], "one")
+        transport.sendmail("consul@example.com", ["ops@example.com"], "two")
+
+        self.assertEqual(2, smtp.call_count)
+        self.assertEqual(3, smtp.return_value.sendmail.call_count)
+
+    @patch("consulalerting.MailTransport.smtplib.SMTP")
+    def test_connectWithoutAuth(self, smtp):
+        transport = MailTransport({"mail_domain_address": "smtp.example.com",
+                                   "username": "", "password": ""})
+
+        transport.sendmail("consul@example.com", ["ops@example.com"], "one")
+
+        self.assertFalse(smtp.return_value.starttls.called)
+        self.assertFalse(smtp.return_value.login.called)
+
+    def test_closeUnused(self):
+        MailTransport(CONSUL_EMAIL).close()
+
+    @patch("consulalerting.MailTransport.smtplib.SMTP")
+    def test_notifyEmailSharedTransport(self, smtp):
+        transport = MailTransport(CONSUL_EMAIL)
+
+        plugins.notify_email("redis critical", ["devops", "dev"], CONSUL_EMAIL, transport)
+        plugins.notify_email("redis passing", ["devops"], CONSUL_EMAIL, transport)
+
+        self.assertEqual(1, smtp.call_count)
+        self.assertEqual(3, smtp.return_value.sendmail.call_count)
+        self.assertTrue(call("consul@example.com",
+                             ["ops@example.com", "oncall@example.com"], ANY)
+                        in smtp.return_value.sendmail.call_args_list)
+        self.assertFalse(smtp.return_value.quit.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+import unittest
+import urllib2
+from consulalerting.Metrics import Registry, Counter, Histogram, serve
+
+
+class MetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+        self.deliveries = self.registry.register(Counter(
+            "deliveries_total", "Deliveries.", ("plugin", "status")))
+        self.latency = self.registry.register(Histogram(
+            "latency_seconds", "Latency.", buckets=(0.1, 1)))
+
+    def test_counter(self):
+        self.deliveries.inc(plugin="slack", status="ok")
+        self.deliveries.inc(2, plugin="slack", status="ok")
+        self.deliveries.inc(plugin='say "hi"', status="failed")
+
+        lines = self.deliveries.render()
+
+        self.assertEqual(3, self.deliveries.get(plugin="slack", status="ok"))
+        self.assertEqual(["# HELP deliveries_total Deliveries.",
+                          "# TYPE deliveries_total counter",
+                          'deliveries_total{plugin="say \\"hi\\"",status="failed"} 1.0',
+                          'deliveries_total{plugin="slack",status="ok"} 3.0'], lines)
+
+    def test_histogram(self):
+        self.latency.observe(0.05)
+        self.latency.observe(0.5)
+        self.latency.observe(5)
+
+        lines = self.latency.render()
+
+        self.assertEqual(['latency_seconds_bucket{le="0.1"} 1.0',
+                          'latency_seconds_bucket{le="1.0"} 2.0',
+                          'latency_seconds_bucket{le="+Inf"} 3.0',
+                          'latency_seconds_sum 5.55',
+                          'latency_seconds_count 3.0'], lines[2:])
+
+    def test_mergeSkipsOtherBuckets(self):
+        self.latency.observe(0.5)
+        self.latency.merge([[[], [1, 1, 1, 1, 1, 9.0]], [[], [1, 1, 1, 2.0]]])
+
+        self.assertEqual((2, 2.5), self.latency.get())
+
+    def test_persist(self):
+        directory = tempfile.mkdtemp()
+        state_path = os.path.join(directory, "metrics.json")
+        textfile_path = os.path.join(directory, "consulalerting.prom")
+
+        try:
+            # two watch invocations
+            for _ in xrange(2):
+                self.deliveries.inc(plugin="slack", status="ok")
+                self.latency.observe(0.5)
+                self.assertTrue(self.registry.persist(state_path, textfile_path))
+
+            self.assertEqual(0, self.deliveries.get(plugin="slack", status="ok"))
+
+            with open(textfile_path) as textfile:
+                text = textfile.read()
+
+            self.assertTrue('deliveries_total{plugin="slack",status="ok"} 2.0\n' in text)
+            self.assertTrue("latency_seconds_count 2.0\n" in text)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_persistStateNextToTextfile(self):
+        directory = tempfile.mkdtemp()
+        textfile_path = os.path.join(directory, "consulalerting.prom")
+
+        try:
+            self.deliveries.inc(plugin="slack", status="ok")
+            self.assertTrue(self.registry.persist(textfile_path=textfile_path))
+
+            self.assertEqual(["consulalerting.prom", "consulalerting.prom.state",
+                              "consulalerting.prom.state.lock"],
+                             sorted(os.listdir(directory)))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_serve(self):
+        self.deliveries.inc(plugin="slack", status="ok")
+        server = serve(self.registry, "127.0.0.1", 0)
+
+        try:
+            response = urllib2.urlopen("http://127.0.0.1:{p}/metrics".format(
+                p=server.server_address[1]))
+
+            self.assertTrue(response.info()["Content-Type"].startswith(
+                "text/plain; version=0.0.4"))
+            self.assertEqual(self.registry.render(), response.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+import time
+import threading
+import unittest
+from consulalerting.NotificationDispatcher import NotificationDispatcher, Delivery
+
+
+class NotificationDispatcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def target(self, value, delay=0.01):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        time.sleep(delay)
+
+        with self.lock:
+            self.in_flight -= 1
+
+        return value
+
+    def test_RunBounded(self):
+        deliveries = [Delivery("slack", self.target, (n,)) for n in xrange(20)]
+
+        results = NotificationDispatcher(workers=3, deadline=10).Run(deliveries)
+
+        self.assertEqual(range(20), [delivery.result for delivery in results])
+        self.assertTrue(all(delivery.ok for delivery in results))
+        self.assertTrue(self.max_in_flight <= 3)
+
+    def test_RunDeadline(self):
+        release = threading.Event()
+        deliveries = [Delivery("slack", release.wait, (5,)) for n in xrange(4)]
+        dispatcher = NotificationDispatcher(workers=1, deadline=0.1)
+
+        results = dispatcher.Run(deliveries)
+
+        self.assertTrue(results[0].running)
+        self.assertFalse(results[-1].completed)
+        self.assertFalse(results[-1].running)
+        self.assertFalse(results[-1].ok)
+
+        # the running delivery returns, its worker exits without the rest
+        release.set()
+        self.assertTrue(results[0].done.wait(5))
+        self.assertFalse(results[1].started)
+
+    def test_RunError(self):
+        def fail():
+            raise ValueError("boom")
+
+        delivery, = NotificationDispatcher(workers=2, deadline=10).Run(
+            [Delivery("pagerduty", fail, ())])
+
+        self.assertTrue(delivery.completed)
+        self.assertFalse(delivery.ok)
+        self.assertTrue(isinstance(delivery.error, ValueError))
+
+    def test_RunEmpty(self):
+        self.assertEqual([], NotificationDispatcher().Run([]))
+
+
+if __name__ == '__main__':
+    unittest.main()
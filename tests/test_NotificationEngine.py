@@ -1,10 +1,16 @@
 #!/usr/bin/env python
+import threading
 import unittest
 import json as json
 import consulalerting.settings as settings
 import consulalerting.utilities as utilities
 from consulalerting import NotificationEngine
 from consulalerting import ConsulHealthStruct
+from consulalerting.AlertingConfig import AlertingConfig
+from consulalerting.MailTransport import MailTransport
+from consulalerting.NotificationDispatcher import Delivery
+from consulalerting.RateLimiter import RateLimiter
+from mock import Mock
 
 
 KV_ALERTING_AVAILABLE_PLUGINS = ["hipchat", "slack", "mailgun"]
@@ -76,6 +82,151 @@ class NotificationEngineTests(unittest.TestCase):
         self.assertFalse(influxdb)
         self.assertFalse(elasticsearchlog)
 
+    def test_loadPluginsFromConfig(self):
+        config = AlertingConfig({
+            settings.KV_ALERTING_AVAILABLE_PLUGINS: json.dumps(KV_ALERTING_AVAILABLE_PLUGINS),
+            settings.KV_ALERTING_NOTIFY_HIPCHAT: json.dumps({"rooms": {"DevOps": 1}}),
+            settings.KV_ALERTING_NOTIFY_MAILGUN: json.dumps({"teams": {}})})
+        ne = NotificationEngine.NotificationEngine(
+            CONSUL_HEALTH_STRUCT_ALERT_LIST, settings.consul, config)
+        ne.get_available_plugins()
+        ne.unique_tags = set(["hipchat", "mailgun"])
+
+        hipchat, slack, mailgun, email, pagerduty, influxdb, elasticsearchlog = ne.load_plugins_from_tags()
+        self.assertEqual({"rooms": {"devops": 1}}, hipchat)
+        self.assertEqual({"teams": {}}, mailgun)
+        self.assertFalse(slack)
+
+    def test_runNotifiersDeliveries(self):
+        self.ne.hipchat = {"rooms": {"devops": 1}}
+        self.ne.mailgun = {"teams": {"devops": ["guy@example.com"]}}
+
+        deliveries = self.ne.run_notifiers(CONSUL_HEALTH_STRUCT_ALERT_LIST[0])
+
+        self.assertEqual(["hipchat", "mailgun"],
+                         [delivery.plugin for delivery in deliveries])
+        self.assertEqual(set(["devops"]), deliveries[0].args[2])
+
+    def test_runNotifiersSkipsDigest(self):
+        self.ne.hipchat = {"rooms": {"devops": 1}, "digest": True}
+        self.ne.mailgun = {"teams": {"devops": ["guy@example.com"]}}
+
+        deliveries = self.ne.run_notifiers(CONSUL_HEALTH_STRUCT_ALERT_LIST[0])
+
+        self.assertEqual(["mailgun"], [delivery.plugin for delivery in deliveries])
+
+    def test_runNotifiersMailTransport(self):
+        alert = ConsulHealthStruct.ConsulHealthStruct(
+            Node="consul", CheckID="serfHealth", Status="critical",
+            Tags=["email", "devops"])
+        self.ne.email = {"teams": {"devops": ["guy@example.com"]}}
+        self.ne.mail_transport = MailTransport(self.ne.email)
+
+        delivery, = self.ne.run_notifiers(alert)
+
+        self.assertTrue(delivery.args[-1] is self.ne.mail_transport)
+
+    def test_closeTransportsWaitsForRunning(self):
+        self.ne.mail_transport = Mock()
+        delivery = Delivery("email", lambda: None, ())
+        closer = threading.Thread(target=self.ne.closeTransports,
+                                  args=([delivery],))
+        closer.start()
+
+        closer.join(0.1)
+        self.assertFalse(self.ne.mail_transport.close.called)
+
+        delivery.run()
+        closer.join(5)
+        self.assertTrue(self.ne.mail_transport.close.called)
+
+    def test_digestNotifiers(self):
+        alerts = [ConsulHealthStruct.ConsulHealthStruct(
+            Node="switch-{n}".format(n=n), CheckID="serfHealth",
+            Status="warning" if n else "critical",
+            Tags=["slack", "hipchat", "devops", "qa" if n % 2 else "dev"])
+            for n in xrange(6)]
+        ne = NotificationEngine.NotificationEngine(alerts, settings.consul)
+        ne.slack = {"rooms": {"devops": "#devops", "qa": "#qa"}, "digest": True}
+        ne.hipchat = {"rooms": {"devops": 1}, "digest": True}
+
+        deliveries = ne.digest_notifiers()
+
+        self.assertEqual([("hipchat", set(["devops"])),
+                          ("slack", set(["devops"])),
+                          ("slack", set(["qa"]))],
+                         [(delivery.plugin, delivery.args[-2]) for delivery in deliveries])
+        self.assertEqual("critical", deliveries[0].args[0].Status)
+        self.assertEqual(7, len(deliveries[1].args[0].splitlines()))
+        self.assertTrue(deliveries[1].args[0].startswith("6 Consul alerts:"))
+        self.assertTrue("switch-3" in deliveries[2].args[0])
+
+    def test_digestNotifiersMaxAlerts(self):
+        alerts = [ConsulHealthStruct.ConsulHealthStruct(
+            Node="switch-{n}".format(n=n), CheckID="serfHealth",
+            Status="critical", Tags=["mailgun", "devops"]) for n in xrange(5)]
+        ne = NotificationEngine.NotificationEngine(alerts, settings.consul)
+        ne.mailgun = {"teams": {"devops": ["guy@example.com"]},
+                      "digest": True, "digest_max_alerts": 2}
+
+        deliveries = ne.digest_notifiers()
+
+        self.assertEqual(3, len(deliveries))
+        self.assertTrue(deliveries[2].args[0].startswith("5 Consul alerts (part 3 of 3):"))
+        self.assertEqual(["- ", "- "],
+                         [line[:2] for line in deliveries[0].args[0].splitlines()[1:]])
+
+    def test_rateLimitSummary(self):
+        alerts = [ConsulHealthStruct.ConsulHealthStruct(
+            Node="switch-{n}".format(n=n), CheckID="serfHealth",
+            Status="warning" if n else "critical",
+            Tags=["pagerduty", "devops"]) for n in xrange(4)]
+        ne = NotificationEngine.NotificationEngine(
+            alerts, settings.consul, rate_limiter=RateLimiter())
+        ne.pagerduty = {"teams": {"devops": "key"}, "destination_rate_limit": 1}
+        ne.rate_limited = {}
+
+        deliveries = [delivery for obj in alerts
+                      for delivery in ne.run_notifiers(obj)]
+        summary, = ne.summary_notifiers()
+
+        self.assertEqual(["switch-0"], [d.args[0].Node for d in deliveries])
+        self.assertEqual("pagerduty", summary.plugin)
+        self.assertEqual(set(["devops"]), summary.args[2])
+        self.assertTrue(summary.args[1].startswith(
+            "3 Consul alerts held back by rate limiting:"))
+        self.assertEqual("warning", summary.args[0].Status)
+        self.assertEqual(NotificationEngine.PAGERDUTY_SUMMARY_INCIDENT_KEY,
+                         summary.args[4])
+
+    def test_rateLimitPagerdutyResolve(self):
+        alerts = [ConsulHealthStruct.ConsulHealthStruct(
+            Node="switch-{n}".format(n=n), CheckID="serfHealth",
+            Status="passing", Tags=["pagerduty", "devops"]) for n in xrange(3)]
+        ne = NotificationEngine.NotificationEngine(
+            alerts, settings.consul, rate_limiter=RateLimiter())
+        ne.pagerduty = {"teams": {"devops": "key"}, "destination_rate_limit": 1}
+        ne.rate_limited = {}
+
+        deliveries = [delivery for obj in alerts
+                      for delivery in ne.run_notifiers(obj)]
+
+        self.assertEqual(3, len(deliveries))
+        self.assertEqual([], ne.summary_notifiers())
+
+    def test_influxdbNotifiers(self):
+        alerts = [ConsulHealthStruct.ConsulHealthStruct(
+            Node="switch-{n}".format(n=n), CheckID="serfHealth",
+            Status="critical", Tags=["influxdb", "devops"]) for n in xrange(3)]
+        ne = NotificationEngine.NotificationEngine(alerts, settings.consul)
+        ne.influxdb = {"databases": {"devops": "ops"}}
+
+        delivery, = ne.influxdb_notifiers()
+
+        self.assertEqual("influxdb", delivery.plugin)
+        self.assertEqual(3, len(delivery.args[0]))
+        self.assertEqual([], ne.run_notifiers(alerts[0]))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+import time
+import unittest
+import json as json
+import consulalerting.settings as settings
+import consulalerting.utilities as utilities
+import consulalerting.PriorStateStore as PriorStateStore
+from mock import MagicMock, patch
+
+
+CURRENT_STATE = json.loads("""[
+{
+"Node": "foobar",
+"CheckID": "serfHealth",
+"Name": "Serf Health Status",
+"Status": "passing",
+"Notes": "",
+"Output": "Agent alive and reachable",
+"ServiceID": "",
+"ServiceName": ""
+},
+{
+"Node": "foobar",
+"CheckID": "service:redis",
+"Name": "Service 'redis' check",
+"Status": "critical",
+"Notes": "",
+"Output": "Usage: check_redis.py [options]",
+"ServiceID": "redis",
+"ServiceName": "redis"
+}
+]""")
+
+
+class PriorStateStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.obj_list = utilities.createConsulHealthList(CURRENT_STATE)
+
+    def test_encodeCompact(self):
+        prior = json.loads(PriorStateStore.encode(self.obj_list, 2))
+
+        self.assertEqual(2, prior["Version"])
+        self.assertEqual(["foobar", "service:redis", "Service 'redis' check",
+                          "redis", "redis", "critical"], prior["Checks"][1])
+        self.assertFalse("Agent alive" in PriorStateStore.encode(self.obj_list, 2))
+
+    def test_decodeRoundTrip(self):
+        prior = PriorStateStore.decode(PriorStateStore.encode(self.obj_list, 2))
+        prior_obj_list = utilities.createConsulHealthList(prior)
+
+        self.assertEqual(self.obj_list, prior_obj_list)
+        self.assertEqual(["passing", "critical"],
+                         [obj.Status for obj in prior_obj_list])
+
+    def test_encodeHistoryRoundTrip(self):
+        self.obj_list[1].History = [100, 200]
+        self.obj_list[1].Flapping = True
+
+        prior = PriorStateStore.decode(PriorStateStore.encode(self.obj_list, 3))
+        prior_obj_list = utilities.createConsulHealthList(prior)
+
+        self.assertEqual([None, [100, 200]],
+                         [obj.History for obj in prior_obj_list])
+        self.assertEqual([None, True], [obj.Flapping for obj in prior_obj_list])
+
+    def test_decodeStateFingerprint(self):
+        checks, fingerprint = PriorStateStore.decodeState(
+            PriorStateStore.encode(self.obj_list, 2, "abc"))
+
+        self.assertEqual("abc", fingerprint)
+        self.assertEqual(self.obj_list, utilities.createConsulHealthList(checks))
+        self.assertEqual(None, PriorStateStore.decodeState(
+            PriorStateStore.encode(self.obj_list, 1, "abc"))[1])
+
+    def test_decodeVersion1(self):
+        self.assertEqual(CURRENT_STATE,
+                         PriorStateStore.decode(json.dumps(CURRENT_STATE)))
+        self.assertEqual(CURRENT_STATE,
+                         PriorStateStore.decode(PriorStateStore.encode(self.obj_list, 1)))
+
+    def test_decodeUnknownVersion(self):
+        self.assertRaises(ValueError, PriorStateStore.decode,
+                          json.dumps({"Version": 99}))
+
+    def test_kvStoreWrite(self):
+        consul = MagicMock()
+        size = PriorStateStore.KVPriorStateStore(consul).write(self.obj_list)
+
+        value = consul.kv.__setitem__.call_args[0][1]
+        consul.kv.__setitem__.assert_called_with(settings.KV_PRIOR_STATE, value)
+        self.assertEqual(len(value), size)
+
+    def test_readPrefersNewest(self):
+        values = {settings.KV_PRIOR_STATE: "legacy",
+                  settings.KV_PRIOR_STATE_MANIFEST: "{}"}
+
+        self.assertEqual("legacy", PriorStateStore.read(
+            values, {settings.KV_PRIOR_STATE: 10,
+                     settings.KV_PRIOR_STATE_MANIFEST: 5}))
+        self.assertEqual(None, PriorStateStore.read({}))
+
+
+class ChunkedPriorStateStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.obj_list = utilities.createConsulHealthList(CURRENT_STATE * 50)
+        self.chunk_size = settings.PRIOR_STATE_CHUNK_SIZE
+        settings.PRIOR_STATE_CHUNK_SIZE = 64
+        self.written = {}
+
+    def tearDown(self):
+        settings.PRIOR_STATE_CHUNK_SIZE = self.chunk_size
+
+    def putRawKey(self, key, value):
+        self.written[key] = value
+        return True
+
+    def write(self, prior_keys=(), prior_manifest=None):
+        store = PriorStateStore.ChunkedPriorStateStore(
+            MagicMock(), prior_keys, prior_manifest)
+
+        with patch("consulalerting.utilities.putRawKey", self.putRawKey):
+            with patch("consulalerting.utilities.deleteKey") as delete_key:
+                store.write(self.obj_list)
+
+        return delete_key
+
+    def test_writeReadRoundTrip(self):
+        self.write()
+
+        manifest = json.loads(self.written[settings.KV_PRIOR_STATE_MANIFEST])
+        self.assertTrue(manifest["Chunks"] > 1)
+        self.assertEqual(manifest["Chunks"] + 1, len(self.written))
+
+        prior = PriorStateStore.decode(PriorStateStore.read(self.written))
+        self.assertEqual(self.obj_list, utilities.createConsulHealthList(prior))
+
+    def test_assembleMissingChunk(self):
+        self.write()
+        manifest = json.loads(self.written[settings.KV_PRIOR_STATE_MANIFEST])
+        del self.written[PriorStateStore.ChunkedPriorStateStore.chunkKey(
+            manifest["Generation"], 0)]
+
+        self.assertRaises(ValueError, PriorStateStore.read, self.written)
+
+    def test_cleanup(self):
+        orphan = "{g:x}".format(g=1)
+        concurrent = "{g:x}".format(g=int(time.time() * 1000))
+        prior_keys = [settings.KV_PRIOR_STATE,
+                      settings.KV_PRIOR_STATE_MANIFEST,
+                      "{p}/abc/0".format(p=settings.KV_PRIOR_STATE),
+                      "{p}/{g}/0".format(p=settings.KV_PRIOR_STATE, g=orphan),
+                      "{p}/{g}/0".format(p=settings.KV_PRIOR_STATE, g=concurrent)]
+
+        delete_key = self.write(prior_keys, {"Generation": "abc"})
+
+        delete_key.assert_any_call(settings.KV_PRIOR_STATE, recurse=False)
+        delete_key.assert_any_call("{p}/abc/".format(p=settings.KV_PRIOR_STATE),
+                                   recurse=True)
+        delete_key.assert_any_call("{p}/{g}/".format(p=settings.KV_PRIOR_STATE,
+                                                     g=orphan), recurse=True)
+        self.assertEqual(3, delete_key.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+import unittest
+import consulalerting.settings as settings
+from consulalerting.RateLimiter import RateLimiter, TokenBucket
+
+
+class RateLimiterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = RateLimiter()
+
+    def test_unlimited(self):
+        for _ in xrange(100):
+            self.assertTrue(self.limiter.allow("slack", "#devops", {}, now=0))
+
+        self.assertEqual({}, self.limiter.buckets)
+
+    def test_destinationLimit(self):
+        config = {"destination_rate_limit": 2}
+
+        self.assertTrue(self.limiter.allow("slack", "#devops", config, now=0))
+        self.assertTrue(self.limiter.allow("slack", "#devops", config, now=0))
+        self.assertFalse(self.limiter.allow("slack", "#devops", config, now=0))
+        self.assertTrue(self.limiter.allow("slack", "#qa", config, now=0))
+
+    def test_pluginLimit(self):
+        config = {"rate_limit": 2, "destination_rate_limit": 10}
+
+        self.assertTrue(self.limiter.allow("slack", "#devops", config, now=0))
+        self.assertTrue(self.limiter.allow("slack", "#qa", config, now=0))
+        self.assertFalse(self.limiter.allow("slack", "#ops", config, now=0))
+        # an empty plugin bucket takes no destination token
+        self.assertEqual(10, self.limiter.buckets[("slack", "#ops")].tokens)
+
+    def test_refill(self):
+        config = {"destination_rate_limit": 6}
+
+        for _ in xrange(6):
+            self.limiter.allow("slack", "#devops", config, now=0)
+
+        self.assertFalse(self.limiter.allow("slack", "#devops", config, now=5))
+        self.assertTrue(self.limiter.allow("slack", "#devops", config, now=10))
+        self.assertFalse(self.limiter.allow("slack", "#devops", config, now=10))
+
+    def test_settingsDefault(self):
+        limit = settings.NOTIFY_RATE_LIMIT
+        settings.NOTIFY_RATE_LIMIT = 1
+
+        try:
+            self.assertTrue(self.limiter.allow("email", "devops", {}, now=0))
+            self.assertFalse(self.limiter.allow("email", "qa", {}, now=0))
+        finally:
+            settings.NOTIFY_RATE_LIMIT = limit
+
+    def test_bucketCapacity(self):
+        bucket = TokenBucket(3, now=0)
+        bucket.refill(3600)
+
+        self.assertEqual(3, bucket.tokens)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+import unittest
+import consulalerting.settings as settings
+from consulalerting.RetryPolicy import RetryPolicy, RetryBudget, retryAfter
+
+
+class RetryPolicyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.budget = RetryBudget(10)
+
+    def test_attempts(self):
+        retry = RetryPolicy(attempts=3, budget=self.budget)
+
+        self.assertTrue(retry.again(0))
+        self.assertTrue(retry.again(1))
+        self.assertFalse(retry.again(2))
+        self.assertEqual(8, self.budget.remaining)
+
+    def test_budget(self):
+        retry = RetryPolicy(attempts=10, budget=RetryBudget(1))
+
+        self.assertTrue(retry.again(0))
+        self.assertFalse(retry.again(1))
+
+    def test_retryable(self):
+        retry = RetryPolicy(budget=self.budget)
+
+        for status_code in (429, 500, 503):
+            self.assertTrue(retry.retryable(status_code))
+
+        for status_code in (200, 400, 401, 404):
+            self.assertFalse(retry.retryable(status_code))
+
+    def test_delay(self):
+        retry = RetryPolicy(base_delay=1, max_delay=5, budget=self.budget)
+
+        for attempt in xrange(6):
+            delay = retry.delay(attempt)
+            self.assertTrue(0 <= delay <= min(5, 2 ** attempt))
+
+        self.assertEqual(3, retry.delay(0, retry_after=3))
+        self.assertEqual(5, retry.delay(0, retry_after=60))
+
+    def test_fromConfig(self):
+        retry = RetryPolicy.fromConfig({"retry": {"attempts": 5,
+                                                  "statuses": [418]}})
+
+        self.assertEqual(5, retry.attempts)
+        self.assertEqual(frozenset([418]), retry.statuses)
+        self.assertEqual(settings.NOTIFY_RETRY_MAX_DELAY, retry.max_delay)
+        self.assertEqual(settings.NOTIFY_RETRY_ATTEMPTS,
+                         RetryPolicy.fromConfig(None).attempts)
+
+    def test_retryAfter(self):
+        self.assertEqual(2, retryAfter({"Retry-After": "2"}))
+        self.assertEqual(None, retryAfter({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}))
+        self.assertEqual(None, retryAfter({}))
+
+
+if __name__ == '__main__':
+    unittest.main()
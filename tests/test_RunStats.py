@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+import unittest
+import json as json
+from consulalerting.RunStats import RunStats
+
+
+class RunStatsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = RunStats()
+
+    def test_phase(self):
+        with self.stats.phase("health"):
+            pass
+
+        try:
+            with self.stats.phase("lock"):
+                raise ValueError
+        except ValueError:
+            pass
+
+        self.assertEqual(set(["health", "lock"]), set(self.stats.timings))
+
+    def test_count(self):
+        self.stats.count("Alerts", 3)
+        self.stats.count("Alerts")
+
+        self.assertEqual({"Alerts": 4}, self.stats.summary()["Counts"])
+
+    def test_logLine(self):
+        summary = {"Elapsed": 1.5, "Counts": {"Checks": 10, "Alerts": 2},
+                   "Phases": {"notify": 1, "health": 0.25, "custom": 0.1}}
+
+        self.assertEqual("Message=Run summary Elapsed=1.500 health=0.250 "
+                         "notify=1.000 custom=0.100 Alerts=2 Checks=10",
+                         self.stats.logLine(summary))
+
+    def test_emit(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "stats.json")
+
+        try:
+            self.stats.count("Checks", 10)
+            summary = self.stats.emit(path)
+
+            with open(path) as stats_file:
+                self.assertEqual(json.loads(json.dumps(summary)),
+                                 json.load(stats_file))
+            self.assertEqual([path], [os.path.join(directory, name)
+                                      for name in os.listdir(directory)])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_writeDoesNotFollowSymlinks(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "stats.json")
+        target = os.path.join(directory, "target")
+        os.symlink(target, "{p}.{pid}.tmp".format(p=path, pid=os.getpid()))
+
+        try:
+            self.assertTrue(self.stats.write(self.stats.summary(), path))
+            self.assertFalse(os.path.exists(target))
+            self.assertFalse(os.path.islink(path))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
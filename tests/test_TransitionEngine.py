@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+import unittest
+import consulalerting.settings as settings
+import consulalerting.utilities as utilities
+import consulalerting.TransitionEngine as TransitionEngine
+
+
+def health(status, check="service:redis", node="foobar"):
+    return {"Node": node,
+            "CheckID": check,
+            "Name": "Service 'redis' check",
+            "Status": status,
+            "Notes": "",
+            "Output": "",
+            "ServiceID": "redis",
+            "ServiceName": "redis"}
+
+
+class TransitionEngineTests(unittest.TestCase):
+
+    def diff(self, current, prior):
+        engine = TransitionEngine.TransitionEngine(
+            utilities.createConsulHealthList(prior))
+        return engine.diff(utilities.createConsulHealthList(current))
+
+    def test_isAlerting(self):
+        self.assertTrue(TransitionEngine.isAlerting("critical", "passing"))
+        self.assertTrue(TransitionEngine.isAlerting("warning", "passing"))
+        self.assertTrue(TransitionEngine.isAlerting("passing", "warning"))
+        self.assertTrue(TransitionEngine.isAlerting("critical", "warning"))
+        self.assertTrue(TransitionEngine.isAlerting(None, "critical"))
+        self.assertTrue(TransitionEngine.isAlerting("unknown", "unknown"))
+        self.assertFalse(TransitionEngine.isAlerting(None, "passing"))
+        self.assertFalse(TransitionEngine.isAlerting("unknown", "passing"))
+        self.assertFalse(TransitionEngine.isAlerting("warning", "warning"))
+        self.assertFalse(TransitionEngine.isAlerting("critical", "critical"))
+
+    def test_diffKinds(self):
+        transitions = self.diff([health("passing"), health("warning", check="disk")],
+                                [health("critical")])
+
+        self.assertEqual(["critical->passing", "new warning"],
+                         [t.Kind for t in transitions])
+
+    def test_diffAnnotatesObjects(self):
+        transitions = self.diff([health("passing")], [health("critical")])
+        obj = transitions[0].obj
+
+        self.assertEqual(settings.CRITICAL_STATE, obj.PriorStatus)
+        self.assertEqual("critical->passing", obj.Transition)
+
+    def test_diffNoChanges(self):
+        self.assertEqual([], self.diff([health("critical")], [health("critical")]))
+
+    def test_diffIdentityIgnoresOutput(self):
+        prior = health("warning")
+        prior["Output"] = "load 10"
+        current = health("warning")
+        current["Output"] = "load 12"
+
+        self.assertEqual([], self.diff([current], [prior]))
+
+
+if __name__ == '__main__':
+    unittest.main()
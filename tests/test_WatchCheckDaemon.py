@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+import unittest
+import responses
+import json as json
+import consulalerting.settings as settings
+import consulalerting.WatchCheckDaemon as WatchCheckDaemon
+from mock import patch
+
+
+HEALTH_URI = "{uri}/health/state/any".format(uri=settings.CONSUL_URI)
+
+CURRENT_STATE = json.loads("""[
+{
+"Node": "foobar",
+"CheckID": "service:redis",
+"Name": "Service 'redis' check",
+"Status": "critical",
+"Notes": "",
+"Output": "",
+"ServiceID": "redis",
+"ServiceName": "redis"
+}
+]""")
+
+
+class WatchCheckDaemonTests(unittest.TestCase):
+
+    def setUp(self):
+        self.daemon = WatchCheckDaemon.WatchCheckDaemon(settings.consul, wait=1)
+
+    @responses.activate
+    def test_pollNewIndex(self):
+        responses.add(responses.GET, HEALTH_URI, json=CURRENT_STATE,
+                      headers={"X-Consul-Index": "10"}, status=200)
+
+        health = self.daemon.poll()
+
+        self.assertEqual(CURRENT_STATE, health)
+        self.assertEqual(10, self.daemon.index)
+        self.assertTrue("wait=1s" in responses.calls[0].request.url)
+
+    @responses.activate
+    def test_pollSameIndex(self):
+        responses.add(responses.GET, HEALTH_URI, json=CURRENT_STATE,
+                      headers={"X-Consul-Index": "10"}, status=200)
+        self.daemon.index = 10
+
+        self.assertEqual(None, self.daemon.poll())
+        self.assertTrue("index=10" in responses.calls[0].request.url)
+
+    @responses.activate
+    def test_pollIndexBackwards(self):
+        responses.add(responses.GET, HEALTH_URI, json=CURRENT_STATE,
+                      headers={"X-Consul-Index": "5"}, status=200)
+        self.daemon.index = 10
+
+        self.assertEqual(CURRENT_STATE, self.daemon.poll())
+        self.assertEqual(None, self.daemon.index)
+
+    @responses.activate
+    def test_coalesceNewestSnapshot(self):
+        newest = [dict(CURRENT_STATE[0], Status="passing")]
+        responses.add(responses.GET, HEALTH_URI, json=newest,
+                      headers={"X-Consul-Index": "11"}, status=200)
+        responses.add(responses.GET, HEALTH_URI, json=newest,
+                      headers={"X-Consul-Index": "11"}, status=200)
+        self.daemon.index = 10
+        self.daemon.running = True
+        self.daemon.quiet_period = 2
+        self.daemon.max_delay = 30
+
+        self.assertEqual(newest, self.daemon.coalesce(CURRENT_STATE))
+        self.assertEqual(2, len(responses.calls))
+        self.assertEqual(11, self.daemon.index)
+        self.assertTrue("wait=2s" in responses.calls[0].request.url)
+
+    @responses.activate
+    def test_coalesceMaxDelay(self):
+        self.daemon.running = True
+        self.daemon.quiet_period = 2
+        self.daemon.max_delay = 0
+
+        self.assertEqual(CURRENT_STATE, self.daemon.coalesce(CURRENT_STATE))
+        self.assertEqual(0, len(responses.calls))
+
+    @patch("consulalerting.WatchCheckDaemon.WatchCheckHandler")
+    def test_processNoAlerts(self, handler):
+        self.daemon.session_id = "abc"
+        handler.return_value.Run.return_value = []
+
+        with patch("consulalerting.utilities.renewSession", return_value=True):
+            self.daemon.process(CURRENT_STATE)
+
+        handler.return_value.Run.assert_called_with(CURRENT_STATE, "abc")
+        handler.return_value.Cleanup.assert_called_with()
+        handler.return_value.report.assert_called_with()
+        self.assertFalse(handler.return_value.notify.called)
+
+    @patch("consulalerting.WatchCheckDaemon.WatchCheckHandler")
+    def test_processExpiredSession(self, handler):
+        self.daemon.session_id = "abc"
+        handler.return_value.Run.return_value = ["alert"]
+
+        with patch("consulalerting.utilities.renewSession", return_value=False):
+            with patch("consulalerting.utilities.createSession", return_value="def"):
+                self.daemon.process(CURRENT_STATE)
+
+        handler.return_value.Run.assert_called_with(CURRENT_STATE, "def")
+        handler.return_value.notify.assert_called_with(
+            ["alert"], self.daemon.cachet_components, self.daemon.rate_limiter)
+
+
+if __name__ == '__main__':
+    unittest.main()
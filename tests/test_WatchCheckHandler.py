@@ -1,11 +1,19 @@
 #!/usr/bin/env python
 from __future__ import absolute_import
+import re
 import unittest
+import responses
 import json as json
+from StringIO import StringIO
 import consulalerting.settings as settings
 import consulalerting.utilities as utilities
 import consulalerting.WatchCheckHandler as WatchCheckHandler
+import consulalerting.PriorStateStore as PriorStateStore
 import consulalerting.ConsulHealthStruct as ConsulHealthStruct
+from consulalerting.AlertingConfig import AlertingConfig
+from consulalerting.Fingerprint import Fingerprint
+from consulalerting.FlapDetector import FLAPPING_STOPPED
+from mock import Mock, patch
 
 
 FOOBAR_CATALOG = json.loads("""{
@@ -172,19 +180,6 @@ class WatchCheckHandlerTests(unittest.TestCase):
         self.assertEqual(current_obj_list[
                          0], ConsulHealthStruct.ConsulHealthStruct(**CURRENT_STATE[0]))
 
-    def test_GetObjectListByStateWarning(self):
-        current_obj_list = utilities.createConsulHealthList(CURRENT_STATE)
-        current_state_warning = utilities.getObjectListByState(
-            current_obj_list, settings.WARNING_STATE)
-        self.assertEqual(0, len(current_state_warning))
-
-    def test_GetObjectListByStatePassing(self):
-        current_obj_list = utilities.createConsulHealthList(CURRENT_STATE)
-        current_state_warning = utilities.getObjectListByState(
-            current_obj_list, settings.PASSING_STATE)
-        print current_state_warning
-        self.assertEqual(2, len(current_state_warning))
-
     def test_FromPassingToPassing(self):
         self.watch.health_current = CURRENT_STATE_PASSING
         self.watch.health_prior = PRIOR_STATE_PASSING
@@ -275,9 +270,166 @@ class WatchCheckHandlerTests(unittest.TestCase):
         alert_list = self.watch.checkForAlertChanges(curr, prior)
         self.assertEqual(1, len(alert_list))
 
+    def test_nodeCatalogTagsDedupe(self):
+        consul = Mock()
+        consul.catalog.node.return_value = FOOBAR_CATALOG
+        watch = WatchCheckHandler.WatchCheckHandler(consul)
+
+        alert_list = utilities.createConsulHealthList(
+            CURRENT_STATE + CURRENT_STATE_CRITICAL + CURRENT_STATE_WARNING)
+        watch.nodeCatalogTags(alert_list, HEALTH_CHECK_TAGS)
+
+        consul.catalog.node.assert_called_once_with("foobar")
+        self.assertEqual(["devops", "hipchat"], alert_list[0].Tags)
+        self.assertEqual(["v1"], alert_list[1].Tags)
+        self.assertEqual(["v1"], alert_list[3].Tags)
+
+    def test_nodeCatalogsSystemChecksOnly(self):
+        consul = Mock()
+        watch = WatchCheckHandler.WatchCheckHandler(consul)
+
+        alert_list = utilities.createConsulHealthList(CURRENT_STATE[:1])
+
+        self.assertEqual({}, watch.nodeCatalogs(alert_list))
+        self.assertFalse(consul.catalog.node.called)
+
     def test_filterByBlacklistsExceptions(self):
         self.assertRaises(TypeError, self.watch.filterByBlacklists)
 
+    @patch("consulalerting.WatchCheckHandler.PriorStateStore.store")
+    @patch("consulalerting.WatchCheckHandler.AlertingConfig.load")
+    @patch("consulalerting.WatchCheckHandler.utilities")
+    def test_RunStreamsStdin(self, utilities_mock, load, store):
+        blacklists = AlertingConfig({
+            settings.KV_ALERTING_BLACKLIST_NODES: json.dumps(["blacklisted"])},
+            prefixes=(settings.KV_ALERTING_BLACKLIST,))
+        config = AlertingConfig({
+            settings.KV_ALERTING_BLACKLIST_NODES: json.dumps(["blacklisted"]),
+            settings.KV_PRIOR_STATE: json.dumps(PRIOR_STATE)})
+        load.side_effect = [blacklists, config]
+        utilities_mock.createConsulHealthList = utilities.createConsulHealthList
+        # the prior state is only read once the lock is won
+        utilities_mock.acquireLock.side_effect = \
+            lambda key, session_id: load.call_count == 1
+        store.return_value.write.return_value = 64
+        payload = json.dumps(CURRENT_STATE_CRITICAL +
+                             [dict(CURRENT_STATE_CRITICAL[0], Node="blacklisted")])
+        stdin = StringIO(payload)
+        stdin.isatty = lambda: False
+        w = WatchCheckHandler.WatchCheckHandler(Mock())
+        w.nodeCatalogTags = Mock()
+
+        with patch("sys.stdin", stdin), patch("sys.__stdin__", stdin):
+            alert_list = w.Run()
+
+        self.assertEqual(["foobar"], [obj.Node for obj in alert_list])
+        load.assert_any_call(None, (settings.KV_ALERTING_BLACKLIST,), False, None)
+        load.assert_called_with(None, None, True, blacklists)
+        self.assertEqual(Fingerprint.of(utilities.createConsulHealthList(
+            json.loads(payload))), w.currMD5Hash)
+        self.assertEqual(1, len(store.return_value.write.call_args[0][0]))
+        self.assertFalse(utilities_mock.currentState.called)
+        self.assertEqual(2, w.stats.counts["Checks"])
+        self.assertEqual(1, w.stats.counts["Alerts"])
+        self.assertEqual(64, w.stats.counts["KVBytesWritten"])
+        self.assertTrue("health" in w.stats.timings)
+
+    def processedFingerprint(self, health, blacklists=None):
+        w = WatchCheckHandler.WatchCheckHandler(Mock())
+        w.setConfig(blacklists or AlertingConfig({}))
+        w.currMD5Hash = Fingerprint.of(health)
+
+        return w.processedFingerprint()
+
+    @patch("consulalerting.WatchCheckHandler.PriorStateStore.store")
+    @patch("consulalerting.utilities.acquireLock", return_value=True)
+    def test_RunOutputOnlyChange(self, acquire_lock, store):
+        health = utilities.createConsulHealthList(CURRENT_STATE_CRITICAL)
+        config = AlertingConfig({settings.KV_PRIOR_STATE: PriorStateStore.encode(
+            health, 2, self.processedFingerprint(health))})
+        w = WatchCheckHandler.WatchCheckHandler(Mock())
+
+        alert_list = w.Run([dict(check, Output="timeout after 10s")
+                            for check in CURRENT_STATE_CRITICAL], "abc", config)
+
+        self.assertEqual([], alert_list)
+        self.assertTrue(w.lock_result)
+        self.assertFalse(store.called)
+
+    @patch("consulalerting.WatchCheckHandler.PriorStateStore.store")
+    @patch("consulalerting.utilities.acquireLock", return_value=True)
+    def test_RunOutputOnlyChangeFlapping(self, acquire_lock, store):
+        health = utilities.createConsulHealthList(CURRENT_STATE_CRITICAL)
+        for obj in health:
+            obj.History = [1]
+            obj.Flapping = True
+        config = AlertingConfig({settings.KV_PRIOR_STATE: PriorStateStore.encode(
+            health, 3, self.processedFingerprint(health))})
+        w = WatchCheckHandler.WatchCheckHandler(Mock())
+        w.nodeCatalogTags = Mock()
+
+        alert_list = w.Run(CURRENT_STATE_CRITICAL, "abc", config)
+
+        # the change a second since the epoch decayed, flapping stopped
+        self.assertEqual([FLAPPING_STOPPED] * len(health),
+                         [obj.Transition for obj in alert_list])
+        self.assertTrue(store.called)
+
+    @patch("consulalerting.WatchCheckHandler.PriorStateStore.store")
+    @patch("consulalerting.utilities.acquireLock", return_value=True)
+    def test_RunBlacklistChange(self, acquire_lock, store):
+        health = utilities.createConsulHealthList(CURRENT_STATE_CRITICAL)
+        config = AlertingConfig({
+            settings.KV_ALERTING_BLACKLIST_NODES: json.dumps(["foobar"]),
+            settings.KV_PRIOR_STATE: PriorStateStore.encode(
+                health, 2, self.processedFingerprint(health))})
+        w = WatchCheckHandler.WatchCheckHandler(Mock())
+        w.nodeCatalogTags = Mock()
+
+        w.Run(CURRENT_STATE_CRITICAL, "abc", config)
+
+        self.assertTrue(store.called)
+        self.assertNotEqual(self.processedFingerprint(health),
+                            store.return_value.write.call_args[0][1])
+
+    @patch("consulalerting.WatchCheckHandler.PriorStateStore.store")
+    @patch("consulalerting.utilities.acquireLock", return_value=True)
+    def test_RunWritesFilteredPrior(self, acquire_lock, store):
+        config = AlertingConfig({
+            settings.KV_ALERTING_BLACKLIST_NODES: json.dumps(["blacklisted"]),
+            settings.KV_PRIOR_STATE: json.dumps(PRIOR_STATE)})
+        w = WatchCheckHandler.WatchCheckHandler(Mock())
+        w.nodeCatalogTags = Mock()
+
+        w.Run(CURRENT_STATE_CRITICAL +
+              [dict(CURRENT_STATE_CRITICAL[0], Node="blacklisted")],
+              "abc", config)
+
+        # same list as a streamed run writes
+        self.assertEqual(["foobar"], [obj.Node for obj in
+                                      store.return_value.write.call_args[0][0]])
+
+    @responses.activate
+    @patch("consulalerting.utilities.acquireLock", return_value=True)
+    def test_RunChunkedCleanupFails(self, acquire_lock):
+        responses.add(responses.PUT, re.compile(settings.CONSUL_URI + "/kv/.*"),
+                      json=True, status=200)
+        responses.add(responses.DELETE, re.compile(settings.CONSUL_URI + "/kv/.*"),
+                      body="rpc error", status=500)
+        config = AlertingConfig({settings.KV_PRIOR_STATE: json.dumps(PRIOR_STATE)})
+        w = WatchCheckHandler.WatchCheckHandler(Mock())
+        w.nodeCatalogTags = Mock()
+        prior_state_store = settings.PRIOR_STATE_STORE
+        settings.PRIOR_STATE_STORE = "chunked"
+
+        try:
+            alert_list = w.Run(CURRENT_STATE_CRITICAL, "abc", config)
+        finally:
+            settings.PRIOR_STATE_STORE = prior_state_store
+
+        self.assertEqual(["foobar"], [obj.Node for obj in alert_list])
+        self.assertEqual(responses.DELETE, responses.calls[-1].request.method)
+
     #Integration Test
     def test_Run(self):
         w = WatchCheckHandler.WatchCheckHandler(settings.consul)
@@ -6,7 +6,8 @@ import consulalerting.settings as settings
 import consulalerting.utilities as utilities
 import consulalerting.ConsulHealthStruct as ConsulHealthStruct
 from mock import patch, MagicMock, Mock
-from requests import HTTPError
+from requests import ConnectionError, HTTPError, Timeout
+from requests.exceptions import SSLError
 
 
 ALL_REQUESTS_ALERTING_AVAILABLE_PLUGINS = [
@@ -133,6 +134,40 @@ class PluginsTests(unittest.TestCase):
 
         self.assertEqual(204, status_code)
 
+    def test_influxdbLine(self):
+        line = plugins.influxdb_line(self.obj, 'say "hi"\nnow', CONSUL_INFLUXDB,
+                                     1458230400000000000)
+
+        self.assertEqual('test,Node=consul,ServiceID=redis,CheckID=service:redis,'
+                         'Status=critical status=2i,value="say \\"hi\\" now" '
+                         '1458230400000000000', line)
+
+    def test_influxdbBatchRequests(self):
+        consul_influxdb = {"url": "http://localhost:8086/write", "series": "test",
+                           "databases": {"db": "mydb", "devops": "ops"},
+                           "batch_size": 2}
+        alerts = [(self.obj, self.message_template, ["db", "devops"])] * 3
+
+        plugin_requests = plugins.influxdb_batch_requests(alerts, consul_influxdb, 1)
+
+        self.assertEqual([("mydb", 2), ("mydb", 1), ("ops", 2), ("ops", 1)],
+                         [(plugin_request.params["db"],
+                           len(plugin_request.data.split("\n")))
+                          for plugin_request in plugin_requests])
+        self.assertEqual("ns", plugin_requests[0].params["precision"])
+
+    @responses.activate
+    def test_notifyInfluxdbBatch(self):
+        responses.add(
+            responses.POST, "http://localhost:8086/write", status=204)
+
+        status_code = plugins.notify_influxdb_batch(
+            [(self.obj, self.message_template, ["db"])] * 10, CONSUL_INFLUXDB)
+
+        self.assertEqual(204, status_code)
+        self.assertEqual(1, len(responses.calls))
+        self.assertEqual(10, len(responses.calls[0].request.body.split("\n")))
+
     def test_Cachet_no_api_token(self):
         """
         No POST due to missing api token
@@ -242,6 +277,51 @@ class PluginsTests(unittest.TestCase):
         status_code = plugins.notify_cache(self.obj, self.message_template, CONSUL_CACHET)
         self.assertEqual(None, status_code)
 
+    @responses.activate
+    @patch("consulalerting.plugins.time.sleep")
+    def test_Cachet_post_timeout(self, sleep):
+        """
+        Successfully GET components, the incident POST times out, the component is forgotten
+        """
+        get_data = {'data': [{"id": 2, "name": "Redis"}]}
+        components = plugins.CachetComponents()
+
+        responses.add(responses.GET, "http://status.company.com/api/v1/components", json=get_data, status=200)
+        responses.add(responses.POST, "http://status.company.com/api/v1/incidents",
+                      body=Timeout("read timed out"))
+        status_code = plugins.notify_cache(self.obj, self.message_template, CONSUL_CACHET, components)
+        self.assertEqual(None, status_code)
+        self.assertFalse(2 in components.statuses)
+
+    @responses.activate
+    @patch("consulalerting.plugins.time.sleep")
+    def test_notifySlackRetry(self, sleep):
+        responses.add(
+            responses.POST, "https://slack.com/api/chat.postMessage", status=503,
+            headers={"Retry-After": "2"})
+        responses.add(
+            responses.POST, "https://slack.com/api/chat.postMessage", json=True, status=200)
+
+        status_code = plugins.notify_slack(
+            self.message_template, ["devops"], CONSUL_SLACK)
+
+        self.assertEqual(200, status_code)
+        self.assertEqual(2, len(responses.calls))
+        sleep.assert_called_once_with(2)
+
+    @responses.activate
+    @patch("consulalerting.plugins.time.sleep")
+    def test_notifySlackRetryConnectionError(self, sleep):
+        responses.add(
+            responses.POST, "https://slack.com/api/chat.postMessage",
+            body=ConnectionError("connection refused"))
+        config = dict(CONSUL_SLACK, retry={"attempts": 2})
+
+        self.assertRaises(ConnectionError, plugins.notify_slack,
+                          self.message_template, ["devops"], config)
+        self.assertEqual(2, len(responses.calls))
+        self.assertEqual(1, sleep.call_count)
+
     @responses.activate
     def test_notifySlackFail(self):
         responses.add(
@@ -251,6 +331,7 @@ class PluginsTests(unittest.TestCase):
             self.message_template, ["devops"], CONSUL_SLACK)
 
         self.assertNotEqual(200, status_code)
+        self.assertEqual(1, len(responses.calls))
 
     @responses.activate
     def test_notifyPagerdutyFail(self):
@@ -282,6 +363,16 @@ class PluginsTests(unittest.TestCase):
 
         self.assertNotEqual(200, status_code)
 
+    @responses.activate
+    def test_notifyHipchatSSLError(self):
+        responses.add(
+            responses.POST, "https://api.hipchat.com/v1/",
+            body=SSLError("certificate verify failed"))
+
+        self.assertRaises(SSLError, plugins.notify_hipchat,
+                          self.obj, self.message_template, ["devops"], CONSUL_HIPCHAT)
+        self.assertEqual(1, len(responses.calls))
+
     @responses.activate
     def test_notifyInfluxdbFail(self):
         responses.add(
@@ -35,13 +35,6 @@ class utilitiesTests(unittest.TestCase):
         obj_list = utilities.createConsulHealthList(CURRENT_STATE)
         self.assertEqual(2, len(obj_list))
 
-    def test_getHashStateSet(self):
-        obj_list = utilities.createConsulHealthList(CURRENT_STATE)
-        passing_list = utilities.getHashStateSet(
-            obj_list, settings.PASSING_STATE)
-
-        self.assertEqual(2, len(passing_list))
-
     # Integration tests
     def test_checkForKey(self):
         r = utilities.checkForKey("asdf")
@@ -57,29 +50,3 @@ class utilitiesTests(unittest.TestCase):
     def test_currentState(self):
         r = utilities.currentState()
         self.assertTrue(r)
-
-    def test_getCheckTags(self):
-        r = utilities.getCheckTags(settings.KV_ALERTING_HEALTH_CHECK_TAGS)
-        self.assertTrue(isinstance(r, list))
-
-        del settings.consul.kv[settings.KV_ALERTING_HEALTH_CHECK_TAGS]
-
-        r = utilities.getCheckTags(settings.KV_ALERTING_HEALTH_CHECK_TAGS)
-        self.assertTrue(isinstance(r, list))
-
-        settings.consul.kv[settings.KV_ALERTING_HEALTH_CHECK_TAGS] = []
-
-    def test_getPriorState(self):
-        r = utilities.priorState(settings.KV_PRIOR_STATE)
-        self.assertTrue(isinstance(r, list))
-
-        r = utilities.priorState(settings.KV_PRIOR_STATE + "/dummy")
-        self.assertTrue(isinstance(r, list))
-
-    def test_getBlacklist(self):
-        bl_node = utilities.getBlacklist(settings.KV_ALERTING_BLACKLIST_NODES)
-        self.assertTrue(isinstance(bl_node, list))
-
-        bl_node = utilities.getBlacklist(
-            settings.KV_ALERTING_BLACKLIST_NODES + "/dummy")
-        self.assertTrue(isinstance(bl_node, list))